@@ -1,8 +1,8 @@
 """
-Teste do Azure OpenAI usando a biblioteca `openai` (compatível com Python 3.10).
+Teste e benchmark do Azure OpenAI usando a biblioteca `openai` (compatível com Python 3.10).
 
 Como usar (PowerShell):
-1) Exporte variáveis de ambiente:
+1) Exporte variáveis de ambiente (ou use o .env do backend):
    $env:AZURE_OPENAI_ENDPOINT = "https://SEU_RECURSO.openai.azure.com"
    $env:AZURE_OPENAI_KEY = "SUA_CHAVE_AQUI"
    $env:AZURE_OPENAI_DEPLOYMENT = "NOME_DO_DEPLOYMENT"
@@ -10,107 +10,271 @@ Como usar (PowerShell):
 2) Execute com o venv Python 3.10 criado (`.venv_py310`):
    C:/Users/jjmca/EZFix/.venv_py310/Scripts/python.exe azure_openai_test_openai.py
 
-O script pede uma chamada simples (chat completions) e imprime o texto retornado.
+Sem argumentos, o script pede uma chamada simples (chat completions) e imprime o texto retornado.
+
+Benchmark (`bench`): roda os prompts reais de avaliação e de correção (gerados
+pelo backend a partir do corpus fixo, via scripts/loteBatch.ts) com
+AsyncOpenAI em cada nível de concorrência e mede, por requisição, o tempo até o
+primeiro token (TTFT, em streaming), a latência total e os tokens de saída por
+segundo; por rodada, a taxa de 429 e a fração do prompt servida pelo cache.
+Os percentis (p50/p90/p95/p99) saem em JSON, para comparar deployments,
+api-versions e layouts de prompt:
+   python azure_openai_test_openai.py bench --tarefas enem,correcao --concorrencia 1,4,8 \
+       --requisicoes 40 --rotulo "gpt-4o 2024-10-21" --saida bench-gpt4o.json
+
+Os 429 não são repetidos pelo SDK (max_retries=0), para aparecerem na medição:
+o benchmark espera o retry-after e tenta de novo (até --max-tentativas). A
+latência é a da tentativa que respondeu; `latencia_com_espera_ms` inclui as esperas.
 """
 
+import argparse
+import asyncio
+import json
 import os
-from openai import OpenAI
-from dotenv import load_dotenv
-
-# Carrega .env do backend automaticamente (se existir).
-# Tentamos várias codificações para evitar UnicodeDecodeError em arquivos salvos com UTF-16/BOM.
-env_path = os.path.join(os.path.dirname(__file__), '.env')
-if os.path.exists(env_path):
-    tried = []
-    for enc in (None, 'utf-8', 'utf-8-sig', 'utf-16', 'latin-1'):
-        try:
-            # load_dotenv aceita parametro encoding (None = default utf-8)
-            if enc:
-                load_dotenv(dotenv_path=env_path, encoding=enc)
-            else:
-                load_dotenv(dotenv_path=env_path)
-            # sucesso
-            break
-        except UnicodeDecodeError as e:
-            tried.append(enc or 'default')
-            # tentar próxima codificação
-            continue
-    else:
-        print(f"Aviso: não foi possível ler {env_path} nas codificações testadas: {tried}")
+import sys
+import tempfile
+import time
+from urllib.parse import urlparse
 
+import openai
 
-def main():
-    endpoint = os.environ.get("AZURE_OPENAI_ENDPOINT")
-    key = os.environ.get("AZURE_OPENAI_KEY")
-    deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT")
+from lote_batch_openai import rodar_script_node
+from openai_cliente import carregar_env, criar_cliente, usando_azure
+
+# Carrega .env do backend automaticamente (se existir), tolerando UTF-16/BOM.
+carregar_env()
+
+PERCENTIS = (50, 90, 95, 99)
 
-    if not endpoint or not key or not deployment:
+
+def teste_simples():
+    deployment = os.environ.get("AZURE_OPENAI_DEPLOYMENT")
+    if not deployment:
         print("Defina AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_KEY e AZURE_OPENAI_DEPLOYMENT no ambiente antes de executar.")
         return
 
-    # Normaliza endpoint: se veio com path (/openai/...), extrai apenas a origem
-    if endpoint:
-        endpoint = endpoint.rstrip('/')
-        try:
-            from urllib.parse import urlparse
-            p = urlparse(endpoint)
-            if p.path and '/openai' in p.path:
-                endpoint_origin = f"{p.scheme}://{p.netloc}"
-            else:
-                endpoint_origin = endpoint
-        except Exception:
-            endpoint_origin = endpoint
-
-    # Configuração para Azure: criar cliente OpenAI com atributos da API nova
-    api_version = os.environ.get("AZURE_OPENAI_API_VERSION", "2023-05-15")
-    # garantir variável esperada pelo SDK
-    os.environ.setdefault('OPENAI_API_KEY', key)
-    os.environ.setdefault('OPENAI_API_BASE', endpoint_origin)
-    os.environ.setdefault('OPENAI_API_TYPE', 'azure')
-    os.environ.setdefault('OPENAI_API_VERSION', api_version)
-
-    client = OpenAI()
-    # Para segurança definimos também atributos se suportados
-    try:
-        client.api_key = key
-        client.api_base = endpoint_origin
-        client.api_type = "azure"
-        client.api_version = api_version
-    except Exception:
-        pass
-
     prompt = "Teste Azure OpenAI via openai-python: responda em português com 'Olá do Azure'"
 
     try:
+        client = criar_cliente()
         resp = client.chat.completions.create(
             model=deployment,
             messages=[{"role": "user", "content": prompt}],
             max_tokens=200,
             temperature=0.2,
         )
-
-        # Extrair texto da resposta (compatível com novas e antigas estruturas)
-        choices = getattr(resp, 'choices', None) or resp.get('choices') if isinstance(resp, dict) else None
-        if choices:
-            print("Resposta do modelo:\n")
-            for ch in choices:
-                # novo SDK: ch.message.content
-                content = None
-                if hasattr(ch, 'message') and getattr(ch.message, 'get', None):
-                    content = ch.message.get('content')
-                elif isinstance(ch, dict):
-                    content = ch.get('message', {}) and ch['message'].get('content')
-                elif hasattr(ch, 'message') and hasattr(ch.message, 'content'):
-                    content = ch.message.content
-
-                print(content)
-        else:
-            # fallback: imprimir repr
-            print("Resposta (raw):", resp)
+        print("Resposta do modelo:\n")
+        for ch in resp.choices:
+            print(ch.message.content)
 
     except Exception as e:
         print("Erro ao chamar OpenAI (Azure):\n", e)
 
 
+# --- Benchmark ---
+
+def percentil(valores, p):
+    """Percentil por interpolação linear (como numpy.percentile), sem dependências."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    pos = (len(ordenados) - 1) * p / 100
+    base = int(pos)
+    topo = min(base + 1, len(ordenados) - 1)
+    return ordenados[base] + (ordenados[topo] - ordenados[base]) * (pos - base)
+
+
+def resumo_percentis(valores, casas=1):
+    if not valores:
+        return None
+    resumo = {f'p{p}': round(percentil(valores, p), casas) for p in PERCENTIS}
+    resumo['media'] = round(sum(valores) / len(valores), casas)
+    resumo['max'] = round(max(valores), casas)
+    return resumo
+
+
+def carregar_requisicoes(tarefa, deployment, corpus):
+    """Corpos de chat completions da tarefa, montados pelo backend (mesmos prompts da produção)."""
+    with tempfile.TemporaryDirectory() as pasta:
+        saida = os.path.join(pasta, f'{tarefa}.jsonl')
+        extras = ['--corpus', os.path.abspath(corpus)] if corpus else []
+        rodar_script_node('requisicoes', '--tarefa', tarefa, '--modelo', deployment, '--saida', saida, *extras)
+        with open(saida, encoding='utf-8') as f:
+            return [json.loads(l)['body'] for l in f if l.strip()]
+
+
+def espera_retry_after(erro, padrao=1.0):
+    """Segundos indicados pelo servidor num 429 (retry-after-ms tem precedência, como no SDK)."""
+    headers = erro.response.headers if erro.response is not None else {}
+    try:
+        if headers.get('retry-after-ms'):
+            return float(headers['retry-after-ms']) / 1000
+        if headers.get('retry-after'):
+            return float(headers['retry-after'])
+    except ValueError:
+        pass
+    return padrao
+
+
+async def medir_chamada(cliente, body, args):
+    """Uma requisição (com as repetições após 429). Devolve as medidas da tentativa que respondeu."""
+    medida = {'tentativas': 0, 'status_429': 0, 'erro': None}
+    inicio_total = time.perf_counter()
+    for _ in range(args.max_tentativas):
+        medida['tentativas'] += 1
+        inicio = time.perf_counter()
+        ttft = None
+        uso = None
+        try:
+            if args.sem_stream:
+                resposta = await cliente.chat.completions.create(**body)
+                uso = resposta.usage
+            else:
+                stream = await cliente.chat.completions.create(
+                    **body, stream=True, stream_options={'include_usage': True})
+                async for chunk in stream:
+                    if ttft is None and chunk.choices and chunk.choices[0].delta.content:
+                        ttft = time.perf_counter() - inicio
+                    if chunk.usage:
+                        uso = chunk.usage
+        except openai.RateLimitError as e:
+            medida['status_429'] += 1
+            await asyncio.sleep(espera_retry_after(e))
+            continue
+        except openai.APIStatusError as e:
+            medida['erro'] = f'HTTP {e.status_code}'
+            return medida
+        except openai.APIConnectionError as e:
+            medida['erro'] = type(e).__name__
+            return medida
+        latencia = time.perf_counter() - inicio
+        medida['latencia_ms'] = latencia * 1000
+        # Como o usuário sente: inclui as esperas por 429
+        medida['latencia_com_espera_ms'] = (time.perf_counter() - inicio_total) * 1000
+        if ttft is not None:
+            medida['ttft_ms'] = ttft * 1000
+        if uso:
+            detalhes = getattr(uso, 'prompt_tokens_details', None)
+            medida['prompt_tokens'] = uso.prompt_tokens
+            medida['cached_tokens'] = (getattr(detalhes, 'cached_tokens', 0) or 0) if detalhes else 0
+            medida['completion_tokens'] = uso.completion_tokens
+            # Velocidade de geração: depois do primeiro token, quando há streaming
+            geracao = latencia - (ttft or 0)
+            if geracao > 0 and uso.completion_tokens:
+                medida['tokens_por_s'] = uso.completion_tokens / geracao
+        return medida
+    medida['erro'] = '429 persistente'
+    return medida
+
+
+async def rodada(cliente, requisicoes, concorrencia, args):
+    """`args.requisicoes` chamadas (percorrendo o corpus em ciclo) com até `concorrencia` simultâneas."""
+    semaforo = asyncio.Semaphore(concorrencia)
+
+    async def uma(i):
+        async with semaforo:
+            return await medir_chamada(cliente, requisicoes[i % len(requisicoes)], args)
+
+    # Aquecimento fora da medição: conexão TLS e o primeiro acesso ao cache de prompt
+    for i in range(min(args.aquecimento, len(requisicoes))):
+        await medir_chamada(cliente, requisicoes[i], args)
+    inicio = time.perf_counter()
+    medidas = await asyncio.gather(*(uma(i) for i in range(args.requisicoes)))
+    duracao = time.perf_counter() - inicio
+
+    ok = [m for m in medidas if not m['erro']]
+    tentativas = sum(m['tentativas'] for m in medidas)
+    prompt = sum(m.get('prompt_tokens', 0) for m in ok)
+    saida = sum(m.get('completion_tokens', 0) for m in ok)
+    erros = {}
+    for m in medidas:
+        if m['erro']:
+            erros[m['erro']] = erros.get(m['erro'], 0) + 1
+    return {
+        'concorrencia': concorrencia,
+        'requisicoes': len(medidas),
+        'sucesso': len(ok),
+        'erros': erros,
+        'duracao_s': round(duracao, 2),
+        'requisicoes_por_min': round(len(ok) / duracao * 60, 1) if duracao else None,
+        'tokens_saida_por_s': round(saida / duracao, 1) if duracao else None,
+        'taxa_429': round(sum(m['status_429'] for m in medidas) / tentativas, 4) if tentativas else 0,
+        'razao_cache': round(sum(m.get('cached_tokens', 0) for m in ok) / prompt, 4) if prompt else 0,
+        'tokens_prompt_medio': round(prompt / len(ok)) if ok else None,
+        'tokens_saida_medio': round(saida / len(ok)) if ok else None,
+        'ttft_ms': resumo_percentis([m['ttft_ms'] for m in ok if 'ttft_ms' in m]),
+        'latencia_ms': resumo_percentis([m['latencia_ms'] for m in ok]),
+        'latencia_com_espera_ms': resumo_percentis([m['latencia_com_espera_ms'] for m in ok]),
+        'tokens_por_s': resumo_percentis([m['tokens_por_s'] for m in ok if 'tokens_por_s' in m]),
+    }
+
+
+async def benchmark(args):
+    deployment = args.deployment or os.environ.get('AZURE_OPENAI_DEPLOYMENT')
+    if not deployment:
+        raise RuntimeError('Informe --deployment ou defina AZURE_OPENAI_DEPLOYMENT.')
+    cliente = criar_cliente(assincrono=True, api_version=args.api_version, max_retries=0, timeout=args.timeout)
+    endpoint = os.environ.get('AZURE_OPENAI_ENDPOINT') if usando_azure() else os.environ.get('OPENAI_BASE_URL')
+    niveis = [int(c) for c in args.concorrencia.split(',')]
+
+    resultado = {
+        'rotulo': args.rotulo,
+        'deployment': deployment,
+        'api_version': (args.api_version or os.environ.get('AZURE_OPENAI_API_VERSION')) if usando_azure() else None,
+        'endpoint': urlparse(endpoint).netloc if endpoint else None,
+        'stream': not args.sem_stream,
+        'data': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'tarefas': {},
+    }
+    for tarefa in args.tarefas.split(','):
+        requisicoes = carregar_requisicoes(tarefa, deployment, args.corpus)
+        rodadas = []
+        for concorrencia in niveis:
+            print(f"⏱️ {tarefa}: {args.requisicoes} requisições com concorrência {concorrencia}...")
+            r = await rodada(cliente, requisicoes, concorrencia, args)
+            lat, ttft = r['latencia_ms'] or {}, r['ttft_ms'] or {}
+            print(f"   {r['sucesso']}/{r['requisicoes']} ok | latência p50 {lat.get('p50')} ms, p95 {lat.get('p95')} ms | "
+                  f"TTFT p50 {ttft.get('p50')} ms | {r['tokens_saida_por_s']} tokens/s | 429: {r['taxa_429']:.1%} | "
+                  f"cache: {r['razao_cache']:.1%}")
+            rodadas.append(r)
+        resultado['tarefas'][tarefa] = rodadas
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Teste e benchmark do Azure OpenAI.')
+    sub = parser.add_subparsers(dest='comando')
+    p = sub.add_parser('bench', help='Benchmark de latência e vazão com os prompts reais')
+    p.add_argument('--tarefas', default='enem,correcao', help='enem, notas e/ou correcao (padrão enem,correcao)')
+    p.add_argument('--concorrencia', default='1,4,8', help='Níveis de concorrência (padrão 1,4,8)')
+    p.add_argument('--requisicoes', type=int, default=20, help='Requisições por nível de concorrência (padrão 20)')
+    p.add_argument('--aquecimento', type=int, default=1, help='Chamadas antes de cada rodada, fora da medição (padrão 1)')
+    p.add_argument('--deployment', help='Sobrepõe AZURE_OPENAI_DEPLOYMENT')
+    p.add_argument('--api-version', help='Sobrepõe AZURE_OPENAI_API_VERSION')
+    p.add_argument('--corpus', help='Corpus JSON (padrão: scripts/corpus/redacoes-benchmark.json)')
+    p.add_argument('--sem-stream', action='store_true', help='Sem streaming (mede só a latência total)')
+    p.add_argument('--max-tentativas', type=int, default=5, help='Tentativas por requisição em caso de 429')
+    p.add_argument('--timeout', type=float, default=120)
+    p.add_argument('--rotulo', default='', help='Identifica a configuração no JSON (ex.: layout do prompt)')
+    p.add_argument('--saida', help='Arquivo JSON com os resultados (padrão: imprime na tela)')
+    args = parser.parse_args()
+
+    if args.comando != 'bench':
+        teste_simples()
+        return
+    try:
+        resultado = asyncio.run(benchmark(args))
+    except Exception as e:
+        print(f"❌ Erro no benchmark: {e}")
+        sys.exit(1)
+    dados = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, 'w', encoding='utf-8') as f:
+            f.write(dados)
+        print(f"💾 Resultados salvos em {args.saida}")
+    else:
+        print(dados)
+
+
 if __name__ == '__main__':
     main()
@@ -0,0 +1,350 @@
+"""
+Recorreção / backfill retomável do acervo de redações (chamadas interativas).
+
+Quando o prompt de avaliação ou o modelo mudam, o acervo precisa ser
+recorrigido. Este script percorre as redações em ordem de criação (cursor
+`criadoEm` + id, via scripts/loteBatch.ts), avalia cada uma com AsyncOpenAI sob
+concorrência limitada e grava as notas no banco página a página.
+
+- Checkpoint (--checkpoint): cursor, ids concluídos e com falha, versão do
+  prompt, modelo, tokens e custo gastos. Rodar de novo retoma de onde parou; se
+  o prompt ou o modelo mudaram desde o início, recusa (use --reiniciar).
+- Cada resposta é gravada em disco assim que chega (<checkpoint>.resultados.jsonl):
+  depois de uma queda, as avaliações já feitas são importadas, não refeitas.
+- Orçamento (--max-custo-usd / --max-tokens): teto rígido para o total da
+  recorreção (somado entre as execuções). Cada chamada reserva o pior caso
+  (prompt estimado + max_completion_tokens) antes de sair; sem orçamento para a
+  próxima, o script termina as chamadas em andamento, importa, salva o
+  checkpoint como "pausado" e sai com código 2. Para continuar, rode de novo com
+  um teto maior.
+
+Para a via com desconto (janela de 24h), ver lote_batch_openai.py.
+
+Como usar (PowerShell, na pasta backend):
+   C:/Users/jjmca/EZFix/.venv_py310/Scripts/python.exe backfill_openai.py --concorrencia 8 --max-custo-usd 20
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+from datetime import datetime, timezone
+
+import openai
+from tqdm import tqdm
+
+from lote_batch_openai import rodar_script_node
+from openai_cliente import carregar_env, criar_cliente, preco_1k
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+PAGINA = int(os.environ.get('BACKFILL_PAGINA') or 200)
+CODIGO_PAUSADO = 2
+
+
+class Orcamento:
+    """
+    Tokens e custo gastos: os já importados (no checkpoint), os de respostas
+    gravadas em disco e ainda não importadas, e as reservas das chamadas em andamento.
+    """
+
+    def __init__(self, checkpoint, modelo, max_custo_usd, max_tokens):
+        self.checkpoint = checkpoint
+        self.preco_entrada, self.preco_saida = preco_1k(modelo)
+        self.max_custo_usd = max_custo_usd
+        self.max_tokens = max_tokens
+        self.tokens_reservados = 0
+        self.custo_reservado = 0.0
+        self.tokens_pendentes = 0
+        self.custo_pendente = 0.0
+        self.esgotado = False
+
+    def custo(self, prompt_tokens, completion_tokens):
+        return (prompt_tokens * self.preco_entrada + completion_tokens * self.preco_saida) / 1000
+
+    def gasto(self):
+        t = self.checkpoint['tokens']
+        return t['prompt'] + t['saida'] + self.tokens_pendentes, self.checkpoint['custo_usd'] + self.custo_pendente
+
+    def reservar(self, prompt_estimado, max_saida):
+        """Reserva o pior caso da chamada; devolve None (e marca o orçamento como esgotado) se não couber."""
+        tokens, custo = prompt_estimado + max_saida, self.custo(prompt_estimado, max_saida)
+        gasto_tokens, gasto_custo = self.gasto()
+        if ((self.max_tokens and gasto_tokens + self.tokens_reservados + tokens > self.max_tokens)
+                or (self.max_custo_usd and gasto_custo + self.custo_reservado + custo > self.max_custo_usd)):
+            self.esgotado = True
+            return None
+        self.tokens_reservados += tokens
+        self.custo_reservado += custo
+        return tokens, custo
+
+    def liberar(self, reserva, uso=None):
+        """Troca a reserva pelo uso real (ou só a libera, se a chamada falhou antes de cobrar)."""
+        self.tokens_reservados -= reserva[0]
+        self.custo_reservado -= reserva[1]
+        if uso:
+            self.tokens_pendentes += uso.prompt_tokens + uso.completion_tokens
+            self.custo_pendente += self.custo(uso.prompt_tokens, uso.completion_tokens)
+
+    def contabilizar(self, resultados):
+        """
+        Passa para o checkpoint o uso das respostas gravadas em disco (o arquivo é
+        a fonte: depois de uma queda, o gasto das respostas salvas não se perde).
+        """
+        t = self.checkpoint['tokens']
+        for resultado in resultados:
+            uso = ((resultado.get('response') or {}).get('body') or {}).get('usage') or {}
+            t['prompt'] += uso.get('prompt_tokens', 0)
+            t['saida'] += uso.get('completion_tokens', 0)
+            t['cache'] += (uso.get('prompt_tokens_details') or {}).get('cached_tokens', 0)
+            self.checkpoint['custo_usd'] += self.custo(uso.get('prompt_tokens', 0), uso.get('completion_tokens', 0))
+        self.tokens_pendentes, self.custo_pendente = 0, 0.0
+
+
+def checkpoint_novo():
+    return {
+        'versao_prompt': None,
+        'modelo': None,
+        'cursor': None,
+        'concluidas': [],
+        'falhas': [],
+        'tokens': {'prompt': 0, 'saida': 0, 'cache': 0},
+        'custo_usd': 0.0,
+        'status': 'em_andamento',
+    }
+
+
+def carregar_checkpoint(caminho):
+    if not os.path.exists(caminho):
+        return checkpoint_novo()
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_checkpoint(caminho, checkpoint):
+    checkpoint['atualizado_em'] = datetime.now(timezone.utc).isoformat()
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def id_e_versao(linha):
+    redacao_id, _, versao = linha['custom_id'].partition('|')
+    return redacao_id, versao
+
+
+def rodar_sob_barra(*args):
+    """Roda scripts/loteBatch.ts repassando a saída por tqdm.write (sem quebrar a barra de progresso)."""
+    saida = rodar_script_node(*args, capturar=True)
+    for linha in saida.splitlines():
+        if linha.strip():
+            tqdm.write(linha)
+    return saida
+
+
+def importar_resultados(args, checkpoint, orcamento):
+    """Grava no banco as respostas salvas em disco e as move (com o gasto) para o checkpoint."""
+    caminho = args.checkpoint + '.resultados.jsonl'
+    if not os.path.exists(caminho) or os.path.getsize(caminho) == 0:
+        return
+    with open(caminho, encoding='utf-8') as f:
+        # Uma queda no meio da escrita pode deixar a última linha incompleta
+        resultados = []
+        for linha in f:
+            try:
+                resultados.append(json.loads(linha))
+            except json.JSONDecodeError:
+                pass
+    ids = [id_e_versao(r)[0] for r in resultados]
+    arquivo_falhas = args.checkpoint + '.falhas-pagina.txt'
+    if os.path.exists(arquivo_falhas):
+        os.remove(arquivo_falhas)
+    rodar_sob_barra('importar', '--resultados', os.path.abspath(caminho), '--falhas', os.path.abspath(arquivo_falhas))
+    falhas = set()
+    if os.path.exists(arquivo_falhas):
+        with open(arquivo_falhas, encoding='utf-8') as f:
+            falhas = {l.strip() for l in f if l.strip()}
+        os.remove(arquivo_falhas)
+    concluidas, ja_falhas = set(checkpoint['concluidas']), set(checkpoint['falhas'])
+    for redacao_id in ids:
+        if redacao_id in falhas:
+            ja_falhas.add(redacao_id)
+        else:
+            concluidas.add(redacao_id)
+            ja_falhas.discard(redacao_id)
+    checkpoint['concluidas'], checkpoint['falhas'] = sorted(concluidas), sorted(ja_falhas)
+    orcamento.contabilizar(resultados)
+    salvar_checkpoint(args.checkpoint, checkpoint)
+    # Só depois do checkpoint salvo: uma queda aqui no meio apenas reimporta a página
+    os.remove(caminho)
+
+
+def filtros_exportacao(args):
+    extras = []
+    if not args.so_sem_nota:
+        extras.append('--todas')
+    if args.desde:
+        extras += ['--desde', args.desde]
+    if args.sob_demanda:
+        extras.append('--sob-demanda')
+    return extras
+
+
+def apos(cursor):
+    return ['--apos', f"{cursor['criadoEm']}|{cursor['id']}"] if cursor else []
+
+
+def proxima_pagina(args, checkpoint, modelo):
+    """Exporta a próxima página depois do cursor; devolve (requisições, novo cursor, redações lidas)."""
+    base = os.path.abspath(args.checkpoint)
+    arquivo, arquivo_cursor = base + '.pagina.jsonl', base + '.cursor.json'
+    rodar_sob_barra('exportar', '--saida', arquivo, '--modelo', modelo, '--limite', str(PAGINA),
+                      '--cursor-saida', arquivo_cursor, *apos(checkpoint['cursor']), *filtros_exportacao(args))
+    with open(arquivo, encoding='utf-8') as f:
+        requisicoes = [json.loads(l) for l in f if l.strip()]
+    with open(arquivo_cursor, encoding='utf-8') as f:
+        pagina = json.load(f)
+    os.remove(arquivo)
+    os.remove(arquivo_cursor)
+    return requisicoes, pagina['cursor'], pagina['lidas']
+
+
+def conferir_versao(args, checkpoint, versao, modelo):
+    """O checkpoint vale para uma versão do prompt e um modelo: misturar notas de prompts diferentes invalidaria a recorreção."""
+    if checkpoint['versao_prompt'] is None:
+        checkpoint['versao_prompt'], checkpoint['modelo'] = versao, modelo
+        return
+    if (checkpoint['versao_prompt'], checkpoint['modelo']) != (versao, modelo):
+        raise RuntimeError(
+            f"O checkpoint é de {checkpoint['versao_prompt']} / {checkpoint['modelo']}, mas o prompt atual é "
+            f"{versao} / {modelo}. Use --reiniciar para começar a recorreção do zero.")
+
+
+async def avaliar_pagina(args, cliente, requisicoes, orcamento, barra):
+    """Avalia as requisições com concorrência limitada, gravando cada resposta em disco assim que chega."""
+    semaforo = asyncio.Semaphore(args.concorrencia)
+    arquivo = open(args.checkpoint + '.resultados.jsonl', 'a', encoding='utf-8')
+
+    async def avaliar(requisicao):
+        async with semaforo:
+            body = requisicao['body']
+            prompt_estimado = sum(len(m['content']) for m in body['messages']) // 4
+            reserva = orcamento.reservar(prompt_estimado, body.get('max_completion_tokens') or 2048)
+            if reserva is None:
+                return
+            uso = None
+            linha = {'custom_id': requisicao['custom_id'], 'error': None}
+            try:
+                resposta = await cliente.chat.completions.create(**body)
+                uso = resposta.usage
+                linha['response'] = {'status_code': 200, 'body': resposta.model_dump(exclude_none=True)}
+            except openai.APIStatusError as e:
+                # Falhas depois dos retries do SDK (429 persistente, 5xx, 400 de filtro de conteúdo)
+                linha['response'] = {'status_code': e.status_code, 'body': {'error': {'message': e.message}}}
+            except openai.APIConnectionError as e:
+                linha['error'] = {'message': f'{type(e).__name__}: {e}'}
+            finally:
+                orcamento.liberar(reserva, uso)
+            arquivo.write(json.dumps(linha, ensure_ascii=False) + '\n')
+            arquivo.flush()
+            tokens, custo = orcamento.gasto()
+            barra.set_postfix(tokens=tokens, custo=f'US$ {custo:.2f}', refresh=False)
+            barra.update(1)
+
+    try:
+        await asyncio.gather(*(avaliar(r) for r in requisicoes))
+    finally:
+        arquivo.close()
+
+
+async def executar(args):
+    if args.reiniciar:
+        for sufixo in ('', '.resultados.jsonl'):
+            if os.path.exists(args.checkpoint + sufixo):
+                os.remove(args.checkpoint + sufixo)
+    checkpoint = carregar_checkpoint(args.checkpoint)
+    modelo = args.modelo or os.environ.get('AZURE_OPENAI_DEPLOYMENT')
+    if not modelo:
+        raise RuntimeError('Informe --modelo ou defina AZURE_OPENAI_DEPLOYMENT.')
+
+    orcamento = Orcamento(checkpoint, modelo, args.max_custo_usd, args.max_tokens)
+    # Respostas de uma execução interrompida: grava antes de seguir
+    importar_resultados(args, checkpoint, orcamento)
+    checkpoint['status'] = 'em_andamento'
+    cliente = criar_cliente(assincrono=True, max_retries=args.max_retries, timeout=args.timeout)
+
+    saida = rodar_script_node('contar', *apos(checkpoint['cursor']), *filtros_exportacao(args), capturar=True)
+    restantes = json.loads(saida.strip().splitlines()[-1])['total']
+    concluidas = set(checkpoint['concluidas'])
+    print(f"🔁 Recorreção com {modelo}: {restantes} redação(ões) a partir do cursor "
+          f"({len(concluidas)} já concluída(s), US$ {checkpoint['custo_usd']:.2f} gastos).")
+
+    with tqdm(total=restantes, unit='redação', dynamic_ncols=True) as barra:
+        while True:
+            requisicoes, cursor, lidas = proxima_pagina(args, checkpoint, modelo)
+            if not requisicoes and cursor == checkpoint['cursor']:
+                break
+            if requisicoes:
+                conferir_versao(args, checkpoint, id_e_versao(requisicoes[0])[1], modelo)
+            pendentes = [r for r in requisicoes if id_e_versao(r)[0] not in concluidas]
+            # Texto curto ou já concluído numa execução anterior
+            barra.update(lidas - len(pendentes))
+            await avaliar_pagina(args, cliente, pendentes, orcamento, barra)
+            importar_resultados(args, checkpoint, orcamento)
+            concluidas = set(checkpoint['concluidas'])
+            if orcamento.esgotado:
+                # O cursor fica no início da página: as concluídas nela são puladas na retomada
+                checkpoint['status'] = 'pausado'
+                salvar_checkpoint(args.checkpoint, checkpoint)
+                return False
+            checkpoint['cursor'] = cursor
+            salvar_checkpoint(args.checkpoint, checkpoint)
+
+    checkpoint['status'] = 'concluido'
+    salvar_checkpoint(args.checkpoint, checkpoint)
+    return True
+
+
+def main():
+    carregar_env()
+    parser = argparse.ArgumentParser(description='Recorreção/backfill retomável das redações, com teto de custo.')
+    parser.add_argument('--checkpoint', default=os.path.join(BACKEND_DIR, 'backfill-checkpoint.json'))
+    parser.add_argument('--modelo', help='Deployment/modelo (padrão: AZURE_OPENAI_DEPLOYMENT)')
+    parser.add_argument('--concorrencia', type=int, default=4, help='Chamadas simultâneas (padrão 4)')
+    parser.add_argument('--max-custo-usd', type=float, default=0, help='Teto de custo do backfill inteiro (0 = sem teto)')
+    parser.add_argument('--max-tokens', type=int, default=0, help='Teto de tokens (prompt + saída) do backfill inteiro (0 = sem teto)')
+    parser.add_argument('--max-retries', type=int, default=5, help='Retries do SDK em 429/5xx (respeitam o retry-after)')
+    parser.add_argument('--timeout', type=float, default=120, help='Timeout de cada chamada, em segundos')
+    parser.add_argument('--desde', help='Só redações criadas a partir desta data (ISO)')
+    parser.add_argument('--so-sem-nota', action='store_true', help='Backfill: só redações ainda sem nota da IA')
+    parser.add_argument('--sob-demanda', action='store_true', help='Prompt só de notas (feedback gerado depois, sob demanda)')
+    parser.add_argument('--reiniciar', action='store_true', help='Descarta o checkpoint e começa do início')
+    args = parser.parse_args()
+
+    try:
+        concluido = asyncio.run(executar(args))
+    except KeyboardInterrupt:
+        print("\n⏸️ Interrompido: rode de novo para retomar (as respostas já recebidas estão salvas).")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Erro no backfill: {e}")
+        sys.exit(1)
+
+    checkpoint = carregar_checkpoint(args.checkpoint)
+    resumo = (f"{len(checkpoint['concluidas'])} concluída(s), {len(checkpoint['falhas'])} com falha, "
+              f"{checkpoint['tokens']['prompt']} tokens de prompt ({checkpoint['tokens']['cache']} do cache), "
+              f"{checkpoint['tokens']['saida']} de saída, US$ {checkpoint['custo_usd']:.2f}")
+    if not concluido:
+        print(f"⏸️ Orçamento esgotado; backfill pausado ({resumo}). Rode de novo com um teto maior para continuar.")
+        sys.exit(CODIGO_PAUSADO)
+    print(f"✅ Backfill concluído: {resumo}.")
+    if checkpoint['falhas']:
+        arquivo_falhas = args.checkpoint + '.falhas.txt'
+        with open(arquivo_falhas, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(checkpoint['falhas']) + '\n')
+        print(f"   Ids com falha em {arquivo_falhas}; para refazê-los: lote_batch_openai.py exportar --ids {arquivo_falhas}")
+
+
+if __name__ == '__main__':
+    main()
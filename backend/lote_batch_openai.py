@@ -0,0 +1,271 @@
+"""
+Correção offline em massa pela Batch API (OpenAI / Azure OpenAI Global Batch).
+
+Para backfill e recorreção de milhares de redações: as requisições vão num
+arquivo JSONL, são processadas de forma assíncrona (janela de 24h, com desconto
+e sem disputar a cota das chamadas interativas) e os resultados voltam para o
+banco. As etapas:
+
+  exportar     redações do banco → JSONL de requisições (scripts/loteBatch.ts)
+  enviar       upload do JSONL (dividido nos limites da API) e criação dos lotes
+  acompanhar   consulta os lotes até terminarem e baixa saídas e erros
+  importar     notas das saídas → banco (scripts/loteBatch.ts); ids com falha
+               ficam num arquivo para reenvio (exportar --ids)
+  cancelar     cancela os lotes em andamento
+  executar     exportar + enviar + acompanhar + importar
+
+O progresso fica em um arquivo de estado (--estado), então `acompanhar` e
+`importar` podem ser retomados depois de fechar o terminal.
+
+Como usar (PowerShell, na pasta backend):
+   $env:AZURE_OPENAI_BATCH_DEPLOYMENT = "NOME_DO_DEPLOYMENT_GLOBAL_BATCH"
+   C:/Users/jjmca/EZFix/.venv_py310/Scripts/python.exe lote_batch_openai.py executar --limite 5000
+
+Para testar localmente, suba o mock (mock_batch_openai.py) e aponte
+OPENAI_BASE_URL para ele (ver openai_cliente.py).
+"""
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+
+from openai_cliente import carregar_env, criar_cliente, usando_azure
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ESTADOS_FINAIS = ('completed', 'failed', 'expired', 'cancelled')
+# Limites por arquivo de entrada (Azure: 100 mil requisições; OpenAI: 50 mil; ambos 200 MB)
+MAX_REQUISICOES = int(os.environ.get('LOTE_BATCH_MAX_REQUISICOES') or 50000)
+MAX_BYTES = int(os.environ.get('LOTE_BATCH_MAX_BYTES') or 190 * 1024 * 1024)
+# A Batch API no Azure exige api-version mais nova que a do chat
+BATCH_API_VERSION = os.environ.get('AZURE_OPENAI_BATCH_API_VERSION', '2024-10-21')
+
+
+def carregar_estado(caminho):
+    if not os.path.exists(caminho):
+        return {'lotes': []}
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def salvar_estado(caminho, estado):
+    temporario = caminho + '.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump(estado, f, ensure_ascii=False, indent=2)
+    os.replace(temporario, caminho)
+
+
+def endpoint_chat():
+    # Azure Global Batch usa o caminho sem /v1 (o deployment vai em "model")
+    return '/chat/completions' if usando_azure() else '/v1/chat/completions'
+
+
+def rodar_script_node(*args, capturar=False):
+    """Roda scripts/loteBatch.ts (acesso ao banco via Prisma e prompts do backend); com `capturar`, devolve a saída."""
+    npx = shutil.which('npx')
+    if not npx:
+        raise RuntimeError('npx não encontrado no PATH: instale o Node.js para exportar/importar.')
+    comando = [npx, 'ts-node-dev', '--transpile-only', 'scripts/loteBatch.ts', *args]
+    resultado = subprocess.run(comando, cwd=BACKEND_DIR, check=True, stdout=subprocess.PIPE if capturar else None, text=True)
+    return resultado.stdout if capturar else None
+
+
+def dividir_arquivo(caminho, max_requisicoes=MAX_REQUISICOES, max_bytes=MAX_BYTES):
+    """Divide o JSONL em partes dentro dos limites da API; devolve os caminhos das partes."""
+    if os.path.getsize(caminho) <= max_bytes:
+        with open(caminho, 'rb') as f:
+            if sum(1 for _ in f) <= max_requisicoes:
+                return [caminho]
+    base, ext = os.path.splitext(caminho)
+    partes, atual, linhas, tamanho = [], None, 0, 0
+    with open(caminho, 'rb') as f:
+        for linha in f:
+            if atual is None or linhas >= max_requisicoes or tamanho + len(linha) > max_bytes:
+                if atual:
+                    atual.close()
+                partes.append(f'{base}.parte{len(partes) + 1:03d}{ext}')
+                atual, linhas, tamanho = open(partes[-1], 'wb'), 0, 0
+            atual.write(linha)
+            linhas += 1
+            tamanho += len(linha)
+    if atual:
+        atual.close()
+    return partes
+
+
+def cmd_exportar(args):
+    modelo = args.modelo or os.environ.get('AZURE_OPENAI_BATCH_DEPLOYMENT') or os.environ.get('AZURE_OPENAI_DEPLOYMENT')
+    if not modelo:
+        raise RuntimeError('Informe --modelo ou defina AZURE_OPENAI_BATCH_DEPLOYMENT.')
+    # O script Node roda na pasta backend: caminhos absolutos
+    extras = ['--saida', os.path.abspath(args.arquivo), '--modelo', modelo, '--url', endpoint_chat()]
+    if args.limite:
+        extras += ['--limite', str(args.limite)]
+    if args.desde:
+        extras += ['--desde', args.desde]
+    if args.ids:
+        extras += ['--ids', os.path.abspath(args.ids)]
+    if args.todas:
+        extras.append('--todas')
+    if args.sob_demanda:
+        extras.append('--sob-demanda')
+    rodar_script_node('exportar', *extras)
+
+
+def cmd_enviar(args):
+    if not os.path.exists(args.arquivo) or os.path.getsize(args.arquivo) == 0:
+        print(f"Nada a enviar: {args.arquivo} não existe ou está vazio.")
+        return
+    cliente = criar_cliente(api_version=BATCH_API_VERSION)
+    estado = carregar_estado(args.estado)
+    for parte in dividir_arquivo(args.arquivo):
+        with open(parte, 'rb') as f:
+            arquivo = cliente.files.create(file=f, purpose='batch')
+        lote = cliente.batches.create(
+            input_file_id=arquivo.id,
+            endpoint=endpoint_chat(),
+            completion_window='24h',
+            metadata={'origem': 'ezfix-backfill', 'arquivo': os.path.basename(parte)},
+        )
+        estado['lotes'].append({
+            'arquivo_entrada': parte,
+            'input_file_id': arquivo.id,
+            'batch_id': lote.id,
+            'status': lote.status,
+            'importado': False,
+        })
+        salvar_estado(args.estado, estado)
+        print(f"🚀 {os.path.basename(parte)} enviado: arquivo {arquivo.id}, lote {lote.id} ({lote.status})")
+
+
+def baixar_arquivo(cliente, arquivo_id, destino):
+    conteudo = cliente.files.content(arquivo_id)
+    with open(destino, 'wb') as f:
+        f.write(conteudo.content)
+    return destino
+
+
+def cmd_acompanhar(args):
+    cliente = criar_cliente(api_version=BATCH_API_VERSION)
+    estado = carregar_estado(args.estado)
+    pendentes = [l for l in estado['lotes'] if l['status'] not in ESTADOS_FINAIS or 'resultados' not in l]
+    if not pendentes:
+        print("Nenhum lote pendente no estado.")
+        return
+    while pendentes:
+        for registro in list(pendentes):
+            lote = cliente.batches.retrieve(registro['batch_id'])
+            registro['status'] = lote.status
+            contagem = lote.request_counts
+            feitos = f"{contagem.completed}/{contagem.total} ok, {contagem.failed} falha(s)" if contagem else 'sem contagem'
+            print(f"⏳ {registro['batch_id']}: {lote.status} ({feitos})")
+            if lote.status not in ESTADOS_FINAIS:
+                continue
+            base = os.path.splitext(registro['arquivo_entrada'])[0]
+            # Lotes expirados ou cancelados também devolvem o que foi processado
+            registro['resultados'] = [
+                baixar_arquivo(cliente, arquivo_id, f'{base}.{sufixo}.jsonl')
+                for arquivo_id, sufixo in ((lote.output_file_id, 'resultados'), (lote.error_file_id, 'erros'))
+                if arquivo_id
+            ]
+            if lote.status == 'failed' and lote.errors and lote.errors.data:
+                for erro in lote.errors.data:
+                    print(f"❌ {registro['batch_id']}: {erro.code} (linha {erro.line}): {erro.message}")
+            pendentes.remove(registro)
+        salvar_estado(args.estado, estado)
+        if pendentes:
+            time.sleep(args.intervalo)
+    print("📦 Todos os lotes terminaram.")
+
+
+def cmd_importar(args):
+    estado = carregar_estado(args.estado)
+    registros = [l for l in estado['lotes'] if l.get('resultados') and not l.get('importado')]
+    arquivos = args.resultados or [c for l in registros for c in l['resultados']]
+    if not arquivos:
+        print("Nenhum resultado novo para importar (rode `acompanhar` primeiro).")
+        return
+    rodar_script_node('importar', '--resultados', ','.join(os.path.abspath(a) for a in arquivos),
+                      '--falhas', os.path.abspath(args.falhas))
+    if not args.resultados:
+        for registro in registros:
+            registro['importado'] = True
+        salvar_estado(args.estado, estado)
+
+
+def cmd_cancelar(args):
+    cliente = criar_cliente(api_version=BATCH_API_VERSION)
+    estado = carregar_estado(args.estado)
+    for registro in estado['lotes']:
+        if registro['status'] not in ESTADOS_FINAIS:
+            registro['status'] = cliente.batches.cancel(registro['batch_id']).status
+            print(f"🛑 {registro['batch_id']}: {registro['status']}")
+    salvar_estado(args.estado, estado)
+
+
+def cmd_executar(args):
+    cmd_exportar(args)
+    cmd_enviar(args)
+    cmd_acompanhar(args)
+    cmd_importar(args)
+
+
+def main():
+    carregar_env()
+    parser = argparse.ArgumentParser(description='Correção offline de redações pela Batch API (JSONL).')
+    parser.add_argument('--estado', default=os.path.join(BACKEND_DIR, 'lote-batch-estado.json'),
+                        help='Arquivo com os lotes enviados (retomada)')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    def opcoes_exportacao(p):
+        p.add_argument('--arquivo', default='lote-batch.jsonl', help='JSONL de requisições')
+        p.add_argument('--modelo', help='Deployment da Batch API (padrão: AZURE_OPENAI_BATCH_DEPLOYMENT)')
+        p.add_argument('--limite', type=int, default=0)
+        p.add_argument('--desde', help='Só redações criadas a partir desta data (ISO)')
+        p.add_argument('--ids', help='Arquivo com um id de redação por linha (ex.: as falhas de uma importação)')
+        p.add_argument('--todas', action='store_true', help='Inclui redações que já têm nota da IA (recorreção)')
+        p.add_argument('--sob-demanda', action='store_true', help='Prompt só de notas (feedback gerado depois, sob demanda)')
+
+    p = sub.add_parser('exportar', help='Redações do banco → JSONL')
+    opcoes_exportacao(p)
+    p.set_defaults(func=cmd_exportar)
+
+    p = sub.add_parser('enviar', help='Upload do JSONL e criação dos lotes')
+    p.add_argument('--arquivo', default='lote-batch.jsonl')
+    p.set_defaults(func=cmd_enviar)
+
+    p = sub.add_parser('acompanhar', help='Consulta os lotes até terminarem e baixa os resultados')
+    p.add_argument('--intervalo', type=float, default=60, help='Segundos entre consultas (padrão 60)')
+    p.set_defaults(func=cmd_acompanhar)
+
+    p = sub.add_parser('importar', help='Resultados → notas no banco')
+    p.add_argument('--resultados', nargs='*', help='JSONL de saída (padrão: os baixados por `acompanhar`)')
+    p.add_argument('--falhas', default='lote-batch-falhas.txt', help='Ids com falha, para reenvio com exportar --ids')
+    p.set_defaults(func=cmd_importar)
+
+    p = sub.add_parser('cancelar', help='Cancela os lotes em andamento')
+    p.set_defaults(func=cmd_cancelar)
+
+    p = sub.add_parser('executar', help='exportar + enviar + acompanhar + importar')
+    opcoes_exportacao(p)
+    p.add_argument('--intervalo', type=float, default=60)
+    p.add_argument('--resultados', nargs='*')
+    p.add_argument('--falhas', default='lote-batch-falhas.txt')
+    p.set_defaults(func=cmd_executar)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except subprocess.CalledProcessError as e:
+        print(f"❌ scripts/loteBatch.ts terminou com código {e.returncode}.")
+        sys.exit(1)
+    except Exception as e:
+        print(f"❌ Erro no lote offline: {e}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
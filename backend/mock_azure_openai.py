@@ -0,0 +1,357 @@
+"""
+Mock local do chat completions do Azure OpenAI, para testes de carga e de
+falhas sem deployment (CI, offline, sem custo).
+
+Atende o mesmo caminho que o backend chama (llmClient.ts):
+  POST /openai/deployments/{deployment}/chat/completions?api-version=...
+e também /v1/chat/completions (SDK `openai` com OPENAI_BASE_URL), com ou sem
+streaming (SSE, com `stream_options.include_usage`).
+
+Respostas:
+- com `response_format` json_schema: AnaliseENEM/NotasENEM sintéticas e
+  determinísticas por texto (mock_respostas_enem.py); outros schemas do backend
+  recebem um valor que satisfaz o schema;
+- sem schema: o texto entre aspas triplas do prompt (correção do OCR) ou, se o
+  prompt pede o JSON da análise, a AnaliseENEM em texto;
+- `--taxa-invalida`: JSON truncado, competência faltando ou texto livre;
+- respostas maiores que `max_completion_tokens` são cortadas com finish_reason "length".
+
+Latência: tempo até o primeiro token (`--ttft`) sorteado de uma distribuição
+(`fixa:800`, `uniforme:200,1500`, `normal:800,200`, `lognormal:800,0.5` com a
+mediana em ms) mais a geração a `--tokens-por-s` tokens por segundo.
+
+Cota e falhas: `--rpm`/`--tpm` por deployment em janela de 60 s, com headers
+`x-ratelimit-remaining-*` e 429 com `retry-after`/`retry-after-ms` quando
+estoura; 429 e 5xx aleatórios (`--taxa-429`, `--taxa-erro`); com
+`--sem-json-schema`, o 400 de deployment sem suporte a response_format.
+Prefixos de prompt repetidos (>= 1024 tokens) contam como cache (`cached_tokens`).
+
+Uso:
+   python mock_azure_openai.py --porta 8090 --ttft lognormal:700,0.4 --tokens-por-s 80 --rpm 300 --taxa-429 0.02
+   # backend (.env)
+   AZURE_OPENAI_ENDPOINT=http://localhost:8090
+   AZURE_OPENAI_KEY=mock
+   # scripts Python
+   $env:OPENAI_BASE_URL = "http://localhost:8090/v1"
+   python azure_openai_test_openai.py bench --concorrencia 1,8,32
+Contadores do mock em GET /mock/estatisticas.
+"""
+
+import argparse
+import hashlib
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from mock_respostas_enem import (
+    conclusao_chat,
+    estimar_tokens,
+    gerar_analise,
+    gerar_invalida,
+    gerar_por_schema,
+    pede_so_notas,
+    texto_corrigido,
+    texto_da_redacao,
+)
+
+# Como no Azure: só prefixos a partir de 1024 tokens entram no cache, em blocos de 128
+CACHE_MINIMO_TOKENS = 1024
+CACHE_BLOCO_TOKENS = 128
+JANELA_COTA_S = 60.0
+
+config = argparse.Namespace(
+    ttft=lambda rnd: 0.0, tokens_por_s=0.0, rpm=0, tpm=0, taxa_429=0.0, taxa_erro=0.0,
+    taxa_invalida=0.0, retry_after=1.0, sem_json_schema=False, deployments=None,
+)
+trava = threading.Lock()
+aleatorio = random.Random()
+uso_cota = {}          # deployment -> deque[(instante, tokens)]
+prefixos_vistos = set()
+estatisticas = Counter()
+
+
+def ler_distribuicao(especificacao):
+    """`fixa:800`, `uniforme:200,1500`, `normal:800,200`, `lognormal:800,0.5` ou só `800` (ms) → sorteio em segundos."""
+    nome, _, valores = especificacao.partition(':')
+    if not valores:
+        nome, valores = 'fixa', nome
+    try:
+        p = [float(v) for v in valores.split(',')]
+        if nome == 'fixa':
+            return lambda rnd: p[0] / 1000
+        if nome == 'uniforme':
+            return lambda rnd: rnd.uniform(p[0], p[1]) / 1000
+        if nome == 'normal':
+            return lambda rnd: max(0.0, rnd.gauss(p[0], p[1])) / 1000
+        if nome == 'lognormal':
+            return lambda rnd: p[0] * math.exp(rnd.gauss(0, p[1])) / 1000
+    except (ValueError, IndexError):
+        pass
+    raise argparse.ArgumentTypeError(f'Distribuição inválida: {especificacao} (use fixa:MS, uniforme:MIN,MAX, normal:MEDIA,DP ou lognormal:MEDIANA,SIGMA)')
+
+
+def contar(nome, quantidade=1):
+    with trava:
+        estatisticas[nome] += quantidade
+
+
+def sortear(probabilidade):
+    with trava:
+        return aleatorio.random() < probabilidade
+
+
+def reservar_cota(deployment, tokens):
+    """
+    Janela deslizante de 60 s por deployment. Devolve (aceito, restantes_req,
+    restantes_tokens, espera_s); sem --rpm/--tpm não há limite.
+    """
+    agora = time.monotonic()
+    with trava:
+        janela = uso_cota.setdefault(deployment, deque())
+        while janela and agora - janela[0][0] >= JANELA_COTA_S:
+            janela.popleft()
+        usados = sum(t for _, t in janela)
+        estoura_req = config.rpm and len(janela) + 1 > config.rpm
+        estoura_tok = config.tpm and usados + tokens > config.tpm
+        if estoura_req or estoura_tok:
+            # Espera até sair da janela o suficiente para caber a requisição
+            liberado, espera = usados, JANELA_COTA_S
+            for i, (instante, t) in enumerate(janela):
+                liberado -= t
+                cabe_req = not config.rpm or len(janela) - i <= config.rpm
+                cabe_tok = not config.tpm or liberado + tokens <= config.tpm
+                if cabe_req and cabe_tok:
+                    espera = JANELA_COTA_S - (agora - instante)
+                    break
+            return False, max(0, config.rpm - len(janela)), max(0, config.tpm - usados), max(0.001, espera)
+        janela.append((agora, tokens))
+        return True, max(0, config.rpm - len(janela)), max(0, config.tpm - usados - tokens), 0.0
+
+
+def tokens_em_cache(mensagens):
+    """Simula o cache de prompt: o prefixo (tudo menos a última mensagem) repetido conta como cache."""
+    prefixo = mensagens[:-1]
+    tokens = estimar_tokens(prefixo) if prefixo else 0
+    if tokens < CACHE_MINIMO_TOKENS:
+        return 0
+    chave = hashlib.sha256(json.dumps(prefixo, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()
+    with trava:
+        visto = chave in prefixos_vistos
+        prefixos_vistos.add(chave)
+    return (tokens // CACHE_BLOCO_TOKENS) * CACHE_BLOCO_TOKENS if visto else 0
+
+
+def conteudo_resposta(body):
+    """Texto da resposta do assistente para o corpo da requisição (ver docstring do módulo)."""
+    mensagens = body.get('messages') or []
+    texto = texto_da_redacao(mensagens)
+    formato = body.get('response_format') or {}
+    schema_json = formato.get('json_schema') or {}
+    nome = schema_json.get('name')
+    pede_analise = nome in ('AnaliseENEM', 'NotasENEM') or (
+        not nome and any('notaFinal1000' in (m.get('content') or '') for m in mensagens))
+    if pede_analise and sortear(config.taxa_invalida):
+        contar('invalidas')
+        return gerar_invalida(texto, pede_so_notas(body))
+    if pede_analise:
+        return json.dumps(gerar_analise(texto, pede_so_notas(body)), ensure_ascii=False)
+    if nome:
+        return json.dumps(gerar_por_schema(schema_json.get('schema'), texto), ensure_ascii=False)
+    return texto_corrigido(mensagens)
+
+
+class ManipuladorAzure(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    def headers_cota(self, restantes_req, restantes_tok):
+        if config.rpm:
+            self.send_header('x-ratelimit-limit-requests', str(config.rpm))
+            self.send_header('x-ratelimit-remaining-requests', str(restantes_req))
+        if config.tpm:
+            self.send_header('x-ratelimit-limit-tokens', str(config.tpm))
+            self.send_header('x-ratelimit-remaining-tokens', str(restantes_tok))
+
+    def enviar_json(self, status, corpo, extras=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.send_header('x-request-id', uuid.uuid4().hex)
+        for nome, valor in (extras or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def erro(self, status, mensagem, codigo, extras=None):
+        contar(f'http_{status}')
+        self.enviar_json(status, {'error': {'message': mensagem, 'type': None, 'code': codigo, 'param': None}}, extras)
+
+    def deployment(self):
+        """Deployment do caminho Azure, o `model` do corpo no caminho OpenAI, ou None se o caminho não é de chat."""
+        partes = [p for p in urlparse(self.path).path.split('/') if p]
+        if len(partes) == 5 and partes[:2] == ['openai', 'deployments'] and partes[3:] == ['chat', 'completions']:
+            return partes[2]
+        if partes in (['v1', 'chat', 'completions'], ['chat', 'completions']):
+            return ''
+        return None
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip('/') == '/mock/estatisticas':
+            with trava:
+                copia = dict(estatisticas)
+            return self.enviar_json(200, copia)
+        self.erro(404, 'Recurso não encontrado.', 'NotFound')
+
+    def do_POST(self):
+        corpo_bruto = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        deployment = self.deployment()
+        if deployment is None:
+            return self.erro(404, 'Recurso não encontrado.', 'NotFound')
+        if not (self.headers.get('api-key') or self.headers.get('Authorization')):
+            return self.erro(401, 'Access denied due to invalid subscription key or wrong API endpoint.', '401')
+        try:
+            body = json.loads(corpo_bruto or b'{}')
+        except json.JSONDecodeError:
+            return self.erro(400, 'Corpo da requisição não é um JSON válido.', 'invalid_request_error')
+        deployment = deployment or body.get('model') or 'mock'
+        if config.deployments and deployment not in config.deployments:
+            return self.erro(404, 'The API deployment for this resource does not exist.', 'DeploymentNotFound')
+        with trava:
+            estatisticas['requisicoes'] += 1
+            estatisticas['em_andamento'] += 1
+            estatisticas['pico_em_andamento'] = max(estatisticas['pico_em_andamento'], estatisticas['em_andamento'])
+        try:
+            self.responder(deployment, body)
+        finally:
+            contar('em_andamento', -1)
+
+    def responder(self, deployment, body):
+        mensagens = body.get('messages') or []
+        if not mensagens:
+            return self.erro(400, "'messages' is a required property", 'invalid_request_error')
+        if config.sem_json_schema and body.get('response_format'):
+            return self.erro(400, "Invalid parameter: 'response_format' of type 'json_schema' is not supported with this model.", 'BadRequest')
+        max_saida = body.get('max_completion_tokens') or body.get('max_tokens') or 4096
+        prompt_tokens = estimar_tokens(mensagens)
+
+        aceito, restantes_req, restantes_tok, espera = reservar_cota(deployment, prompt_tokens + max_saida)
+        if not aceito or sortear(config.taxa_429):
+            contar('rate_limit_cota' if not aceito else 'rate_limit_injetado')
+            espera = espera or config.retry_after
+            extras = {'retry-after': str(math.ceil(espera)), 'retry-after-ms': str(int(espera * 1000)),
+                      'x-ratelimit-remaining-requests': str(restantes_req), 'x-ratelimit-remaining-tokens': str(restantes_tok)}
+            return self.erro(429, f'Requests to the ChatCompletions_Create Operation have exceeded the rate limit. Please retry after {math.ceil(espera)} seconds.',
+                             '429', extras)
+        if sortear(config.taxa_erro):
+            time.sleep(config.ttft(aleatorio))
+            return self.erro(500, 'The server had an error while processing your request.', 'InternalServerError')
+
+        conteudo = conteudo_resposta(body)
+        finish_reason = 'stop'
+        if len(conteudo) // 4 > max_saida:
+            conteudo, finish_reason = conteudo[:max_saida * 4], 'length'
+        resposta = conclusao_chat(conteudo, deployment, prompt_tokens, tokens_em_cache(mensagens), finish_reason)
+        with trava:
+            atraso = config.ttft(aleatorio)
+        geracao = resposta['usage']['completion_tokens'] / config.tokens_por_s if config.tokens_por_s else 0.0
+
+        if body.get('stream'):
+            incluir_uso = (body.get('stream_options') or {}).get('include_usage')
+            return self.enviar_stream(resposta, atraso, geracao, incluir_uso, restantes_req, restantes_tok)
+        time.sleep(atraso + geracao)
+        self.send_response(200)
+        dados = json.dumps(resposta, ensure_ascii=False).encode('utf-8')
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.headers_cota(restantes_req, restantes_tok)
+        self.end_headers()
+        self.wfile.write(dados)
+        contar('http_200')
+
+    def enviar_stream(self, resposta, atraso, geracao, incluir_uso, restantes_req, restantes_tok):
+        """SSE em chunked encoding: papel, trechos de ~4 tokens no ritmo de geração, finish_reason, uso e [DONE]."""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.headers_cota(restantes_req, restantes_tok)
+        self.end_headers()
+
+        base = {k: resposta[k] for k in ('id', 'created', 'model')}
+        base['object'] = 'chat.completion.chunk'
+
+        def evento(choices, **extras):
+            dados = ('data: ' + json.dumps({**base, 'choices': choices, **extras}, ensure_ascii=False) + '\n\n').encode('utf-8')
+            self.wfile.write(f'{len(dados):x}\r\n'.encode('ascii') + dados + b'\r\n')
+            self.wfile.flush()
+
+        conteudo = resposta['choices'][0]['message']['content']
+        trechos = [conteudo[i:i + 16] for i in range(0, len(conteudo), 16)] or ['']
+        try:
+            time.sleep(atraso)
+            evento([{'index': 0, 'delta': {'role': 'assistant', 'content': ''}, 'finish_reason': None}])
+            for trecho in trechos:
+                time.sleep(geracao / len(trechos))
+                evento([{'index': 0, 'delta': {'content': trecho}, 'finish_reason': None}])
+            evento([{'index': 0, 'delta': {}, 'finish_reason': resposta['choices'][0]['finish_reason']}])
+            if incluir_uso:
+                evento([], usage=resposta['usage'])
+            final = b'data: [DONE]\n\n'
+            self.wfile.write(f'{len(final):x}\r\n'.encode('ascii') + final + b'\r\n0\r\n\r\n')
+            contar('http_200')
+        except (BrokenPipeError, ConnectionResetError):
+            # Cliente cancelou (timeout ou AbortSignal) no meio do streaming
+            contar('streams_cancelados')
+            self.close_connection = True
+
+
+class Servidor(ThreadingHTTPServer):
+    daemon_threads = True
+    # Fila de conexões do listen(): o padrão (5) recusa rajadas de um teste de carga
+    request_queue_size = 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock local do chat completions do Azure OpenAI, com latência, cota e falhas configuráveis.')
+    parser.add_argument('--porta', type=int, default=8090)
+    parser.add_argument('--ttft', type=ler_distribuicao, default='lognormal:600,0.4',
+                        help='Tempo até o primeiro token em ms: fixa:MS, uniforme:MIN,MAX, normal:MEDIA,DP ou lognormal:MEDIANA,SIGMA (padrão lognormal:600,0.4)')
+    parser.add_argument('--tokens-por-s', type=float, default=80.0, help='Velocidade de geração da saída (0 = instantânea; padrão 80)')
+    parser.add_argument('--rpm', type=int, default=0, help='Requisições por minuto por deployment (0 = sem limite)')
+    parser.add_argument('--tpm', type=int, default=0, help='Tokens por minuto por deployment, contando prompt + max_completion_tokens (0 = sem limite)')
+    parser.add_argument('--taxa-429', type=float, default=0.0, help='Fração de requisições com 429 injetado, além da cota')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Segundos do retry-after dos 429 injetados (padrão 1)')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de requisições com HTTP 500')
+    parser.add_argument('--taxa-invalida', type=float, default=0.0, help='Fração de análises ENEM com JSON inválido para o corretor')
+    parser.add_argument('--sem-json-schema', action='store_true', help='Recusa response_format com 400, como deployments sem saída estruturada')
+    parser.add_argument('--deployments', default='', help='Deployments aceitos, separados por vírgula (os demais dão 404; padrão: qualquer um)')
+    parser.add_argument('--semente', type=int, default=None, help='Semente do sorteio de latências e falhas')
+    args = parser.parse_args()
+
+    config.ttft, config.tokens_por_s = args.ttft, args.tokens_por_s
+    config.rpm, config.tpm = args.rpm, args.tpm
+    config.taxa_429, config.retry_after, config.taxa_erro = args.taxa_429, args.retry_after, args.taxa_erro
+    config.taxa_invalida, config.sem_json_schema = args.taxa_invalida, args.sem_json_schema
+    config.deployments = {d.strip() for d in args.deployments.split(',') if d.strip()} or None
+    aleatorio.seed(args.semente)
+
+    servidor = Servidor(('127.0.0.1', args.porta), ManipuladorAzure)
+    print(f"🧪 Mock do Azure OpenAI em http://localhost:{args.porta} (SDK openai: http://localhost:{args.porta}/v1)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    with trava:
+        print(f"📊 {json.dumps(dict(estatisticas), ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,273 @@
+"""
+Mock local da Batch API (OpenAI e Azure OpenAI) para testar lote_batch_openai.py
+sem custo e sem esperar a janela de 24h.
+
+Implementa o suficiente do contrato para o SDK `openai`:
+  POST /files (multipart, purpose=batch)      GET /files/{id}      GET /files/{id}/content
+  POST /batches    GET /batches/{id}    POST /batches/{id}/cancel
+Os caminhos valem com o prefixo /v1 (OpenAI) ou /openai (Azure, ?api-version=...).
+
+Cada lote passa por validating → in_progress → finalizing → completed em
+`--duracao` segundos; as respostas são AnaliseENEM sintéticas
+(mock_respostas_enem.py), com uma fração de erros HTTP e de conteúdo inválido.
+
+Uso:
+   python mock_batch_openai.py --porta 8089 --duracao 10 --taxa-erro 0.05 --taxa-invalida 0.05
+   # em outro terminal
+   $env:OPENAI_BASE_URL = "http://localhost:8089/v1"
+   python lote_batch_openai.py executar --limite 50
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from email.parser import BytesParser
+from email.policy import default as politica_email
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from mock_respostas_enem import (
+    conclusao_chat,
+    estimar_tokens,
+    gerar_analise,
+    gerar_invalida,
+    pede_so_notas,
+    texto_da_redacao,
+)
+
+ESTADOS_FINAIS = ('completed', 'failed', 'expired', 'cancelled')
+
+arquivos = {}   # id -> {'meta': {...}, 'conteudo': bytes}
+lotes = {}      # id -> objeto Batch
+trava = threading.Lock()
+config = argparse.Namespace(duracao=10.0, taxa_erro=0.0, taxa_invalida=0.0)
+
+
+def agora():
+    return int(time.time())
+
+
+def novo_arquivo(nome, conteudo, proposito):
+    arquivo_id = f'file-{uuid.uuid4().hex[:24]}'
+    meta = {
+        'id': arquivo_id,
+        'object': 'file',
+        'bytes': len(conteudo),
+        'created_at': agora(),
+        'filename': nome,
+        'purpose': proposito,
+        'status': 'processed',
+    }
+    with trava:
+        arquivos[arquivo_id] = {'meta': meta, 'conteudo': conteudo}
+    return meta
+
+
+def atualizar_lote(lote_id, **campos):
+    with trava:
+        lotes[lote_id].update(campos)
+        return dict(lotes[lote_id])
+
+
+def responder_linha(requisicao, rnd):
+    """Uma linha do arquivo de saída (ou de erros) para uma requisição do JSONL de entrada."""
+    body = requisicao.get('body') or {}
+    linha = {
+        'id': f'batch_req_{uuid.uuid4().hex[:24]}',
+        'custom_id': requisicao.get('custom_id'),
+        'error': None,
+    }
+    if rnd.random() < config.taxa_erro:
+        linha['response'] = {
+            'status_code': 500,
+            'request_id': uuid.uuid4().hex,
+            'body': {'error': {'message': 'Erro interno simulado pelo mock.', 'type': 'server_error', 'code': None}},
+        }
+        return linha, False
+    mensagens = body.get('messages') or []
+    texto = texto_da_redacao(mensagens)
+    so_notas = pede_so_notas(body)
+    if rnd.random() < config.taxa_invalida:
+        conteudo = gerar_invalida(texto, so_notas)
+    else:
+        conteudo = json.dumps(gerar_analise(texto, so_notas), ensure_ascii=False)
+    linha['response'] = {
+        'status_code': 200,
+        'request_id': uuid.uuid4().hex,
+        'body': conclusao_chat(conteudo, body.get('model', 'mock'), estimar_tokens(mensagens)),
+    }
+    return linha, True
+
+
+def processar_lote(lote_id):
+    """Avança o lote pelos estados da Batch API e gera os arquivos de saída e de erros."""
+    lote = lotes[lote_id]
+    entrada = arquivos[lote['input_file_id']]['conteudo'].decode('utf-8')
+    passo = config.duracao / 3
+    time.sleep(passo)
+
+    requisicoes = []
+    for n, linha in enumerate(entrada.splitlines(), start=1):
+        if not linha.strip():
+            continue
+        try:
+            requisicoes.append(json.loads(linha))
+        except json.JSONDecodeError:
+            atualizar_lote(lote_id, status='failed', failed_at=agora(), errors={
+                'object': 'list',
+                'data': [{'code': 'invalid_json_line', 'line': n, 'message': 'Linha não é um JSON válido.', 'param': None}],
+            })
+            return
+    total = len(requisicoes)
+    atualizar_lote(lote_id, status='in_progress', in_progress_at=agora(),
+                   request_counts={'total': total, 'completed': 0, 'failed': 0})
+
+    rnd = random.Random(lote_id)
+    saida, erros = [], []
+    for i, requisicao in enumerate(requisicoes, start=1):
+        if lotes[lote_id]['status'] == 'cancelling':
+            break
+        linha, ok = responder_linha(requisicao, rnd)
+        (saida if ok else erros).append(linha)
+        atualizar_lote(lote_id, request_counts={'total': total, 'completed': len(saida), 'failed': len(erros)})
+        time.sleep(passo / max(1, total))
+
+    cancelado = lotes[lote_id]['status'] == 'cancelling'
+    atualizar_lote(lote_id, status='cancelling' if cancelado else 'finalizing', finalizing_at=agora())
+    time.sleep(passo)
+    campos = {'status': 'cancelled', 'cancelled_at': agora()} if cancelado else {'status': 'completed', 'completed_at': agora()}
+    # Como na API real, até um lote cancelado devolve o que já foi processado
+    if saida:
+        conteudo = ''.join(json.dumps(l, ensure_ascii=False) + '\n' for l in saida).encode('utf-8')
+        campos['output_file_id'] = novo_arquivo(f'{lote_id}_output.jsonl', conteudo, 'batch_output')['id']
+    if erros:
+        conteudo = ''.join(json.dumps(l, ensure_ascii=False) + '\n' for l in erros).encode('utf-8')
+        campos['error_file_id'] = novo_arquivo(f'{lote_id}_error.jsonl', conteudo, 'batch_output')['id']
+    atualizar_lote(lote_id, **campos)
+    print(f"✅ Lote {lote_id}: {campos['status']} ({len(saida)} ok, {len(erros)} com erro)")
+
+
+def ler_multipart(tipo, corpo):
+    """Campos de um multipart/form-data (o upload de arquivo do SDK)."""
+    mensagem = BytesParser(policy=politica_email).parsebytes(
+        b'Content-Type: ' + tipo.encode('latin-1') + b'\r\n\r\n' + corpo)
+    campos = {}
+    for parte in mensagem.iter_parts():
+        nome = parte.get_param('name', header='content-disposition')
+        campos[nome] = (parte.get_filename(), parte.get_payload(decode=True))
+    return campos
+
+
+class ManipuladorBatch(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    def caminho(self):
+        partes = [p for p in urlparse(self.path).path.split('/') if p]
+        # /v1/... (OpenAI) ou /openai/... (Azure)
+        if partes and partes[0] in ('v1', 'openai'):
+            partes = partes[1:]
+        return partes
+
+    def enviar_json(self, status, corpo):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def nao_encontrado(self, oque):
+        self.enviar_json(404, {'error': {'message': f'{oque} não encontrado.', 'type': 'invalid_request_error', 'code': 'not_found'}})
+
+    def ler_corpo(self):
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def do_GET(self):
+        partes = self.caminho()
+        if len(partes) >= 2 and partes[0] == 'files':
+            arquivo = arquivos.get(partes[1])
+            if not arquivo:
+                return self.nao_encontrado('Arquivo')
+            if len(partes) == 3 and partes[2] == 'content':
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Content-Length', str(len(arquivo['conteudo'])))
+                self.end_headers()
+                self.wfile.write(arquivo['conteudo'])
+                return
+            return self.enviar_json(200, arquivo['meta'])
+        if len(partes) == 2 and partes[0] == 'batches':
+            lote = lotes.get(partes[1])
+            return self.enviar_json(200, lote) if lote else self.nao_encontrado('Lote')
+        self.nao_encontrado('Recurso')
+
+    def do_POST(self):
+        partes = self.caminho()
+        corpo = self.ler_corpo()
+        if partes == ['files']:
+            campos = ler_multipart(self.headers.get('Content-Type', ''), corpo)
+            nome, conteudo = campos.get('file', (None, None))
+            if conteudo is None:
+                return self.enviar_json(400, {'error': {'message': 'Campo "file" ausente.', 'type': 'invalid_request_error'}})
+            proposito = (campos.get('purpose', (None, b'batch'))[1] or b'batch').decode('utf-8')
+            return self.enviar_json(200, novo_arquivo(nome or 'upload.jsonl', conteudo, proposito))
+        if partes == ['batches']:
+            dados = json.loads(corpo or b'{}')
+            if dados.get('input_file_id') not in arquivos:
+                return self.nao_encontrado('Arquivo de entrada')
+            lote_id = f'batch_{uuid.uuid4().hex[:24]}'
+            lote = {
+                'id': lote_id,
+                'object': 'batch',
+                'endpoint': dados.get('endpoint'),
+                'input_file_id': dados['input_file_id'],
+                'completion_window': dados.get('completion_window', '24h'),
+                'status': 'validating',
+                'created_at': agora(),
+                'expires_at': agora() + 24 * 3600,
+                'output_file_id': None,
+                'error_file_id': None,
+                'errors': None,
+                'metadata': dados.get('metadata'),
+                'request_counts': {'total': 0, 'completed': 0, 'failed': 0},
+            }
+            with trava:
+                lotes[lote_id] = lote
+            threading.Thread(target=processar_lote, args=(lote_id,), daemon=True).start()
+            print(f"📥 Lote {lote_id} criado a partir de {dados['input_file_id']}")
+            return self.enviar_json(200, lote)
+        if len(partes) == 3 and partes[0] == 'batches' and partes[2] == 'cancel':
+            if partes[1] not in lotes:
+                return self.nao_encontrado('Lote')
+            lote = lotes[partes[1]]
+            if lote['status'] not in ESTADOS_FINAIS:
+                lote = atualizar_lote(partes[1], status='cancelling', cancelling_at=agora())
+            return self.enviar_json(200, lote)
+        self.nao_encontrado('Recurso')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock local da Batch API (OpenAI/Azure) com respostas ENEM sintéticas.')
+    parser.add_argument('--porta', type=int, default=8089)
+    parser.add_argument('--duracao', type=float, default=10.0, help='Segundos de cada lote, da validação ao fim (padrão 10)')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de requisições com HTTP 500 (vão para o arquivo de erros)')
+    parser.add_argument('--taxa-invalida', type=float, default=0.0, help='Fração de respostas com JSON inválido para o corretor')
+    args = parser.parse_args()
+    config.duracao, config.taxa_erro, config.taxa_invalida = args.duracao, args.taxa_erro, args.taxa_invalida
+
+    servidor = ThreadingHTTPServer(('127.0.0.1', args.porta), ManipuladorBatch)
+    print(f"🧪 Mock da Batch API em http://localhost:{args.porta}/v1 (Azure: http://localhost:{args.porta})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,363 @@
+"""
+Mock local do OCR (Google Vision e Azure Read) com fitas de gravação/reprodução,
+para testar e medir o caminho de OCR do backend sem as nuvens, em alta concorrência.
+
+Atende as mesmas chamadas do backend:
+  POST /v1/images:annotate                           Google Vision REST (googleVisionService.ts
+                                                     com GOOGLE_VISION_ENDPOINT)
+  POST /computervision/imageanalysis:analyze?...     Azure Read v4.0 (azureVisionService.ts
+                                                     com AZURE_CV_ENDPOINT)
+  GET  /mock/estatisticas                            contadores do mock
+
+Fitas: um JSON por imagem em `--fitas/<google|azure>/<sha256 da imagem>.json`,
+com o status, o corpo e a latência da resposta real. A chave é o hash dos bytes
+que o backend envia, ou seja, da imagem já pré-processada pelo ocrService: se o
+pré-processamento mudar, grave de novo.
+- `--modo reproduzir` (padrão): responde das fitas; imagem sem fita recebe um
+  OCR sintético (uma redação do corpus de benchmark, escolhida pelo hash) ou,
+  com `--faltando erro`, 404;
+- `--modo gravar`: repassa cada chamada ao serviço real (`--google-upstream`,
+  `--azure-upstream`, com as credenciais que o backend enviou ou as de
+  GOOGLE_VISION_API_KEY / AZURE_CV_KEY no ambiente do mock) e grava a fita;
+- `--modo auto`: reproduz o que já tem fita e grava o resto.
+
+Latência: a gravada na fita (`--latencia gravada`, padrão; respostas sintéticas
+usam lognormal:900,0.3) ou uma distribuição fixa para tudo (`fixa:MS`,
+`uniforme:MIN,MAX`, `normal:MEDIA,DP`, `lognormal:MEDIANA,SIGMA`). Falhas
+injetadas: `--taxa-429` (com Retry-After), `--taxa-erro` (5xx) e `--taxa-vazio`
+(imagem sem texto detectado).
+
+Uso:
+   python mock_ocr.py --porta 8092 --modo gravar --azure-upstream https://<recurso>.cognitiveservices.azure.com
+   python mock_ocr.py --porta 8092 --taxa-429 0.02 --latencia lognormal:1200,0.4
+   # backend (.env)
+   GOOGLE_VISION_ENDPOINT=http://localhost:8092
+   AZURE_CV_ENDPOINT=http://localhost:8092
+   AZURE_CV_KEY=mock
+   npm run benchmark:ocr -- --concorrencia 1,8,32
+"""
+
+import argparse
+import base64
+import hashlib
+import json
+import math
+import os
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import urlparse
+
+from mock_azure_openai import Servidor, ler_distribuicao
+from mock_respostas_enem import aleatorio_do_texto
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(BASE_DIR, 'scripts', 'corpus', 'redacoes-benchmark.json')
+ROTA_GOOGLE = '/v1/images:annotate'
+ROTA_AZURE = '/computervision/imageanalysis:analyze'
+LATENCIA_SINTETICA = 'lognormal:900,0.3'
+CARACTERES_POR_LINHA = 60
+# Credenciais repassadas ao serviço real no modo de gravação
+HEADERS_AUTENTICACAO = ('x-goog-api-key', 'Authorization', 'Ocp-Apim-Subscription-Key')
+
+config = argparse.Namespace(
+    fitas=os.path.join(BASE_DIR, 'fitas-ocr'), modo='reproduzir', faltando='sintetico', latencia=None,
+    taxa_429=0.0, taxa_erro=0.0, taxa_vazio=0.0, retry_after=1.0,
+    google_upstream='https://vision.googleapis.com', azure_upstream='',
+)
+trava = threading.Lock()
+estatisticas = Counter()
+aleatorio = random.Random()
+latencia_sintetica = ler_distribuicao(LATENCIA_SINTETICA)
+corpus = []
+
+
+def contar(nome):
+    with trava:
+        estatisticas[nome] += 1
+
+
+def sortear(probabilidade):
+    with trava:
+        return aleatorio.random() < probabilidade
+
+
+def caminho_fita(servico, chave):
+    return os.path.join(config.fitas, servico, f'{chave}.json')
+
+
+def ler_fita(servico, chave):
+    try:
+        with open(caminho_fita(servico, chave), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def gravar_fita(servico, chave, status, corpo, latencia_ms):
+    caminho = caminho_fita(servico, chave)
+    os.makedirs(os.path.dirname(caminho), exist_ok=True)
+    temporario = f'{caminho}.{threading.get_ident()}.tmp'
+    with open(temporario, 'w', encoding='utf-8') as f:
+        json.dump({
+            'servico': servico,
+            'sha256': chave,
+            'gravadoEm': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'status': status,
+            'latenciaMs': latencia_ms,
+            'corpo': corpo,
+        }, f, ensure_ascii=False, indent=2)
+    # Escritas concorrentes da mesma imagem: a última vence, sem arquivo pela metade
+    os.replace(temporario, caminho)
+    contar(f'fitas_gravadas_{servico}')
+
+
+def repassar(url, corpo, headers):
+    """Chamada ao serviço real: (status, corpo JSON, latência em ms)."""
+    requisicao = urllib.request.Request(url, data=corpo, headers=headers, method='POST')
+    inicio = time.monotonic()
+    try:
+        with urllib.request.urlopen(requisicao, timeout=60) as resposta:
+            status, dados = resposta.status, resposta.read()
+    except urllib.error.HTTPError as erro:
+        status, dados = erro.code, erro.read()
+    latencia_ms = int((time.monotonic() - inicio) * 1000)
+    try:
+        return status, json.loads(dados or b'{}'), latencia_ms
+    except json.JSONDecodeError:
+        return status, {'error': {'message': dados.decode('utf-8', 'replace')[:500]}}, latencia_ms
+
+
+def texto_sintetico(chave):
+    """Redação do corpus escolhida pelo hash, em linhas numeradas como na folha de redação."""
+    rnd = aleatorio_do_texto(chave)
+    texto = rnd.choice(corpus)['texto'] if corpus else 'Texto sintético do mock de OCR.'
+    linhas, atual = [], ''
+    for palavra in texto.split():
+        if atual and len(atual) + len(palavra) + 1 > CARACTERES_POR_LINHA:
+            linhas.append(atual)
+            atual = palavra
+        else:
+            atual = f'{atual} {palavra}'.strip()
+    if atual:
+        linhas.append(atual)
+    return [f'{n} {linha}' for n, linha in enumerate(linhas, start=1)], rnd
+
+
+def sintetico_google(chave, vazio=False):
+    if vazio:
+        return {}
+    linhas, rnd = texto_sintetico(chave)
+    texto = '\n'.join(linhas) + '\n'
+    return {
+        'textAnnotations': [{'locale': 'pt', 'description': texto}],
+        'fullTextAnnotation': {
+            'text': texto,
+            'pages': [{'width': 1240, 'height': 1754, 'confidence': round(rnd.uniform(0.82, 0.97), 3)}],
+        },
+    }
+
+
+def sintetico_azure(chave, vazio=False):
+    corpo = {'modelVersion': '2023-10-01', 'metadata': {'width': 1240, 'height': 1754}, 'readResult': {'blocks': []}}
+    if vazio:
+        return corpo
+    linhas, rnd = texto_sintetico(chave)
+    linhas_read = []
+    for n, linha in enumerate(linhas):
+        y = 80 + n * 50
+        poligono = [{'x': 60, 'y': y}, {'x': 1180, 'y': y}, {'x': 1180, 'y': y + 40}, {'x': 60, 'y': y + 40}]
+        palavras = [{
+            'text': palavra,
+            'boundingPolygon': poligono,
+            'confidence': round(rnd.uniform(0.7, 0.99), 3),
+            # O azureVisionService separa as linhas manuscritas por `style`
+            'style': {'name': 'handwritten', 'confidence': 0.9},
+        } for palavra in linha.split()]
+        linhas_read.append({'text': linha, 'boundingPolygon': poligono, 'words': palavras})
+    corpo['readResult']['blocks'].append({'lines': linhas_read})
+    return corpo
+
+
+def latencia(fita):
+    """Segundos de espera para uma resposta (da fita ou sintética)."""
+    with trava:
+        if config.latencia:
+            return config.latencia(aleatorio)
+        if fita:
+            return fita.get('latenciaMs', 0) / 1000
+        return latencia_sintetica(aleatorio)
+
+
+class ManipuladorOCR(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, formato, *args):
+        pass
+
+    def enviar_json(self, status, corpo, extras=None):
+        dados = json.dumps(corpo, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(dados)))
+        for nome, valor in (extras or {}).items():
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+        contar(f'http_{status}')
+
+    def headers_repasse(self, tipo, variavel):
+        headers = {'Content-Type': tipo}
+        for nome in HEADERS_AUTENTICACAO:
+            if self.headers.get(nome):
+                headers[nome] = self.headers[nome]
+        if os.environ.get(variavel):
+            headers.pop('Authorization', None)
+            headers['x-goog-api-key' if variavel == 'GOOGLE_VISION_API_KEY' else 'Ocp-Apim-Subscription-Key'] = os.environ[variavel]
+        return headers
+
+    def falha_injetada(self, servico):
+        """429 ou 5xx sorteados, no formato de erro de cada serviço. True se respondeu."""
+        if sortear(config.taxa_429):
+            contar(f'rate_limit_{servico}')
+            segundos = str(math.ceil(config.retry_after))
+            if servico == 'google':
+                self.enviar_json(429, {'error': {'code': 429, 'message': 'Quota exceeded for quota metric.', 'status': 'RESOURCE_EXHAUSTED'}})
+            else:
+                self.enviar_json(429, {'error': {'code': '429', 'message': f'Rate limit is exceeded. Try again in {segundos} seconds.'}},
+                                 {'Retry-After': segundos})
+            return True
+        if sortear(config.taxa_erro):
+            time.sleep(latencia(None))
+            if servico == 'google':
+                self.enviar_json(503, {'error': {'code': 503, 'message': 'The service is currently unavailable.', 'status': 'UNAVAILABLE'}})
+            else:
+                self.enviar_json(500, {'error': {'code': 'InternalServerError', 'message': 'An unexpected error occurred.'}})
+            return True
+        return False
+
+    def do_GET(self):
+        if urlparse(self.path).path.rstrip('/') == '/mock/estatisticas':
+            with trava:
+                copia = dict(estatisticas)
+            return self.enviar_json(200, copia)
+        self.enviar_json(404, {'error': {'code': 404, 'message': 'Recurso não encontrado.'}})
+
+    def do_POST(self):
+        corpo = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        rota = urlparse(self.path).path
+        contar('requisicoes')
+        if rota == ROTA_GOOGLE:
+            if not (self.headers.get('x-goog-api-key') or self.headers.get('Authorization') or 'key=' in self.path):
+                return self.enviar_json(403, {'error': {'code': 403, 'message': 'The request is missing a valid API key.', 'status': 'PERMISSION_DENIED'}})
+            return self.google(corpo)
+        if rota == ROTA_AZURE:
+            if not self.headers.get('Ocp-Apim-Subscription-Key'):
+                return self.enviar_json(401, {'error': {'code': '401', 'message': 'Access denied due to invalid subscription key or wrong API endpoint.'}})
+            return self.azure(corpo)
+        self.enviar_json(404, {'error': {'code': 404, 'message': 'Recurso não encontrado.'}})
+
+    def google(self, corpo):
+        try:
+            requisicoes = json.loads(corpo or b'{}').get('requests') or []
+            chaves = [hashlib.sha256(base64.b64decode((r.get('image') or {}).get('content') or '')).hexdigest() for r in requisicoes]
+        except (ValueError, AttributeError):
+            return self.enviar_json(400, {'error': {'code': 400, 'message': 'Invalid JSON payload received.', 'status': 'INVALID_ARGUMENT'}})
+        if not chaves:
+            return self.enviar_json(400, {'error': {'code': 400, 'message': 'No requests specified.', 'status': 'INVALID_ARGUMENT'}})
+        if self.falha_injetada('google'):
+            return
+
+        fitas = {c: ler_fita('google', c) for c in chaves} if config.modo != 'gravar' else {}
+        if config.modo == 'gravar' or (config.modo == 'auto' and not all(fitas.values())):
+            url = f"{config.google_upstream.rstrip('/')}{self.path}"
+            status, resposta, latencia_ms = repassar(url, corpo, self.headers_repasse('application/json', 'GOOGLE_VISION_API_KEY'))
+            if status == 200:
+                for chave, item in zip(chaves, resposta.get('responses') or []):
+                    gravar_fita('google', chave, status, item, latencia_ms)
+            return self.enviar_json(status, resposta)
+
+        respostas = []
+        for chave in chaves:
+            fita = fitas.get(chave)
+            if fita:
+                contar('fitas_reproduzidas')
+                respostas.append(fita['corpo'])
+            elif config.faltando == 'erro':
+                return self.enviar_json(404, {'error': {'code': 404, 'message': f'Sem fita para a imagem {chave}.', 'status': 'NOT_FOUND'}})
+            else:
+                contar('sinteticas')
+                respostas.append(sintetico_google(chave, sortear(config.taxa_vazio)))
+        time.sleep(max(latencia(fitas.get(c)) for c in chaves))
+        self.enviar_json(200, {'responses': respostas})
+
+    def azure(self, corpo):
+        chave = hashlib.sha256(corpo).hexdigest()
+        if self.falha_injetada('azure'):
+            return
+        fita = ler_fita('azure', chave) if config.modo != 'gravar' else None
+        if config.modo == 'gravar' or (config.modo == 'auto' and not fita):
+            if not config.azure_upstream:
+                return self.enviar_json(502, {'error': {'code': 'MockSemUpstream', 'message': 'Informe --azure-upstream para gravar fitas do Azure.'}})
+            url = f"{config.azure_upstream.rstrip('/')}{self.path}"
+            status, resposta, latencia_ms = repassar(url, corpo, self.headers_repasse('application/octet-stream', 'AZURE_CV_KEY'))
+            if status == 200:
+                gravar_fita('azure', chave, status, resposta, latencia_ms)
+            return self.enviar_json(status, resposta)
+
+        if fita:
+            contar('fitas_reproduzidas')
+            resposta = fita['corpo']
+        elif config.faltando == 'erro':
+            return self.enviar_json(404, {'error': {'code': 'NotFound', 'message': f'Sem fita para a imagem {chave}.'}})
+        else:
+            contar('sinteticas')
+            resposta = sintetico_azure(chave, sortear(config.taxa_vazio))
+        time.sleep(latencia(fita))
+        self.enviar_json(200, resposta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Mock local do Google Vision e do Azure Read com fitas de gravação/reprodução.')
+    parser.add_argument('--porta', type=int, default=8092)
+    parser.add_argument('--fitas', default=os.path.join(BASE_DIR, 'fitas-ocr'), help='Pasta das fitas (padrão backend/fitas-ocr)')
+    parser.add_argument('--modo', choices=('reproduzir', 'gravar', 'auto'), default='reproduzir')
+    parser.add_argument('--faltando', choices=('sintetico', 'erro'), default='sintetico',
+                        help='Imagem sem fita no modo reproduzir: OCR sintético (padrão) ou 404')
+    parser.add_argument('--latencia', default='gravada',
+                        help='"gravada" (padrão) ou uma distribuição em ms: fixa:MS, uniforme:MIN,MAX, normal:MEDIA,DP, lognormal:MEDIANA,SIGMA')
+    parser.add_argument('--taxa-429', type=float, default=0.0, help='Fração de requisições com 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Segundos do Retry-After dos 429 (padrão 1)')
+    parser.add_argument('--taxa-erro', type=float, default=0.0, help='Fração de requisições com 5xx')
+    parser.add_argument('--taxa-vazio', type=float, default=0.0, help='Fração de respostas sintéticas sem texto detectado')
+    parser.add_argument('--google-upstream', default='https://vision.googleapis.com', help='Google Vision real, para gravar')
+    parser.add_argument('--azure-upstream', default='', help='Endpoint do recurso de Visão do Azure, para gravar')
+    parser.add_argument('--semente', type=int, default=None, help='Semente do sorteio de latências e falhas')
+    args = parser.parse_args()
+
+    config.fitas, config.modo, config.faltando = args.fitas, args.modo, args.faltando
+    config.latencia = None if args.latencia == 'gravada' else ler_distribuicao(args.latencia)
+    config.taxa_429, config.retry_after = args.taxa_429, args.retry_after
+    config.taxa_erro, config.taxa_vazio = args.taxa_erro, args.taxa_vazio
+    config.google_upstream, config.azure_upstream = args.google_upstream, args.azure_upstream
+    aleatorio.seed(args.semente)
+    if os.path.exists(CORPUS_PATH):
+        with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+            corpus.extend(json.load(f))
+
+    servidor = Servidor(('127.0.0.1', args.porta), ManipuladorOCR)
+    print(f"🧪 Mock de OCR em http://localhost:{args.porta} (modo {args.modo}, fitas em {args.fitas})")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    with trava:
+        print(f"📊 {json.dumps(dict(estatisticas), ensure_ascii=False)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,142 @@
+"""
+Respostas sintéticas do corretor ENEM para os mocks locais (mock_batch_openai.py
+e mock_azure_openai.py).
+
+As notas são determinísticas por texto (hash da redação): rodar o mesmo corpus
+duas vezes dá as mesmas notas, o que facilita conferir a importação.
+"""
+
+import hashlib
+import json
+import random
+import time
+import uuid
+
+NOTAS_VALIDAS = [0, 40, 80, 120, 160, 200]
+NOMES_COMPETENCIAS = {
+    'c1': 'Competência I: domínio da escrita formal',
+    'c2': 'Competência II: compreensão da proposta',
+    'c3': 'Competência III: seleção e organização dos argumentos',
+    'c4': 'Competência IV: mecanismos de coesão',
+    'c5': 'Competência V: proposta de intervenção',
+}
+TIPOS_INVALIDOS = ('truncada', 'sem_competencia', 'texto_livre')
+
+
+def aleatorio_do_texto(texto):
+    """Gerador pseudoaleatório semeado pelo texto."""
+    semente = int(hashlib.sha256(texto.encode('utf-8')).hexdigest()[:16], 16)
+    return random.Random(semente)
+
+
+def texto_da_redacao(mensagens):
+    """A redação vai na última mensagem do usuário (ver mensagensEnem no backend)."""
+    for m in reversed(mensagens or []):
+        if m.get('role') == 'user':
+            return m.get('content') or ''
+    return ''
+
+
+def pede_so_notas(body):
+    formato = (body or {}).get('response_format') or {}
+    return (formato.get('json_schema') or {}).get('name') == 'NotasENEM'
+
+
+def estimar_tokens(mensagens):
+    return max(1, sum(len(m.get('content') or '') for m in mensagens or []) // 4)
+
+
+def gerar_analise(texto, so_notas=False):
+    """AnaliseENEM válida (ou, com `so_notas`, o formato NotasENEM) para o texto."""
+    rnd = aleatorio_do_texto(texto)
+    # Notas concentradas no meio da escala, como nas redações reais
+    notas = {c: rnd.choice(NOTAS_VALIDAS[2:5] if rnd.random() < 0.8 else NOTAS_VALIDAS) for c in NOMES_COMPETENCIAS}
+    tese = 'O autor defende que o tema exige ação conjunta do Estado e da sociedade.'
+    if so_notas:
+        return {'tesePrincipal': tese, 'competencias': {c: {'nota': n} for c, n in notas.items()}}
+    return {
+        'notaFinal1000': sum(notas.values()),
+        'tesePrincipal': tese,
+        'tituloSugerido': 'Caminhos para um problema coletivo',
+        'comentarioGeral': 'Texto com estrutura dissertativa adequada; a argumentação pode ser aprofundada.',
+        'competencias': {
+            c: {
+                'nome': nome,
+                'nota': notas[c],
+                'comentario': f'Desempenho {"bom" if notas[c] >= 160 else "mediano" if notas[c] >= 80 else "insuficiente"} nesta competência.',
+                'pontosFortes': ['Uso adequado da norma padrão na maior parte do texto.'],
+                'pontosAMelhorar': ['Desenvolver melhor a relação entre os argumentos.'],
+            }
+            for c, nome in NOMES_COMPETENCIAS.items()
+        },
+    }
+
+
+def gerar_invalida(texto, so_notas=False, tipo=None):
+    """Conteúdo que o validador do backend recusa: JSON truncado, competência faltando ou texto livre."""
+    tipo = tipo or aleatorio_do_texto(texto + 'invalida').choice(TIPOS_INVALIDOS)
+    analise = gerar_analise(texto, so_notas)
+    if tipo == 'truncada':
+        bruto = json.dumps(analise, ensure_ascii=False)
+        return bruto[:len(bruto) // 2]
+    if tipo == 'sem_competencia':
+        del analise['competencias']['c5']
+        return json.dumps(analise, ensure_ascii=False)
+    return 'Desculpe, não consigo avaliar esta redação no formato solicitado.'
+
+
+def gerar_por_schema(schema, texto, rnd=None):
+    """
+    Valor que satisfaz o JSON schema do `response_format` (os demais formatos do
+    backend: AvaliacoesENEM, feedback, lote, delta...). Objetos com
+    `competencias` viram uma AnaliseENEM/NotasENEM coerente com o texto.
+    """
+    rnd = rnd or aleatorio_do_texto(texto)
+    schema = schema or {}
+    tipo = schema.get('type')
+    propriedades = schema.get('properties') or {}
+    if 'enum' in schema:
+        return rnd.choice(schema['enum'])
+    if tipo == 'object':
+        if 'competencias' in propriedades and 'tesePrincipal' in propriedades:
+            return gerar_analise(texto + str(rnd.random()), so_notas='notaFinal1000' not in propriedades)
+        return {nome: gerar_por_schema(sub, texto, rnd) for nome, sub in propriedades.items()}
+    if tipo == 'array':
+        # Três itens: um por perfil de corretor na estratégia de chamada única
+        return [gerar_por_schema(schema.get('items'), texto, rnd) for _ in range(3)]
+    if tipo == 'integer':
+        return rnd.randint(0, 200)
+    if tipo == 'number':
+        return round(rnd.uniform(0, 1), 2)
+    if tipo == 'boolean':
+        return rnd.random() < 0.5
+    return 'Trecho gerado pelo mock.'
+
+
+def texto_corrigido(mensagens):
+    """Resposta de texto livre (correção do OCR, formatação): devolve o texto entre aspas triplas do prompt."""
+    prompt = texto_da_redacao(mensagens)
+    partes = prompt.split('"""')
+    return partes[1].strip() if len(partes) >= 3 else prompt.strip()
+
+
+def conclusao_chat(conteudo, modelo, prompt_tokens, cached_tokens=0, finish_reason='stop'):
+    """Objeto chat.completion no formato da API (inclui o uso de tokens com cache de prompt)."""
+    completion_tokens = max(1, len(conteudo) // 4)
+    return {
+        'id': f'chatcmpl-{uuid.uuid4().hex[:24]}',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': modelo,
+        'choices': [{
+            'index': 0,
+            'message': {'role': 'assistant', 'content': conteudo},
+            'finish_reason': finish_reason,
+        }],
+        'usage': {
+            'prompt_tokens': prompt_tokens,
+            'completion_tokens': completion_tokens,
+            'total_tokens': prompt_tokens + completion_tokens,
+            'prompt_tokens_details': {'cached_tokens': cached_tokens},
+        },
+    }
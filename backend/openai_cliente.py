@@ -0,0 +1,89 @@
+"""
+Configuração compartilhada dos scripts Python que falam com o LLM
+(lote_batch_openai.py, backfill_openai.py e companhia).
+
+Carrega o .env do backend e cria o cliente do SDK `openai` (o do `.venv_py310`):
+- Azure OpenAI: AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_KEY e AZURE_OPENAI_API_VERSION
+  (as mesmas variáveis do backend Node);
+- OpenAI ou um mock local: OPENAI_BASE_URL (ex.: http://localhost:8089/v1) e
+  OPENAI_API_KEY (qualquer valor no mock). Tem precedência sobre o Azure.
+"""
+
+import json
+import os
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+ENV_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
+
+
+def carregar_env():
+    """Carrega o .env do backend (se existir), tolerando UTF-16/BOM como o script de teste do Azure."""
+    if not os.path.exists(ENV_PATH):
+        return
+    tentadas = []
+    for enc in ('utf-8', 'utf-8-sig', 'utf-16', 'latin-1'):
+        try:
+            load_dotenv(dotenv_path=ENV_PATH, encoding=enc)
+            return
+        except UnicodeDecodeError:
+            tentadas.append(enc)
+    print(f"Aviso: não foi possível ler {ENV_PATH} nas codificações testadas: {tentadas}")
+
+
+def origem_endpoint(endpoint):
+    """Normaliza o endpoint do Azure: se veio com path (/openai/...), fica só a origem."""
+    endpoint = endpoint.rstrip('/')
+    p = urlparse(endpoint)
+    if p.path and '/openai' in p.path:
+        return f"{p.scheme}://{p.netloc}"
+    return endpoint
+
+
+def usando_azure():
+    return not os.environ.get('OPENAI_BASE_URL') and bool(os.environ.get('AZURE_OPENAI_ENDPOINT'))
+
+
+def criar_cliente(assincrono=False, api_version=None, **opcoes):
+    """
+    Cria OpenAI/AzureOpenAI (ou as versões assíncronas). `api_version` sobrepõe
+    AZURE_OPENAI_API_VERSION (a Batch API exige uma versão mais nova que o chat).
+    `opcoes` vai direto para o construtor (ex.: max_retries, timeout).
+    """
+    from openai import AsyncAzureOpenAI, AsyncOpenAI, AzureOpenAI, OpenAI
+
+    if usando_azure():
+        key = os.environ.get('AZURE_OPENAI_KEY')
+        if not key:
+            raise RuntimeError('Defina AZURE_OPENAI_KEY no ambiente (ou OPENAI_BASE_URL para um mock local).')
+        classe = AsyncAzureOpenAI if assincrono else AzureOpenAI
+        return classe(
+            azure_endpoint=origem_endpoint(os.environ['AZURE_OPENAI_ENDPOINT']),
+            api_key=key,
+            api_version=api_version or os.environ.get('AZURE_OPENAI_API_VERSION', '2024-10-21'),
+            **opcoes,
+        )
+
+    base_url = os.environ.get('OPENAI_BASE_URL')
+    if not base_url and not os.environ.get('OPENAI_API_KEY'):
+        raise RuntimeError('Defina AZURE_OPENAI_ENDPOINT/AZURE_OPENAI_KEY ou OPENAI_BASE_URL/OPENAI_API_KEY no ambiente.')
+    classe = AsyncOpenAI if assincrono else OpenAI
+    return classe(base_url=base_url, api_key=os.environ.get('OPENAI_API_KEY', 'mock'), **opcoes)
+
+
+def preco_1k(modelo):
+    """
+    Preço em US$ por 1000 tokens (entrada, saída) do modelo, com as mesmas
+    variáveis do backend: LLM_PRECOS_1K por modelo/deployment e, sem ele, os
+    preços do Azure (AZURE_OPENAI_PRECO_ENTRADA_1K / AZURE_OPENAI_PRECO_SAIDA_1K).
+    """
+    try:
+        por_modelo = json.loads(os.environ.get('LLM_PRECOS_1K') or '{}')
+    except json.JSONDecodeError:
+        print('Aviso: LLM_PRECOS_1K não é um JSON válido; usando os preços do Azure.')
+        por_modelo = {}
+    if modelo in por_modelo:
+        return float(por_modelo[modelo].get('entrada', 0)), float(por_modelo[modelo].get('saida', 0))
+    return (float(os.environ.get('AZURE_OPENAI_PRECO_ENTRADA_1K') or 0.0025),
+            float(os.environ.get('AZURE_OPENAI_PRECO_SAIDA_1K') or 0.01))
@@ -0,0 +1,20 @@
+-- CreateTable
+CREATE TABLE "RespostaLLMCache" (
+    "chave" TEXT NOT NULL,
+    "uso" TEXT NOT NULL,
+    "versaoPrompt" TEXT NOT NULL,
+    "deployment" TEXT NOT NULL,
+    "resposta" TEXT NOT NULL,
+    "promptTokens" INTEGER NOT NULL DEFAULT 0,
+    "completionTokens" INTEGER NOT NULL DEFAULT 0,
+    "criadoEm" TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    "expiraEm" TIMESTAMP(3) NOT NULL,
+
+    CONSTRAINT "RespostaLLMCache_pkey" PRIMARY KEY ("chave")
+);
+
+-- CreateIndex
+CREATE INDEX "RespostaLLMCache_uso_versaoPrompt_idx" ON "RespostaLLMCache"("uso", "versaoPrompt");
+
+-- CreateIndex
+CREATE INDEX "RespostaLLMCache_expiraEm_idx" ON "RespostaLLMCache"("expiraEm");
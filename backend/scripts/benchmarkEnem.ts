@@ -0,0 +1,162 @@
+// benchmarkEnem.ts
+// Compara as estratégias de avaliação ENEM (três chamadas x chamada única etc.)
+// sobre um corpus fixo de redações: variância das notas entre repetições,
+// latência e tokens consumidos.
+//
+// Uso (na pasta backend, com o .env do Azure OpenAI configurado):
+//   npx ts-node-dev --transpile-only scripts/benchmarkEnem.ts \
+//       --estrategias adaptativa,quorum,chamada-unica --repeticoes 3 --saida benchmark-enem.json
+// O cache de respostas do LLM fica desligado (cada repetição é uma chamada real);
+// use --com-cache para medir o comportamento com o cache ligado.
+
+import fs from 'fs';
+import path from 'path';
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+import { analisarEnem, EstrategiaEnem } from '../src/services/ennAnalysisService';
+import { obterContador } from '../src/services/metricasService';
+import { definirCacheLLMAtivo } from '../src/services/cacheLLMService';
+
+type RedacaoCorpus = { id: string; tema: string; texto: string };
+
+type Execucao = {
+    redacao: string;
+    estrategia: EstrategiaEnem;
+    repeticao: number;
+    latenciaMs: number;
+    notaFinal1000: number | null;
+    notas: number[];
+    tokensPrompt: number;
+    tokensCache: number;
+    tokensSaida: number;
+    erro?: string;
+};
+
+const argumento = (nome: string, padrao: string): string => {
+    const i = process.argv.indexOf(`--${nome}`);
+    return i >= 0 && process.argv[i + 1] ? process.argv[i + 1] : padrao;
+};
+
+const media = (v: number[]) => (v.length ? v.reduce((s, x) => s + x, 0) / v.length : 0);
+const desvioPadrao = (v: number[]) => {
+    if (v.length < 2) return 0;
+    const m = media(v);
+    return Math.sqrt(v.reduce((s, x) => s + (x - m) ** 2, 0) / (v.length - 1));
+};
+const percentil = (v: number[], p: number) => {
+    if (!v.length) return 0;
+    const ordenadas = [...v].sort((a, b) => a - b);
+    return ordenadas[Math.min(ordenadas.length - 1, Math.max(0, Math.ceil((p / 100) * ordenadas.length) - 1))];
+};
+
+async function executar(redacao: RedacaoCorpus, estrategia: EstrategiaEnem, repeticao: number): Promise<Execucao> {
+    const antes = {
+        prompt: obterContador('llm.enem.tokens.prompt'),
+        cache: obterContador('llm.enem.tokens.cache'),
+        saida: obterContador('llm.enem.tokens.saida'),
+    };
+    const inicio = Date.now();
+    const base = { redacao: redacao.id, estrategia, repeticao };
+    try {
+        const analise = await analisarEnem(redacao.texto, { estrategia });
+        return {
+            ...base,
+            latenciaMs: Date.now() - inicio,
+            notaFinal1000: analise.notaFinal1000,
+            notas: Object.values(analise.competencias).map(c => c.nota),
+            tokensPrompt: obterContador('llm.enem.tokens.prompt') - antes.prompt,
+            tokensCache: obterContador('llm.enem.tokens.cache') - antes.cache,
+            tokensSaida: obterContador('llm.enem.tokens.saida') - antes.saida,
+        };
+    } catch (error: any) {
+        return {
+            ...base,
+            latenciaMs: Date.now() - inicio,
+            notaFinal1000: null,
+            notas: [],
+            tokensPrompt: obterContador('llm.enem.tokens.prompt') - antes.prompt,
+            tokensCache: obterContador('llm.enem.tokens.cache') - antes.cache,
+            tokensSaida: obterContador('llm.enem.tokens.saida') - antes.saida,
+            erro: error.message,
+        };
+    }
+}
+
+function resumir(execucoes: Execucao[], estrategia: EstrategiaEnem) {
+    const daEstrategia = execucoes.filter(e => e.estrategia === estrategia);
+    const validas = daEstrategia.filter(e => e.notaFinal1000 !== null);
+    const porRedacao = new Map<string, number[]>();
+    for (const e of validas) {
+        porRedacao.set(e.redacao, [...(porRedacao.get(e.redacao) || []), e.notaFinal1000 as number]);
+    }
+    const latencias = daEstrategia.map(e => e.latenciaMs);
+    return {
+        estrategia,
+        execucoes: daEstrategia.length,
+        falhas: daEstrategia.length - validas.length,
+        // Variância entre repetições da mesma redação (média dos desvios por redação)
+        desvioPadraoNota: Math.round(media([...porRedacao.values()].map(desvioPadrao)) * 10) / 10,
+        notaMediaPorRedacao: Object.fromEntries([...porRedacao].map(([id, notas]) => [id, Math.round(media(notas))])),
+        latenciaMs: {
+            media: Math.round(media(latencias)),
+            p50: percentil(latencias, 50),
+            p95: percentil(latencias, 95),
+        },
+        tokensPorRedacao: {
+            prompt: Math.round(media(daEstrategia.map(e => e.tokensPrompt))),
+            cache: Math.round(media(daEstrategia.map(e => e.tokensCache))),
+            saida: Math.round(media(daEstrategia.map(e => e.tokensSaida))),
+        },
+    };
+}
+
+async function main() {
+    const corpusPath = argumento('corpus', path.join(__dirname, 'corpus', 'redacoes-benchmark.json'));
+    const estrategias = argumento('estrategias', 'adaptativa,chamada-unica').split(',') as EstrategiaEnem[];
+    const repeticoes = Number(argumento('repeticoes', '3'));
+    const saida = argumento('saida', '');
+    definirCacheLLMAtivo(process.argv.includes('--com-cache'));
+
+    const corpus: RedacaoCorpus[] = JSON.parse(fs.readFileSync(corpusPath, 'utf-8'));
+    console.log(`📐 Benchmark ENEM: ${corpus.length} redações x ${estrategias.join(', ')} x ${repeticoes} repetições`);
+
+    const execucoes: Execucao[] = [];
+    for (let repeticao = 1; repeticao <= repeticoes; repeticao++) {
+        for (const redacao of corpus) {
+            // Alterna a ordem das estratégias para não favorecer nenhuma com cache de prefixo aquecido
+            const ordem = repeticao % 2 ? estrategias : [...estrategias].reverse();
+            for (const estrategia of ordem) {
+                const execucao = await executar(redacao, estrategia, repeticao);
+                execucoes.push(execucao);
+                console.log(`  ${redacao.id} [${estrategia}] #${repeticao}: ${execucao.erro ? `ERRO ${execucao.erro}` : `${execucao.notaFinal1000}/1000`} em ${execucao.latenciaMs} ms, ${execucao.tokensPrompt}+${execucao.tokensSaida} tokens (${execucao.tokensCache} do cache)`);
+            }
+        }
+    }
+
+    const resumo = estrategias.map(e => resumir(execucoes, e));
+    console.log('\n📊 Resumo por estratégia:');
+    console.table(resumo.map(r => ({
+        estrategia: r.estrategia,
+        falhas: r.falhas,
+        'desvio nota': r.desvioPadraoNota,
+        'latência média (ms)': r.latenciaMs.media,
+        'latência p95 (ms)': r.latenciaMs.p95,
+        'tokens prompt': r.tokensPorRedacao.prompt,
+        'tokens cache': r.tokensPorRedacao.cache,
+        'tokens saída': r.tokensPorRedacao.saida,
+    })));
+
+    if (saida) {
+        fs.writeFileSync(saida, JSON.stringify({ corpus: corpusPath, repeticoes, resumo, execucoes }, null, 2));
+        console.log(`💾 Resultados salvos em ${saida}`);
+    }
+}
+
+main()
+    .then(() => process.exit(0))
+    .catch(error => {
+        console.error('❌ Erro no benchmark:', error);
+        process.exit(1);
+    });
@@ -0,0 +1,108 @@
+// benchmarkLote.ts
+// Compara a avaliação em lote (várias redações por requisição) com uma redação
+// por chamada sobre o mesmo corpus: redações por minuto, tokens por redação,
+// reenvios de blocos inválidos e falhas.
+//
+// Uso (na pasta backend, com o .env do provedor LLM configurado):
+//   npx ts-node-dev --transpile-only scripts/benchmarkLote.ts \
+//       --tamanhos 1,5 --repeticoes 2 --concorrencia 4 --saida benchmark-lote.json
+// Tamanho 1 é a linha de base (uma redação por chamada, prompt normal do corretor).
+// O corpus é repetido `--repeticoes` vezes para ter volume; o cache de respostas
+// do LLM fica desligado (use --com-cache para ligá-lo) e --sob-demanda usa o
+// prompt só de notas.
+
+import fs from 'fs';
+import path from 'path';
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+import { analisarEnemEmLote, RedacaoLote } from '../src/services/ennAnalysisService';
+import { obterContador } from '../src/services/metricasService';
+import { definirCacheLLMAtivo } from '../src/services/cacheLLMService';
+
+type RedacaoCorpus = { id: string; tema: string; texto: string };
+
+const argumento = (nome: string, padrao: string): string => {
+    const i = process.argv.indexOf(`--${nome}`);
+    return i >= 0 && process.argv[i + 1] ? process.argv[i + 1] : padrao;
+};
+
+const CONTADORES = ['llm.tokens.prompt', 'llm.tokens.cache', 'llm.tokens.saida', 'enem.lote.reenvios', 'enem.lote.desempate'];
+
+async function executar(redacoes: RedacaoLote[], tamanhoPacote: number, concorrencia: number, sobDemanda: boolean) {
+    const antes = Object.fromEntries(CONTADORES.map(c => [c, obterContador(c)]));
+    const delta = (nome: string) => obterContador(nome) - antes[nome];
+    let concluidas = 0;
+    const inicio = Date.now();
+    const resultados = await analisarEnemEmLote(redacoes, {
+        tamanhoPacote,
+        concorrencia,
+        feedbackSobDemanda: sobDemanda,
+        aoConcluir: () => {
+            concluidas++;
+            if (concluidas % 10 === 0) console.log(`  [pacote de ${tamanhoPacote}] ${concluidas}/${redacoes.length} redações`);
+        },
+    });
+    const duracaoMs = Date.now() - inicio;
+    const validas = resultados.filter(r => r.analise);
+    const porRedacao = (nome: string) => Math.round(delta(nome) / redacoes.length);
+    return {
+        tamanhoPacote,
+        redacoes: redacoes.length,
+        falhas: redacoes.length - validas.length,
+        duracaoMs,
+        redacoesPorMinuto: Math.round((redacoes.length / duracaoMs) * 60000 * 10) / 10,
+        tokensPorRedacao: {
+            prompt: porRedacao('llm.tokens.prompt'),
+            cache: porRedacao('llm.tokens.cache'),
+            saida: porRedacao('llm.tokens.saida'),
+        },
+        reenvios: delta('enem.lote.reenvios'),
+        desempates: delta('enem.lote.desempate'),
+        notas: Object.fromEntries(resultados.map(r => [r.id, r.analise?.notaFinal1000 ?? null])),
+    };
+}
+
+async function main() {
+    const corpusPath = argumento('corpus', path.join(__dirname, 'corpus', 'redacoes-benchmark.json'));
+    const tamanhos = argumento('tamanhos', '1,5').split(',').map(Number);
+    const repeticoes = Number(argumento('repeticoes', '2'));
+    const concorrencia = Number(argumento('concorrencia', '4'));
+    const sobDemanda = process.argv.includes('--sob-demanda');
+    const saida = argumento('saida', '');
+    definirCacheLLMAtivo(process.argv.includes('--com-cache'));
+
+    const corpus: RedacaoCorpus[] = JSON.parse(fs.readFileSync(corpusPath, 'utf-8'));
+    // Ids distintos por repetição (as notas do relatório são indexadas por id)
+    const redacoes: RedacaoLote[] = Array.from({ length: repeticoes }, (_, rep) =>
+        corpus.map(r => ({ id: `${r.id}#${rep + 1}`, texto: r.texto }))).flat();
+    console.log(`📐 Benchmark de lote: ${redacoes.length} redações x pacotes de ${tamanhos.join(', ')} (concorrência ${concorrencia}${sobDemanda ? ', só notas' : ''})`);
+
+    const resumo = [];
+    for (const tamanho of tamanhos) resumo.push(await executar(redacoes, tamanho, concorrencia, sobDemanda));
+
+    console.log('\n📊 Resumo por tamanho de pacote:');
+    console.table(resumo.map(r => ({
+        'pacote': r.tamanhoPacote,
+        falhas: r.falhas,
+        'redações/min': r.redacoesPorMinuto,
+        'tokens prompt/redação': r.tokensPorRedacao.prompt,
+        'tokens cache/redação': r.tokensPorRedacao.cache,
+        'tokens saída/redação': r.tokensPorRedacao.saida,
+        reenvios: r.reenvios,
+        desempates: r.desempates,
+    })));
+
+    if (saida) {
+        fs.writeFileSync(saida, JSON.stringify({ corpus: corpusPath, repeticoes, concorrencia, sobDemanda, resumo }, null, 2));
+        console.log(`💾 Resultados salvos em ${saida}`);
+    }
+}
+
+main()
+    .then(() => process.exit(0))
+    .catch(error => {
+        console.error('❌ Erro no benchmark:', error);
+        process.exit(1);
+    });
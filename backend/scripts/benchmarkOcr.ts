@@ -0,0 +1,142 @@
+// benchmarkOcr.ts
+// Mede o caminho de OCR (pré-processamento com sharp + Google Vision em
+// extrairTextoDaImagem, ou o Azure Read direto) em vários níveis de concorrência:
+// imagens por minuto, latência p50/p95/p99 e falhas.
+//
+// Uso (na pasta backend), de preferência contra o mock de OCR (mock_ocr.py):
+//   npx ts-node-dev --transpile-only scripts/benchmarkOcr.ts \
+//       --concorrencia 1,8,32 --requisicoes 64 [--imagens image] [--servico ocr|azure] \
+//       [--sem-variantes] [--saida benchmark-ocr.json]
+// Cada requisição usa uma variante distinta das imagens (borda branca de
+// tamanho diferente), para que o cache e a coalescência do OCR não escondam a
+// carga. Com --sem-variantes as imagens vão como estão: é o modo para reproduzir
+// fitas gravadas (repetições passam a sair do cache do OCR).
+
+import fs from 'fs';
+import path from 'path';
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+import sharp from 'sharp';
+import { extrairTextoDaImagem } from '../src/services/ocrService';
+import { extractTextWithAzureRead } from '../src/services/azureVisionService';
+import { obterContador } from '../src/services/metricasService';
+
+type Execucao = { imagem: string; latenciaMs: number; ok: boolean; caracteres: number };
+
+const argumento = (nome: string, padrao: string): string => {
+    const i = process.argv.indexOf(`--${nome}`);
+    return i >= 0 && process.argv[i + 1] ? process.argv[i + 1] : padrao;
+};
+
+const percentil = (v: number[], p: number) => {
+    if (!v.length) return 0;
+    const ordenadas = [...v].sort((a, b) => a - b);
+    return ordenadas[Math.min(ordenadas.length - 1, Math.max(0, Math.ceil((p / 100) * ordenadas.length) - 1))];
+};
+
+const EXTENSOES = new Set(['.png', '.jpg', '.jpeg']);
+let proximaVariante = 0;
+
+/** Variante única da imagem: borda branca de 0 a 15 px em cada lado (65536 combinações). */
+const variante = (imagem: Buffer, n: number): Promise<Buffer> => sharp(imagem)
+    .extend({ top: n % 16, bottom: (n >> 4) % 16, left: (n >> 8) % 16, right: (n >> 12) % 16, background: '#ffffff' })
+    .png()
+    .toBuffer();
+
+async function ocr(servico: string, imagem: Buffer): Promise<{ ok: boolean; caracteres: number }> {
+    if (servico === 'azure') {
+        const resultado = await extractTextWithAzureRead(imagem);
+        return { ok: Boolean(resultado?.text), caracteres: resultado?.text.length || 0 };
+    }
+    const resultado = await extrairTextoDaImagem(`data:image/png;base64,${imagem.toString('base64')}`);
+    return { ok: resultado.confidence > 0, caracteres: resultado.text.length };
+}
+
+async function rodada(servico: string, imagens: Array<{ nome: string; dados: Buffer }>, requisicoes: number, concorrencia: number, comVariantes: boolean) {
+    // As variantes são geradas antes de medir: o tempo do sharp aqui não é do OCR
+    const fila = await Promise.all(Array.from({ length: requisicoes }, async (_, i) => {
+        const { nome, dados } = imagens[i % imagens.length];
+        return { nome, dados: comVariantes ? await variante(dados, proximaVariante++) : dados };
+    }));
+    const antes = { hit: obterContador('ocr.cache.hit'), miss: obterContador('ocr.cache.miss') };
+    const execucoes: Execucao[] = [];
+    let proxima = 0;
+    const inicio = Date.now();
+    await Promise.all(Array.from({ length: Math.min(concorrencia, fila.length) }, async () => {
+        while (proxima < fila.length) {
+            const { nome, dados } = fila[proxima++];
+            const t0 = Date.now();
+            try {
+                const { ok, caracteres } = await ocr(servico, dados);
+                execucoes.push({ imagem: nome, latenciaMs: Date.now() - t0, ok, caracteres });
+            } catch (error: any) {
+                console.warn(`⚠️ ${nome}: ${error.message}`);
+                execucoes.push({ imagem: nome, latenciaMs: Date.now() - t0, ok: false, caracteres: 0 });
+            }
+        }
+    }));
+    const duracaoMs = Date.now() - inicio;
+    const latencias = execucoes.map(e => e.latenciaMs);
+    return {
+        concorrencia,
+        requisicoes: execucoes.length,
+        falhas: execucoes.filter(e => !e.ok).length,
+        duracaoMs,
+        imagensPorMinuto: Math.round((execucoes.length / duracaoMs) * 60000 * 10) / 10,
+        latenciaMs: {
+            p50: percentil(latencias, 50),
+            p95: percentil(latencias, 95),
+            p99: percentil(latencias, 99),
+            max: Math.max(0, ...latencias),
+        },
+        cacheOcr: { hit: obterContador('ocr.cache.hit') - antes.hit, miss: obterContador('ocr.cache.miss') - antes.miss },
+    };
+}
+
+async function main() {
+    const pasta = argumento('imagens', path.join(__dirname, '..', 'image'));
+    const niveis = argumento('concorrencia', '1,8,32').split(',').map(Number);
+    const requisicoes = Number(argumento('requisicoes', '64'));
+    const servico = argumento('servico', 'ocr');
+    const comVariantes = !process.argv.includes('--sem-variantes');
+    const saida = argumento('saida', '');
+    if (servico !== 'ocr' && servico !== 'azure') throw new Error(`Serviço desconhecido: ${servico}. Use ocr ou azure.`);
+
+    const imagens = fs.readdirSync(pasta)
+        .filter(nome => EXTENSOES.has(path.extname(nome).toLowerCase()))
+        .map(nome => ({ nome, dados: fs.readFileSync(path.join(pasta, nome)) }));
+    if (!imagens.length) throw new Error(`Nenhuma imagem (.png/.jpg) em ${pasta}.`);
+    console.log(`📐 Benchmark de OCR (${servico}): ${imagens.length} imagem(ns), ${requisicoes} requisições por nível de concorrência ${niveis.join(', ')}${comVariantes ? '' : ', sem variantes'}`);
+
+    const resumo = [];
+    for (const concorrencia of niveis) {
+        const resultado = await rodada(servico, imagens, requisicoes, concorrencia, comVariantes);
+        console.log(`  concorrência ${concorrencia}: ${resultado.requisicoes - resultado.falhas}/${resultado.requisicoes} ok em ${resultado.duracaoMs} ms`);
+        resumo.push(resultado);
+    }
+
+    console.log('\n📊 Resumo por concorrência:');
+    console.table(resumo.map(r => ({
+        concorrencia: r.concorrencia,
+        falhas: r.falhas,
+        'imagens/min': r.imagensPorMinuto,
+        'p50 (ms)': r.latenciaMs.p50,
+        'p95 (ms)': r.latenciaMs.p95,
+        'p99 (ms)': r.latenciaMs.p99,
+        'cache OCR (hit/miss)': `${r.cacheOcr.hit}/${r.cacheOcr.miss}`,
+    })));
+
+    if (saida) {
+        fs.writeFileSync(saida, JSON.stringify({ servico, imagens: imagens.map(i => i.nome), requisicoes, comVariantes, resumo }, null, 2));
+        console.log(`💾 Resultados salvos em ${saida}`);
+    }
+}
+
+main()
+    .then(() => process.exit(0))
+    .catch(error => {
+        console.error('❌ Erro no benchmark:', error);
+        process.exit(1);
+    });
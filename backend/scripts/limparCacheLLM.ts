@@ -0,0 +1,48 @@
+// limparCacheLLM.ts
+// Manutenção do cache de respostas do LLM (tabela RespostaLLMCache).
+//
+// Uso (na pasta backend):
+//   npx ts-node-dev --transpile-only scripts/limparCacheLLM.ts
+//       remove as respostas vencidas (o que o servidor também faz ao subir)
+//   npx ts-node-dev --transpile-only scripts/limparCacheLLM.ts --uso enem --manter enem-v3
+//       apaga as versões do prompt `enem` diferentes de enem-v3
+//   npx ts-node-dev --transpile-only scripts/limparCacheLLM.ts --uso enem --versao enem-v2
+//       apaga só a versão enem-v2
+// O uso é o rótulo da chamada (ex.: enem, fundido, enem-lote). Invalide só depois
+// que todas as instâncias rodarem a versão nova: as antigas ainda leem as suas entradas.
+
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+import { invalidarCacheLLM, removerExpiradosLLM } from '../src/services/cacheLLMService';
+
+const argumento = (nome: string): string | undefined => {
+    const i = process.argv.indexOf(`--${nome}`);
+    return i >= 0 && process.argv[i + 1] ? process.argv[i + 1] : undefined;
+};
+
+async function main() {
+    const uso = argumento('uso');
+    const versaoPrompt = argumento('versao');
+    const manterVersao = argumento('manter');
+
+    if (!uso) {
+        if (versaoPrompt || manterVersao) throw new Error('--versao e --manter exigem --uso.');
+        const removidas = await removerExpiradosLLM();
+        console.log(`✅ ${removidas} resposta(s) vencida(s) removidas.`);
+        return;
+    }
+    if (!versaoPrompt && !manterVersao) throw new Error('Informe --versao (apaga essa versão) ou --manter (apaga as demais).');
+    if (versaoPrompt && manterVersao) throw new Error('Use --versao ou --manter, não os dois.');
+
+    const removidas = await invalidarCacheLLM({ uso, versaoPrompt, manterVersao });
+    console.log(`✅ ${removidas} resposta(s) do prompt '${uso}' invalidadas.`);
+}
+
+main()
+    .then(() => process.exit(0))
+    .catch(error => {
+        console.error('❌ Erro na limpeza do cache:', error.message);
+        process.exit(1);
+    });
@@ -0,0 +1,222 @@
+// loteBatch.ts
+// Lado do banco da correção offline pela Batch API (orquestrada por
+// lote_batch_openai.py): exporta as redações para o JSONL de requisições e
+// importa o JSONL de resultados de volta para notaGerada.
+//
+// Uso (na pasta backend):
+//   npx ts-node-dev --transpile-only scripts/loteBatch.ts exportar --saida lote.jsonl \
+//       --modelo DEPLOYMENT_BATCH [--url /chat/completions] [--limite 5000] [--desde 2025-01-01] \
+//       [--ids ids.txt] [--todas] [--sob-demanda] [--apos "<criadoEm ISO>|<id>"] [--cursor-saida cursor.json]
+//   npx ts-node-dev --transpile-only scripts/loteBatch.ts importar --resultados a.jsonl,b.jsonl [--falhas falhas.txt]
+//   npx ts-node-dev --transpile-only scripts/loteBatch.ts contar [mesmos filtros de exportar]
+//   npx ts-node-dev --transpile-only scripts/loteBatch.ts requisicoes --tarefa enem|notas|correcao \
+//       --saida req.jsonl --modelo DEPLOYMENT [--corpus scripts/corpus/redacoes-benchmark.json]
+// Sem --todas, exporta só as redações ainda sem nota da IA. O custom_id de cada
+// linha é "<id da redação>|<versão do prompt>": resultados de outra versão do
+// prompt são recusados na importação. As redações saem em ordem de criação;
+// --apos retoma depois de um cursor e --cursor-saida grava o cursor da última
+// redação lida e quantas foram lidas (usado por backfill_openai.py para paginar).
+// `requisicoes` gera as mesmas requisições a partir do corpus fixo, sem banco
+// (usado pelo benchmark de latência de azure_openai_test_openai.py).
+
+import fs from 'fs';
+import path from 'path';
+import dotenv from 'dotenv';
+
+dotenv.config();
+
+import { PrismaClient } from '@prisma/client';
+import { interpretarRespostaEnem, requisicaoAvaliacaoEnem, VERSAO_PROMPT_ENEM, VERSAO_PROMPT_NOTAS } from '../src/services/ennAnalysisService';
+import { requisicaoCorrecaoOCR } from '../src/services/openaiService';
+
+const prisma = new PrismaClient();
+
+const argumento = (nome: string, padrao: string): string => {
+    const i = process.argv.indexOf(`--${nome}`);
+    return i >= 0 && process.argv[i + 1] ? process.argv[i + 1] : padrao;
+};
+
+// Mesmo limite de analisarEnem
+const TAMANHO_MINIMO = 50;
+const PAGINA = 500;
+
+type Cursor = { criadoEm: Date; id: string };
+
+/** Filtro das redações a (re)corrigir, a partir dos argumentos de linha de comando. */
+function filtroRedacoes(): Record<string, any> {
+    const arquivoIds = argumento('ids', '');
+    const desde = argumento('desde', '');
+    const ids = arquivoIds
+        ? fs.readFileSync(arquivoIds, 'utf-8').split(/\r?\n/).map(l => l.trim()).filter(Boolean)
+        : null;
+    const filtro: Record<string, any> = { textoExtraido: { not: null } };
+    if (!process.argv.includes('--todas') && !ids) filtro.notaGerada = null;
+    if (ids) filtro.id = { in: ids };
+    if (desde) filtro.criadoEm = { gte: new Date(desde) };
+    return filtro;
+}
+
+// Cursor composto (criadoEm, id): datas repetidas não pulam nem repetem redações
+const depoisDe = (filtro: Record<string, any>, cursor: Cursor | null) => cursor
+    ? { AND: [filtro, { OR: [{ criadoEm: { gt: cursor.criadoEm } }, { criadoEm: cursor.criadoEm, id: { gt: cursor.id } }] }] }
+    : filtro;
+
+function cursorInicial(): Cursor | null {
+    const [aposData, aposId] = argumento('apos', '').split('|');
+    return aposData ? { criadoEm: new Date(aposData), id: aposId || '' } : null;
+}
+
+async function exportar() {
+    const saida = argumento('saida', 'lote-batch.jsonl');
+    const modelo = argumento('modelo', process.env.AZURE_OPENAI_BATCH_DEPLOYMENT || process.env.AZURE_OPENAI_DEPLOYMENT || '');
+    const url = argumento('url', '/chat/completions');
+    const limite = Number(argumento('limite', '0')) || Infinity;
+    const sobDemanda = process.argv.includes('--sob-demanda');
+    const cursorSaida = argumento('cursor-saida', '');
+    if (!modelo) throw new Error('Informe --modelo (deployment da Batch API) ou AZURE_OPENAI_BATCH_DEPLOYMENT.');
+    const filtro = filtroRedacoes();
+
+    const arquivo = fs.createWriteStream(saida, { encoding: 'utf-8' });
+    let exportadas = 0;
+    let curtas = 0;
+    let cursor = cursorInicial();
+    // Paginação por cursor: o backfill pode passar de milhares de redações
+    while (exportadas < limite) {
+        const pagina = await prisma.redacao.findMany({
+            where: depoisDe(filtro, cursor),
+            select: { id: true, textoExtraido: true, criadoEm: true },
+            orderBy: [{ criadoEm: 'asc' }, { id: 'asc' }],
+            take: PAGINA,
+        });
+        if (!pagina.length) break;
+        for (const redacao of pagina) {
+            if (exportadas >= limite) break;
+            cursor = { criadoEm: redacao.criadoEm, id: redacao.id };
+            const texto = redacao.textoExtraido || '';
+            if (texto.trim().length < TAMANHO_MINIMO) {
+                curtas++;
+                continue;
+            }
+            const { versaoPrompt, corpo } = requisicaoAvaliacaoEnem(texto, sobDemanda);
+            arquivo.write(JSON.stringify({
+                custom_id: `${redacao.id}|${versaoPrompt}`,
+                method: 'POST',
+                url,
+                body: { model: modelo, ...corpo },
+            }) + '\n');
+            exportadas++;
+        }
+    }
+    await new Promise<void>((resolve, reject) => arquivo.end((erro?: Error | null) => (erro ? reject(erro) : resolve())));
+    if (cursorSaida) {
+        fs.writeFileSync(cursorSaida, JSON.stringify({
+            cursor: cursor ? { criadoEm: cursor.criadoEm.toISOString(), id: cursor.id } : null,
+            lidas: exportadas + curtas,
+        }));
+    }
+    console.log(`📤 ${exportadas} redação(ões) exportada(s) para ${saida} (${curtas} ignorada(s) por texto curto).`);
+}
+
+async function contar() {
+    const total = await prisma.redacao.count({ where: depoisDe(filtroRedacoes(), cursorInicial()) });
+    // Última linha da saída: lida por backfill_openai.py
+    console.log(JSON.stringify({ total }));
+}
+
+async function importar() {
+    const arquivos = argumento('resultados', '').split(',').filter(Boolean);
+    const arquivoFalhas = argumento('falhas', '');
+    if (!arquivos.length) throw new Error('Informe --resultados com o(s) JSONL de saída da Batch API.');
+
+    const falhas: string[] = [];
+    let importadas = 0;
+    let promptTokens = 0;
+    let completionTokens = 0;
+    for (const caminho of arquivos) {
+        const linhas = fs.readFileSync(caminho, 'utf-8').split(/\r?\n/).filter(l => l.trim());
+        for (const linha of linhas) {
+            let resultado: any;
+            try {
+                resultado = JSON.parse(linha);
+            } catch {
+                console.warn(`⚠️ Linha inválida em ${caminho}: ${linha.slice(0, 80)}`);
+                continue;
+            }
+            const [redacaoId, versao] = String(resultado.custom_id || '').split('|');
+            if (!redacaoId) continue;
+            if (versao !== VERSAO_PROMPT_ENEM && versao !== VERSAO_PROMPT_NOTAS) {
+                console.warn(`⚠️ ${redacaoId}: versão de prompt ${versao} diferente da atual; exporte de novo.`);
+                falhas.push(redacaoId);
+                continue;
+            }
+            const resposta = resultado.response;
+            const corpo = resposta?.body;
+            if (resultado.error || resposta?.status_code !== 200) {
+                console.warn(`⚠️ ${redacaoId}: requisição falhou (${resposta?.status_code ?? '?'}: ${resultado.error?.message || corpo?.error?.message || 'sem detalhe'}).`);
+                falhas.push(redacaoId);
+                continue;
+            }
+            promptTokens += corpo?.usage?.prompt_tokens || 0;
+            completionTokens += corpo?.usage?.completion_tokens || 0;
+            const analise = interpretarRespostaEnem(corpo?.choices?.[0]?.message?.content || '', versao === VERSAO_PROMPT_NOTAS);
+            if (!analise || analise.notaFinal1000 < 0) {
+                console.warn(`⚠️ ${redacaoId}: resposta sem análise válida.`);
+                falhas.push(redacaoId);
+                continue;
+            }
+            try {
+                // Sem avaliações humanas, a nota final é a da IA (como no upload)
+                const avaliacoesHumanas = await prisma.avaliacao.count({ where: { redacaoId } });
+                const notaFinal = analise.notaFinal1000;
+                await prisma.redacao.update({
+                    where: { id: redacaoId },
+                    data: avaliacoesHumanas ? { notaGerada: notaFinal } : { notaGerada: notaFinal, notaFinal },
+                });
+                importadas++;
+            } catch (error: any) {
+                // Redação excluída depois da exportação
+                console.warn(`⚠️ ${redacaoId}: não foi possível gravar a nota (${error.message}).`);
+                falhas.push(redacaoId);
+            }
+        }
+    }
+    console.log(`📥 ${importadas} nota(s) importada(s), ${falhas.length} falha(s). Tokens: ${promptTokens} de prompt, ${completionTokens} de saída.`);
+    if (arquivoFalhas && falhas.length) {
+        // Reenvio: exportar --ids <arquivo>
+        fs.writeFileSync(arquivoFalhas, falhas.join('\n') + '\n');
+        console.log(`💾 Ids com falha salvos em ${arquivoFalhas}`);
+    }
+}
+
+async function requisicoes() {
+    const corpusPath = argumento('corpus', path.join(__dirname, 'corpus', 'redacoes-benchmark.json'));
+    const tarefa = argumento('tarefa', 'enem');
+    const saida = argumento('saida', `requisicoes-${tarefa}.jsonl`);
+    const modelo = argumento('modelo', process.env.AZURE_OPENAI_DEPLOYMENT || '');
+    const montar: Record<string, (texto: string) => { versaoPrompt: string; corpo: object }> = {
+        enem: texto => requisicaoAvaliacaoEnem(texto, false),
+        notas: texto => requisicaoAvaliacaoEnem(texto, true),
+        correcao: requisicaoCorrecaoOCR,
+    };
+    if (!montar[tarefa]) throw new Error(`Tarefa desconhecida: ${tarefa}. Use enem, notas ou correcao.`);
+
+    const corpus: Array<{ id: string; texto: string }> = JSON.parse(fs.readFileSync(corpusPath, 'utf-8'));
+    const linhas = corpus.map(r => {
+        const { versaoPrompt, corpo } = montar[tarefa](r.texto);
+        return JSON.stringify({ custom_id: `${r.id}|${versaoPrompt}`, body: { model: modelo, ...corpo } });
+    });
+    fs.writeFileSync(saida, linhas.join('\n') + '\n');
+    console.log(`📝 ${linhas.length} requisição(ões) de ${tarefa} geradas em ${saida}.`);
+}
+
+const comando = process.argv[2];
+const acoes: Record<string, () => Promise<void>> = { exportar, importar, contar, requisicoes };
+
+(acoes[comando] || (async () => { throw new Error(`Comando desconhecido: ${comando}. Use exportar, importar, contar ou requisicoes.`); }))()
+    .then(() => prisma.$disconnect())
+    .then(() => process.exit(0))
+    .catch(async error => {
+        console.error('❌ Erro no lote offline:', error.message || error);
+        await prisma.$disconnect();
+        process.exit(1);
+    });
@@ -5,6 +5,7 @@ import routes from "./routes/index";
 import avaliacaoRoutes from './routes/avaliacaoRoutes';
 import redacaoRoutes from "./routes/redacaoRoutes";
 import authRoutes from "./routes/authRoutes";
+import metricasRoutes from "./routes/metricasRoutes";
 
 dotenv.config();
 
@@ -14,6 +15,7 @@ app.use(cors());
 app.use(express.json({ limit: '50mb' })); // Aumentar limite para imagens base64
 app.use(express.urlencoded({ limit: '50mb', extended: true }));
 app.use("/auth", authRoutes);
+app.use("/metricas", metricasRoutes);
 app.use(routes);
 app.use('/avaliacoes', avaliacaoRoutes);
 app.use("/redacoes", redacaoRoutes);
@@ -0,0 +1,9 @@
+import { Request, Response } from "express";
+import { obterMetricas } from "../services/metricasService";
+import { obterCalibracaoCorretores } from "../services/ennAnalysisService";
+import { obterEstatisticasProvedores } from "../services/llmRouter";
+import { obterResumoTarefasLLM } from "../services/openaiService";
+
+export const listarMetricas = async (_req: Request, res: Response) => {
+    return res.json({ ...obterMetricas(), calibracaoCorretores: obterCalibracaoCorretores(), provedoresLLM: obterEstatisticasProvedores(), tarefasLLM: obterResumoTarefasLLM() });
+};
@@ -1,19 +1,191 @@
 import { PrismaClient } from "@prisma/client";
+import { randomUUID } from "crypto";
 import { Request, Response } from "express";
 import { extrairTextoDaImagem } from "../services/ocrService";
-import { analisarEnem, formatarTextoComLLM, AnaliseENEM } from "../services/ennAnalysisService";
-import { corrigirTextoOCR } from "../services/openaiService";
+import { analisarEnem, AnaliseENEM, ChaveCompetencia, corrigirEAvaliar, DetalheCompetencia, gerarFeedback, SECOES_FEEDBACK, SecaoFeedback } from "../services/ennAnalysisService";
+import { descartarVersaoAnalisada, reanalisar, registrarVersaoAnalisada } from "../services/reanaliseIncrementalService";
+import { corrigirTextoOCR, distanciaEdicaoRelativa } from "../services/openaiService";
+import { cancelar, cancelarAoDesconectar, comSinal, erroDoSinal, foiCancelado, lancarSeCancelado } from "../services/cancelamento";
+import { adquirirVaga, estaSaturado, estimarRetryAfterSeg } from "../services/admissaoService";
+import { analisarTexto } from "../services/analiseService";
+import { Prazo } from "../services/prazo";
+import { incrementar, obterContador, registrarDuracao, registrarMedidor } from "../services/metricasService";
 
 const prisma = new PrismaClient();
-type AnaliseJob = { promise: Promise<any>; startedAt: number };
+type OuvinteCompetencia = (chave: ChaveCompetencia, detalhe: DetalheCompetencia) => void;
+type AnaliseJob = {
+    promise: Promise<any>;
+    startedAt: number;
+    controller: AbortController;
+    // Primeira versão de cada competência concluída por algum corretor (antes do consenso)
+    parciais: Map<ChaveCompetencia, DetalheCompetencia>;
+    ouvintes: Set<OuvinteCompetencia>;
+    // Modo fundido: texto corrigido, que sai na mesma chamada da primeira nota
+    correcao?: Promise<string>;
+    // Vaga do upload assumida pela análise antecipada; liberada quando o job termina
+    liberarVaga?: () => void;
+};
+// Análise iniciada durante o upload, antes de a redação existir no banco
+type AnaliseAntecipada = {
+    // Fundido: a própria análise corrige o OCR; especulativo: a correção roda à parte
+    modo: 'fundido' | 'especulativo';
+    // Resolvida com o texto gravado quando a redação foi gravada (só então o job grava a nota);
+    // rejeitada se o upload falhar ou se a análise especulativa for descartada
+    registro: Promise<string>;
+    // Vaga de admissão do upload, que passa a ser do job (a resposta sai antes de ele terminar)
+    liberarVaga?: () => void;
+};
 const analiseJobs = new Map<string, AnaliseJob>();
 // O cache armazena a análise pura
 const analiseCache = new Map<string, { data: AnaliseENEM; cachedAt: number }>();
 const ANALISE_TTL_MS = 10 * 60 * 1000;
+// Tempo máximo de um job de análise em background antes de ser cancelado
+const ANALISE_JOB_TIMEOUT_MS = Number(process.env.ANALISE_JOB_TIMEOUT_MS) || 3 * 60 * 1000;
+// Prazos de ponta a ponta das rotas síncronas (limitam o p99 percebido pelo cliente)
+const PRAZO_REDACAO_MS = Number(process.env.PRAZO_REDACAO_MS) || 45000;
+const PRAZO_REANALISE_MS = Number(process.env.PRAZO_REANALISE_MS) || 60000;
+const PRAZO_FEEDBACK_MS = Number(process.env.PRAZO_FEEDBACK_MS) || 30000;
+// Upload em modo fundido: uma só chamada corrige o OCR e avalia (ver corrigirEAvaliar)
+const CORRECAO_FUNDIDA = process.env.REDACAO_CORRECAO_FUNDIDA === 'true';
+// Upload especulativo: a análise começa com o texto do OCR enquanto a correção roda; se a
+// correção mudar mais que esta fração das palavras, a análise é refeita com o texto corrigido
+const AVALIACAO_ESPECULATIVA = process.env.REDACAO_AVALIACAO_ESPECULATIVA === 'true';
+const ESPECULATIVA_MAX_DISTANCIA = Number(process.env.REDACAO_ESPECULATIVA_MAX_DISTANCIA) || 0.03;
+
+registrarMedidor('redacao.especulativa.taxa_acerto_pct', () => {
+    const aproveitadas = obterContador('redacao.especulativa.aproveitada');
+    const total = aproveitadas + obterContador('redacao.especulativa.descartada');
+    return total ? Math.round((aproveitadas / total) * 100) : 0;
+});
+
+/**
+ * Inicia (ou reaproveita) o job de análise ENEM de uma redação em background.
+ * O job pode ser cancelado pela exclusão da redação ou por timeout. Na análise
+ * antecipada, `texto` é o do OCR (no modo fundido, a correção sai em `job.correcao`).
+ * `vaga` é uma vaga herdada (ver `herdarVaga`); sem ela, o job aguarda uma na fila.
+ */
+const iniciarJobAnalise = (redacaoId: string, texto: string, atualizarNotaFinal = false, antecipada?: AnaliseAntecipada, vaga?: Promise<() => void>): AnaliseJob => {
+    const existente = analiseJobs.get(redacaoId);
+    if (existente) {
+        vaga?.then(liberar => liberar());
+        return existente;
+    }
+
+    const controller = new AbortController();
+    // O prazo do job aborta tudo ao estourar ANALISE_JOB_TIMEOUT_MS (e segue o controller na exclusão)
+    const prazo = new Prazo(ANALISE_JOB_TIMEOUT_MS, controller.signal);
+    const parciais = new Map<ChaveCompetencia, DetalheCompetencia>();
+    const ouvintes = new Set<OuvinteCompetencia>();
+    const aoCompetencia = (chave: ChaveCompetencia, detalhe: DetalheCompetencia) => {
+        if (parciais.has(chave)) return;
+        parciais.set(chave, detalhe);
+        ouvintes.forEach(ouvinte => ouvinte(chave, detalhe));
+    };
+
+    let resolverCorrecao: (textoCorrigido: string) => void = () => undefined;
+    const correcao = antecipada?.modo === 'fundido' ? new Promise<string>(resolve => { resolverCorrecao = resolve; }) : undefined;
+
+    const promise = (async (): Promise<AnaliseENEM> => {
+        let analiseEnem: AnaliseENEM;
+        let textoAnalisado = texto;
+        if (antecipada?.modo === 'fundido') {
+            // Roda sob a vaga do upload (assumida em `antecipada.liberarVaga`): pedir outra poderia travar a fila
+            const resultado = corrigirEAvaliar(texto, { signal: prazo.signal, prazo, aoCompetencia });
+            resultado.then(r => resolverCorrecao(r.textoCorrigido), () => undefined);
+            analiseEnem = await analisarEnem(texto, {
+                signal: prazo.signal,
+                prazo,
+                aoCompetencia,
+                corretorFundido: resultado.then(r => r.analise),
+            });
+            textoAnalisado = await antecipada.registro;
+        } else if (antecipada) {
+            // Especulativo: também sob a vaga assumida do upload, em paralelo com a correção
+            const inicio = Date.now();
+            // Sem especulação, a análise só começaria após a correção e a gravação
+            const esperaEvitada = antecipada.registro.then(() => Date.now() - inicio, () => 0);
+            analiseEnem = await analisarEnem(texto, { signal: prazo.signal, prazo, aoCompetencia });
+            const duracaoAnalise = Date.now() - inicio;
+            textoAnalisado = await comSinal(antecipada.registro, prazo.signal);
+            registrarDuracao('redacao.especulativa.economia', Math.min(await esperaEvitada, duracaoAnalise));
+        } else {
+            // Jobs em background também ocupam uma vaga do pipeline (aguardam na fila, salvo vaga herdada)
+            const liberarVaga = await (vaga ?? adquirirVaga(prazo.signal));
+            try {
+                analiseEnem = await analisarEnem(texto, { signal: prazo.signal, prazo, aoCompetencia });
+            } finally {
+                liberarVaga();
+            }
+        }
+        // A redação pode ter sido excluída enquanto a IA trabalhava
+        lancarSeCancelado(prazo.signal);
+
+        try {
+            const notaFinal = analiseEnem.notaFinal1000;
+            if (notaFinal >= 0) {
+                await prisma.redacao.update({
+                    where: { id: redacaoId },
+                    data: atualizarNotaFinal ? { notaGerada: notaFinal, notaFinal } : { notaGerada: notaFinal }
+                });
+            }
+        } catch (error: any) { /* ... */ }
+
+        analiseCache.set(redacaoId, { data: analiseEnem, cachedAt: Date.now() });
+        // Base para a reanálise incremental quando o aluno editar o texto
+        registrarVersaoAnalisada(redacaoId, textoAnalisado, textoAnalisado, analiseEnem);
+        return analiseEnem;
+    })();
+
+    const job: AnaliseJob = { promise, startedAt: Date.now(), controller, parciais, ouvintes, correcao, liberarVaga: antecipada?.liberarVaga };
+    analiseJobs.set(redacaoId, job);
+    promise.then(analise => {
+        console.log(`📊 Análise da redação ${redacaoId} concluída: ${analise.notaFinal1000}/1000`);
+    }).catch(err => {
+        if (foiCancelado(err)) {
+            console.warn(`[JOB CANCELADO] A análise da redação ${redacaoId} foi interrompida: ${err.message}`);
+        } else {
+            console.error(`[ERRO NO JOB] A análise para a redação ${redacaoId} falhou:`, err.message);
+        }
+    }).finally(() => {
+        // Se o job falhar antes da correção, o upload segue com o texto do OCR
+        resolverCorrecao(texto);
+        prazo.encerrar();
+        const liberarVaga = job.liberarVaga;
+        job.liberarVaga = undefined;
+        liberarVaga?.();
+        if (analiseJobs.get(redacaoId) === job) analiseJobs.delete(redacaoId);
+    });
+    return job;
+};
+
+/**
+ * Tira do job a vaga assumida do upload e a entrega quando ele terminar. Usado ao
+ * descartar a análise especulativa: a substituta reaproveita a vaga em vez de entrar na
+ * fila enquanto as chamadas canceladas ainda se encerram.
+ */
+const herdarVaga = (job: AnaliseJob): Promise<() => void> | undefined => {
+    const liberarVaga = job.liberarVaga;
+    if (!liberarVaga) return undefined;
+    job.liberarVaga = undefined;
+    return job.promise.then(() => liberarVaga, () => liberarVaga);
+};
+
+/** Assume a vaga de admissão da requisição (ver controlarAdmissao), se a rota tiver uma. */
+const reterVaga = (res: Response): (() => void) | undefined => res.locals.reterVaga?.();
+
+/** Gravação pendente da redação, resolvida (com o texto gravado) ou rejeitada pelo upload. */
+const registroPendente = () => {
+    let confirmarRegistro: (texto: string) => void = () => undefined;
+    let falharRegistro: (erro: unknown) => void = () => undefined;
+    const registro = new Promise<string>((resolve, reject) => { confirmarRegistro = resolve; falharRegistro = reject; });
+    registro.catch(() => undefined);
+    return { registro, confirmarRegistro, falharRegistro };
+};
 
 // --- Endpoints do Controller ---
 
 export const criarRedacao = async (req: Request, res: Response) => {
+    let prazo: Prazo | undefined;
     try {
         const { titulo } = req.body;
         const file = req.file as Express.Multer.File | undefined;
@@ -23,8 +195,14 @@ export const criarRedacao = async (req: Request, res: Response) => {
         if (!usuarioId) return res.status(401).json({ erro: "Usuário não autenticado." });
         if (!titulo || !imagemUrl) return res.status(400).json({ erro: "Título e imagem são obrigatórios." });
 
+        // Se o cliente desistir do upload, OCR e correção em andamento são abortados.
+        // Todas as etapas consomem do mesmo prazo (PRAZO_REDACAO_MS).
+        prazo = new Prazo(PRAZO_REDACAO_MS, cancelarAoDesconectar(req, res).signal);
+        const { signal } = prazo;
+
         console.log("🔍 Iniciando extração de texto com OCR...");
-        const ocrResult = await extrairTextoDaImagem(imagemUrl);
+        const ocrResult = await extrairTextoDaImagem(imagemUrl, { signal, prazo });
+        registrarDuracao('redacao.etapa.ocr', prazo.decorridoMs());
         
         if (!ocrResult.text || ocrResult.text.trim().length < 50) {
             return res.status(400).json({
@@ -33,55 +211,184 @@ export const criarRedacao = async (req: Request, res: Response) => {
             });
         }
 
-        console.log("🤖 Iniciando correção automática com GPT...");
-        const textoCorrigido = await corrigirTextoOCR(ocrResult.text);
-
-        console.log("💾 Salvando redação no banco de dados...");
-        const redacao = await prisma.redacao.create({
-            data: {
-                titulo,
-                imagemUrl,
-                textoExtraido: textoCorrigido, // Salva o texto já corrigido
-                usuarioId
-            },
-        });
-
-        console.log(`✅ Redação ${redacao.id} criada com sucesso!`);
+        const inicioCorrecao = Date.now();
+        let textoCorrigido: string;
+        let redacao;
+        if (CORRECAO_FUNDIDA) {
+            // Modo fundido: a análise começa já com o texto do OCR. Um dos corretores também
+            // devolve a correção (uma única ida ao LLM no caminho crítico); os demais rodam em paralelo.
+            console.log("⚡ Iniciando correção e análise ENEM em uma única chamada...");
+            const redacaoId = randomUUID();
+            const { registro, confirmarRegistro, falharRegistro } = registroPendente();
+            const job = iniciarJobAnalise(redacaoId, ocrResult.text, true, { modo: 'fundido', registro, liberarVaga: reterVaga(res) });
+            try {
+                textoCorrigido = await comSinal(job.correcao as Promise<string>, signal);
+                registrarDuracao('redacao.etapa.correcao', Date.now() - inicioCorrecao);
+                lancarSeCancelado(signal);
 
-        // Iniciar análise automática em background
-        console.log("⚡ Iniciando análise ENEM automática...");
-        setTimeout(async () => {
+                console.log("💾 Salvando redação no banco de dados...");
+                redacao = await prisma.redacao.create({
+                    data: { id: redacaoId, titulo, imagemUrl, textoExtraido: textoCorrigido, usuarioId },
+                });
+                confirmarRegistro(textoCorrigido);
+            } catch (error) {
+                // Sem redação gravada, a análise em andamento não tem para quem servir
+                falharRegistro(error);
+                cancelar(job.controller, 'sem-interessados');
+                throw error;
+            }
+            console.log(`✅ Redação ${redacao.id} criada com sucesso!`);
+        } else if (AVALIACAO_ESPECULATIVA) {
+            // Especulativo: a análise começa com o texto do OCR enquanto a correção roda. Se a
+            // correção mexeu pouco no texto, a nota vale; senão, é refeita com o texto corrigido.
+            console.log("🤖 Iniciando correção automática com GPT (análise ENEM especulativa em paralelo)...");
+            const redacaoId = randomUUID();
+            const { registro, confirmarRegistro, falharRegistro } = registroPendente();
+            const job = iniciarJobAnalise(redacaoId, ocrResult.text, true, { modo: 'especulativo', registro, liberarVaga: reterVaga(res) });
+            let aproveitada = false;
+            let vagaHerdada: Promise<() => void> | undefined;
             try {
-                const analiseEnem = await analisarEnem(textoCorrigido);
-                await prisma.redacao.update({
-                    where: { id: redacao.id },
-                    data: { 
-                        notaGerada: analiseEnem.notaFinal1000,
-                        notaFinal: analiseEnem.notaFinal1000 
-                    }
+                textoCorrigido = await corrigirTextoOCR(ocrResult.text, { signal, prazo });
+                registrarDuracao('redacao.etapa.correcao', Date.now() - inicioCorrecao);
+                lancarSeCancelado(signal);
+
+                const distancia = distanciaEdicaoRelativa(ocrResult.text, textoCorrigido);
+                aproveitada = distancia <= ESPECULATIVA_MAX_DISTANCIA;
+                incrementar(`redacao.especulativa.${aproveitada ? 'aproveitada' : 'descartada'}`);
+                if (!aproveitada) {
+                    // A nota sobre o texto do OCR não vale: libera o id para a análise do texto corrigido
+                    console.log(`🔁 Correção alterou ${(distancia * 100).toFixed(1)}% das palavras; descartando a análise especulativa.`);
+                    vagaHerdada = herdarVaga(job);
+                    cancelar(job.controller, 'sem-interessados');
+                    falharRegistro(erroDoSinal(job.controller.signal));
+                    if (analiseJobs.get(redacaoId) === job) analiseJobs.delete(redacaoId);
+                }
+
+                console.log("💾 Salvando redação no banco de dados...");
+                redacao = await prisma.redacao.create({
+                    data: { id: redacaoId, titulo, imagemUrl, textoExtraido: textoCorrigido, usuarioId },
                 });
-                console.log(`📊 Análise da redação ${redacao.id} concluída: ${analiseEnem.notaFinal1000}/1000`);
-            } catch (analyzeError) {
-                console.error(`❌ Erro na análise automática da redação ${redacao.id}:`, analyzeError);
+                confirmarRegistro(textoCorrigido);
+            } catch (error) {
+                falharRegistro(error);
+                cancelar(job.controller, 'sem-interessados');
+                vagaHerdada?.then(liberarVaga => liberarVaga());
+                throw error;
             }
-        }, 1000);
+            console.log(`✅ Redação ${redacao.id} criada com sucesso!`);
+            if (!aproveitada) iniciarJobAnalise(redacao.id, textoCorrigido, true, undefined, vagaHerdada);
+        } else {
+            console.log("🤖 Iniciando correção automática com GPT...");
+            textoCorrigido = await corrigirTextoOCR(ocrResult.text, { signal, prazo });
+            registrarDuracao('redacao.etapa.correcao', Date.now() - inicioCorrecao);
+            lancarSeCancelado(signal);
+
+            console.log("💾 Salvando redação no banco de dados...");
+            redacao = await prisma.redacao.create({
+                data: {
+                    titulo,
+                    imagemUrl,
+                    textoExtraido: textoCorrigido, // Salva o texto já corrigido
+                    usuarioId
+                },
+            });
+
+            console.log(`✅ Redação ${redacao.id} criada com sucesso!`);
 
+            // Iniciar análise automática em background
+            console.log("⚡ Iniciando análise ENEM automática...");
+            iniciarJobAnalise(redacao.id, textoCorrigido, true);
+        }
+
+        registrarDuracao('redacao.total', prazo.decorridoMs());
         return res.status(201).json({ 
             ...redacao, 
             ocr: {
                 ...ocrResult,
                 text: textoCorrigido,
                 originalText: ocrResult.text,
-                corrected: true
+                corrected: textoCorrigido !== ocrResult.text // false se a correção foi pulada pelo prazo
             }
         });
 
     } catch (error: any) {
+        if (foiCancelado(error) && error.motivo === 'timeout') {
+            return res.status(504).json({ erro: "O processamento da redação excedeu o tempo limite." });
+        }
+        if (foiCancelado(error)) {
+            console.warn("⚠️ Upload cancelado pelo cliente antes da conclusão.");
+            return res.status(499).end();
+        }
         console.error("❌ Erro ao criar redação:", error);
         if (error.message.includes('PayloadTooLargeError')) {
             return res.status(413).json({ erro: "Imagem muito grande. Limite de 10MB." });
         }
         return res.status(500).json({ erro: "Erro interno do servidor.", detalhes: error.message });
+    } finally {
+        prazo?.encerrar();
+    }
+};
+
+/**
+ * Análise ENEM via Server-Sent Events: envia `competencia` assim que cada
+ * competência fica pronta (provisória, do corretor mais rápido) e `analise`
+ * com o consenso final. Junta-se ao job em andamento, se houver.
+ */
+export const transmitirAnaliseEnem = async (req: Request, res: Response) => {
+    const { id } = req.params;
+    let redacao;
+    try {
+        redacao = await prisma.redacao.findFirst({ where: { id, usuarioId: req.userId } });
+    } catch (error: any) {
+        return res.status(500).json({ erro: 'Erro ao processar análise ENEM.', detalhes: error.message });
+    }
+    if (!redacao) return res.status(404).json({ erro: 'Redação não encontrada.' });
+
+    const cacheEntry = analiseCache.get(id);
+    if (!cacheEntry && !analiseJobs.has(id) && estaSaturado()) {
+        const retryAfter = estimarRetryAfterSeg();
+        res.setHeader('Retry-After', String(retryAfter));
+        return res.status(503).json({ erro: 'Serviço sobrecarregado. Tente novamente em instantes.', retryAfter });
+    }
+
+    res.status(200);
+    res.setHeader('Content-Type', 'text/event-stream; charset=utf-8');
+    res.setHeader('Cache-Control', 'no-cache, no-transform');
+    res.setHeader('Connection', 'keep-alive');
+    res.setHeader('X-Accel-Buffering', 'no'); // sem buffer em proxies nginx
+    res.flushHeaders();
+    const enviar = (evento: string, dados: unknown) => {
+        if (!res.writableEnded) res.write(`event: ${evento}\ndata: ${JSON.stringify(dados)}\n\n`);
+    };
+
+    if (cacheEntry) {
+        for (const [chave, detalhe] of Object.entries(cacheEntry.data.competencias)) enviar('competencia', { chave, detalhe });
+        enviar('analise', { status: 'completed', analise: cacheEntry.data });
+        return res.end();
+    }
+
+    const job = iniciarJobAnalise(redacao.id, redacao.textoExtraido || '');
+    const ouvinte: OuvinteCompetencia = (chave, detalhe) => enviar('competencia', { chave, detalhe });
+    // Competências que já chegaram antes da conexão
+    for (const [chave, detalhe] of job.parciais) ouvinte(chave, detalhe);
+    job.ouvintes.add(ouvinte);
+    // Comentário periódico mantém a conexão viva atrás de proxies
+    const batimento = setInterval(() => { if (!res.writableEnded) res.write(': ping\n\n'); }, 15000);
+    // Desconectar apenas para de ouvir: o job continua e o resultado fica no cache
+    res.on('close', () => {
+        job.ouvintes.delete(ouvinte);
+        clearInterval(batimento);
+    });
+
+    try {
+        const analise = await job.promise;
+        enviar('analise', { status: 'completed', analise });
+    } catch (error: any) {
+        enviar('erro', { erro: foiCancelado(error) ? 'A análise foi interrompida.' : 'Erro ao processar análise ENEM.', detalhes: error.message });
+    } finally {
+        job.ouvintes.delete(ouvinte);
+        clearInterval(batimento);
+        res.end();
     }
 };
 
@@ -98,29 +405,14 @@ export const obterAnaliseEnem = async (req: Request, res: Response) => {
         if (analiseJobs.has(id)) {
             return res.status(202).json({ status: 'running', message: 'Análise em processamento...' });
         }
+        if (estaSaturado()) {
+            const retryAfter = estimarRetryAfterSeg();
+            res.setHeader('Retry-After', String(retryAfter));
+            return res.status(503).json({ erro: 'Serviço sobrecarregado. Tente novamente em instantes.', retryAfter });
+        }
 
-        const jobPromise = (async (): Promise<AnaliseENEM> => {
-            // Lógica simplificada e correta: usa o texto direto do OCR
-            const textoParaAnalise = redacao.textoExtraido || '';
-            const analiseEnem = await analisarEnem(textoParaAnalise);
-
-            try {
-                const notaFinal = analiseEnem.notaFinal1000;
-                if (notaFinal >= 0) {
-                    await prisma.redacao.update({ where: { id: redacao.id }, data: { notaGerada: notaFinal } });
-                }
-            } catch (error: any) { /* ... */ }
-
-            analiseCache.set(id, { data: analiseEnem, cachedAt: Date.now() });
-            return analiseEnem;
-        })();
-
-        analiseJobs.set(id, { promise: jobPromise, startedAt: Date.now() });
-        jobPromise.catch(err => {
-            console.error(`[ERRO NO JOB] A análise para a redação ${id} falhou:`, err.message);
-        }).finally(() => {
-            analiseJobs.delete(id);
-        });
+        // Lógica simplificada e correta: usa o texto direto do OCR
+        iniciarJobAnalise(redacao.id, redacao.textoExtraido || '');
 
         return res.status(202).json({ status: 'running', message: 'Análise iniciada...' });
     } catch (error: any) {
@@ -129,23 +421,94 @@ export const obterAnaliseEnem = async (req: Request, res: Response) => {
     }
 };
 
+/**
+ * Feedback sob demanda (ENEM_FEEDBACK_SOB_DEMANDA): gera o texto de uma seção
+ * (c1..c5 ou `geral`) da análise em cache, quando o aluno a abre. A seção
+ * gerada passa a fazer parte da análise em cache.
+ */
+export const obterFeedbackEnem = async (req: Request, res: Response) => {
+    let prazo: Prazo | undefined;
+    try {
+        const { id, secao } = req.params;
+        if (!SECOES_FEEDBACK.includes(secao as SecaoFeedback)) return res.status(400).json({ erro: 'Seção inválida.' });
+
+        const redacao = await prisma.redacao.findFirst({ where: { id, usuarioId: req.userId } });
+        if (!redacao) return res.status(404).json({ erro: 'Redação não encontrada.' });
+        const cacheEntry = analiseCache.get(id);
+        if (!cacheEntry) return res.status(409).json({ erro: 'A análise desta redação ainda não está disponível.' });
+
+        prazo = new Prazo(PRAZO_FEEDBACK_MS, cancelarAoDesconectar(req, res).signal);
+        const analise = await gerarFeedback(redacao.textoExtraido || '', cacheEntry.data, secao as SecaoFeedback, { signal: prazo.signal, prazo });
+        registrarDuracao('feedback.total', prazo.decorridoMs());
+        return res.json({ status: 'completed', secao, analise });
+    } catch (e: any) {
+        if (foiCancelado(e) && e.motivo === 'timeout') {
+            return res.status(504).json({ erro: 'A geração do feedback excedeu o tempo limite.' });
+        }
+        if (foiCancelado(e)) return res.status(499).end();
+        console.error(`Erro ao gerar feedback da redação ${req.params.id}:`, e);
+        return res.status(500).json({ erro: 'Erro ao gerar o feedback.', detalhes: e.message });
+    } finally {
+        prazo?.encerrar();
+    }
+};
+
 export const reanalisarTexto = async (req: Request, res: Response) => {
+    let prazo: Prazo | undefined;
     try {
-        const { texto } = req.body;
+        const { texto, redacaoId } = req.body;
         if (!texto || texto.trim().length < 50) return res.status(400).json({ erro: 'Texto inválido.' });
 
-        // Esta rota continua usando a formatação, e agora funciona
-        const textoFormatado = (await formatarTextoComLLM(texto)).textoFormatado;
-        const analise = await analisarEnem(textoFormatado);
+        // Com redacaoId (do próprio usuário), compara com a última versão analisada
+        // e reavalia só o que mudou
+        if (redacaoId) {
+            const redacao = await prisma.redacao.findFirst({ where: { id: redacaoId, usuarioId: req.userId } });
+            if (!redacao) return res.status(404).json({ erro: 'Redação não encontrada.' });
+        }
+
+        prazo = new Prazo(PRAZO_REANALISE_MS, cancelarAoDesconectar(req, res).signal);
+        const { signal } = prazo;
+
+        // A formatação continua sendo aplicada (pulada se o prazo estiver apertado)
+        const { textoFormatado, analise, incremental } = await reanalisar(texto, redacaoId, { signal, prazo });
+        registrarDuracao('reanalise.total', prazo.decorridoMs());
+        registrarDuracao(`reanalise.${incremental.modo}`, prazo.decorridoMs());
 
         // Retornando no formato correto que o frontend espera
-        return res.json({ textoAnalisado: textoFormatado, analise: analise });
+        return res.json({ textoAnalisado: textoFormatado, analise: analise, incremental });
     } catch (e: any) {
+        if (foiCancelado(e) && e.motivo === 'timeout') {
+            return res.status(504).json({ erro: 'A reanálise excedeu o tempo limite.' });
+        }
+        if (foiCancelado(e)) {
+            console.warn('⚠️ Reanálise cancelada: cliente desconectou.');
+            return res.status(499).end();
+        }
         console.error('Erro ao reanalisar texto:', e);
         return res.status(500).json({ erro: 'Erro interno ao reanalisar.', detalhes: e.message });
+    } finally {
+        prazo?.encerrar();
     }
 };
 
+/**
+ * Resposta do modo degradado de /reanalisar: usa apenas a heurística local
+ * (sem IA) e marca o resultado como provisório.
+ */
+export const reanalisarTextoProvisorio = async (req: Request, res: Response) => {
+    const { texto } = req.body;
+    if (!texto || texto.trim().length < 50) return res.status(400).json({ erro: 'Texto inválido.' });
+
+    const analiseHeuristica = analisarTexto(texto);
+    return res.status(200).json({
+        textoAnalisado: texto,
+        analise: null,
+        analiseHeuristica,
+        provisoria: true,
+        mensagem: 'Serviço de IA sobrecarregado: resultado provisório baseado em heurísticas locais.'
+    });
+};
+
 export const listarRedacoes = async (req: Request, res: Response) => {
     try {
         const redacoes = await prisma.redacao.findMany({
@@ -178,9 +541,14 @@ export const excluirRedacao = async (req: Request, res: Response) => {
         const redacao = await prisma.redacao.findFirst({ where: { id, usuarioId: req.userId } });
         if (!redacao) return res.status(404).json({ erro: "Redação não encontrada para exclusão." });
 
+        // Interrompe a análise em andamento para não gastar chamadas de IA à toa
+        const job = analiseJobs.get(id);
+        if (job) cancelar(job.controller, 'exclusao');
+
         await prisma.redacao.delete({ where: { id } });
         analiseCache.delete(id);
         analiseJobs.delete(id);
+        descartarVersaoAnalisada(id);
 
         return res.status(200).json({ mensagem: "Redação excluída com sucesso." });
     } catch (error) {
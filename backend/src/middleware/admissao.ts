@@ -0,0 +1,36 @@
+import { Request, Response, NextFunction } from "express";
+import { admitir, MODO_DEGRADADO, SaturacaoError } from "../services/admissaoService";
+import { incrementar } from "../services/metricasService";
+
+/**
+ * Controle de admissão para rotas que disparam o pipeline OCR/IA.
+ * Ocupa uma vaga até a resposta terminar (ou o cliente desconectar). Trabalho que
+ * continua depois da resposta pode assumir a vaga com `reterVaga` e liberá-la ao terminar.
+ * Quando o serviço está saturado, responde 503 com Retry-After — ou, se o
+ * modo degradado estiver ativo e a rota oferecer `respostaDegradada`, usa-a.
+ */
+export const controlarAdmissao = (respostaDegradada?: (req: Request, res: Response) => unknown) =>
+    async (req: Request, res: Response, next: NextFunction) => {
+        const controller = new AbortController();
+        res.on('close', () => controller.abort());
+
+        try {
+            const liberar = await admitir(controller.signal);
+            let retida = false;
+            res.on('close', () => { if (!retida) liberar(); });
+            res.locals.reterVaga = (): (() => void) => {
+                retida = true;
+                return liberar;
+            };
+            return next();
+        } catch (error: any) {
+            if (!(error instanceof SaturacaoError)) return; // cliente desistiu enquanto aguardava na fila
+
+            if (MODO_DEGRADADO && respostaDegradada) {
+                incrementar('admissao.degradado');
+                return respostaDegradada(req, res);
+            }
+            res.setHeader('Retry-After', String(error.retryAfterSeg));
+            return res.status(503).json({ erro: error.message, retryAfter: error.retryAfterSeg });
+        }
+    };
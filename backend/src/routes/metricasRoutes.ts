@@ -0,0 +1,13 @@
+import { Router } from "express";
+import { listarMetricas } from "../controllers/metricasController";
+
+const router = Router();
+
+/**
+ * @route   GET /metricas
+ * @desc    Contadores e latências (p50/p95/p99) do pipeline de OCR e IA.
+ * @access  Público (somente dados agregados)
+ */
+router.get("/", listarMetricas);
+
+export default router;
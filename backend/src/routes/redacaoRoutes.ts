@@ -6,9 +6,13 @@ import {
     criarRedacao,
     excluirRedacao,
     obterAnaliseEnem,
+    transmitirAnaliseEnem,
+    obterFeedbackEnem,
     reanalisarTexto,
+    reanalisarTextoProvisorio,
 } from "../controllers/redacaoController";
 import { autenticar } from "../middleware/auth";
+import { controlarAdmissao } from "../middleware/admissao";
 
 const router = Router();
 
@@ -24,9 +28,10 @@ const upload = multer({
 /**
  * @route   POST /api/redacoes
  * @desc    Cria uma nova redação a partir de um upload de imagem.
+ *          Responde 503 + Retry-After quando o pipeline OCR/IA está saturado.
  * @access  Privado
  */
-router.post("/", autenticar, upload.single('file'), criarRedacao);
+router.post("/", autenticar, controlarAdmissao(), upload.single('file'), criarRedacao);
 
 /**
  * @route   GET /api/redacoes
@@ -38,9 +43,13 @@ router.get("/", autenticar, listarRedacoes);
 /**
  * @route   POST /api/redacoes/reanalisar
  * @desc    Recebe um texto editado e retorna uma nova análise ENEM completa.
+ *          Com `redacaoId` no corpo, reavalia só as competências afetadas pelos
+ *          parágrafos alterados desde a última versão analisada.
+ *          Sob saturação: 503 + Retry-After, ou (ADMISSAO_MODO_DEGRADADO=true)
+ *          análise heurística local marcada como `provisoria`.
  * @access  Privado
  */
-router.post("/reanalisar", autenticar, reanalisarTexto);
+router.post("/reanalisar", autenticar, controlarAdmissao(reanalisarTextoProvisorio), reanalisarTexto);
 
 
 // --- Rotas por ID da Redação ---
@@ -67,5 +76,22 @@ router.delete("/:id", autenticar, excluirRedacao);
  */
 router.get("/:id/analise-enem", autenticar, obterAnaliseEnem);
 
+/**
+ * @route   GET /api/redacoes/:id/analise-enem/stream
+ * @desc    Mesma análise via Server-Sent Events: eventos `competencia` ({chave, detalhe})
+ *          à medida que cada competência fica pronta e `analise` com o resultado final.
+ * @access  Privado
+ */
+router.get("/:id/analise-enem/stream", autenticar, transmitirAnaliseEnem);
+
+/**
+ * @route   GET /api/redacoes/:id/analise-enem/feedback/:secao
+ * @desc    Com ENEM_FEEDBACK_SOB_DEMANDA=true a análise traz só notas e tese; esta rota
+ *          gera o feedback de uma seção (c1..c5 ou `geral`) quando o aluno a abre.
+ *          409 se a análise ainda não estiver pronta.
+ * @access  Privado
+ */
+router.get("/:id/analise-enem/feedback/:secao", autenticar, controlarAdmissao(), obterFeedbackEnem);
+
 
 export default router;
\ No newline at end of file
@@ -0,0 +1,109 @@
+// admissaoService.ts
+// Controle de admissão do pipeline OCR/IA: limita quantos pipelines rodam ao
+// mesmo tempo e recusa trabalho novo quando a fila cresce ou envelhece demais,
+// em vez de deixar a latência subir até o Azure responder 429 para todos.
+
+import { incrementar, registrarDuracao, registrarMedidor } from './metricasService';
+import { erroDoSinal } from './cancelamento';
+
+const MAX_PIPELINES = Number(process.env.ADMISSAO_MAX_PIPELINES) || 8;
+const MAX_FILA = Number(process.env.ADMISSAO_MAX_FILA) || 16;
+const MAX_IDADE_FILA_MS = Number(process.env.ADMISSAO_MAX_IDADE_FILA_MS) || 15000;
+// Opt-in: sob saturação, /reanalisar responde com a análise heurística local
+export const MODO_DEGRADADO = process.env.ADMISSAO_MODO_DEGRADADO === 'true';
+
+type Espera = { entrouEm: number; liberar: () => void };
+
+let emExecucao = 0;
+const fila: Espera[] = [];
+// Duração média recente de um pipeline, usada para estimar o Retry-After
+let duracaoMediaMs = 20000;
+
+registrarMedidor('admissao.em_execucao', () => emExecucao);
+registrarMedidor('admissao.fila', () => fila.length);
+registrarMedidor('admissao.idade_fila_ms', () => idadeFilaMs());
+
+export class SaturacaoError extends Error {
+    retryAfterSeg: number;
+
+    constructor(retryAfterSeg: number) {
+        super('Serviço sobrecarregado. Tente novamente em instantes.');
+        this.name = 'SaturacaoError';
+        this.retryAfterSeg = retryAfterSeg;
+    }
+}
+
+const idadeFilaMs = (): number => (fila.length > 0 ? Date.now() - fila[0].entrouEm : 0);
+
+/**
+ * Saturado = todas as vagas ocupadas E (fila cheia OU o pedido mais antigo
+ * da fila já espera há mais que o limite).
+ */
+export function estaSaturado(): boolean {
+    if (emExecucao < MAX_PIPELINES) return false;
+    return fila.length >= MAX_FILA || idadeFilaMs() > MAX_IDADE_FILA_MS;
+}
+
+export function estimarRetryAfterSeg(): number {
+    // Tempo aproximado para escoar a fila atual com as vagas disponíveis
+    const rodadas = Math.ceil((fila.length + 1) / MAX_PIPELINES);
+    return Math.max(1, Math.ceil((rodadas * duracaoMediaMs) / 1000));
+}
+
+const criarLiberacao = (inicio: number) => {
+    let liberado = false;
+    return () => {
+        if (liberado) return;
+        liberado = true;
+        duracaoMediaMs = duracaoMediaMs * 0.8 + (Date.now() - inicio) * 0.2;
+        const proximo = fila.shift();
+        if (proximo) {
+            // A vaga passa direto para o próximo da fila
+            proximo.liberar();
+        } else {
+            emExecucao--;
+        }
+    };
+};
+
+/**
+ * Aguarda uma vaga no pipeline. Retorna a função que devolve a vaga
+ * (idempotente). Se `signal` abortar enquanto espera, sai da fila.
+ */
+export function adquirirVaga(signal?: AbortSignal): Promise<() => void> {
+    if (signal?.aborted) return Promise.reject(erroDoSinal(signal));
+
+    if (emExecucao < MAX_PIPELINES) {
+        emExecucao++;
+        incrementar('admissao.admitido');
+        return Promise.resolve(criarLiberacao(Date.now()));
+    }
+
+    incrementar('admissao.enfileirado');
+    return new Promise((resolve, reject) => {
+        const espera: Espera = {
+            entrouEm: Date.now(),
+            liberar: () => {
+                signal?.removeEventListener('abort', aoAbortar);
+                registrarDuracao('admissao.espera_fila', Date.now() - espera.entrouEm);
+                resolve(criarLiberacao(Date.now()));
+            },
+        };
+        const aoAbortar = () => {
+            const idx = fila.indexOf(espera);
+            if (idx >= 0) fila.splice(idx, 1);
+            reject(erroDoSinal(signal));
+        };
+        signal?.addEventListener('abort', aoAbortar, { once: true });
+        fila.push(espera);
+    });
+}
+
+/** Como `adquirirVaga`, mas recusa imediatamente (SaturacaoError) se saturado. */
+export function admitir(signal?: AbortSignal): Promise<() => void> {
+    if (estaSaturado()) {
+        incrementar('admissao.rejeitado');
+        return Promise.reject(new SaturacaoError(estimarRetryAfterSeg()));
+    }
+    return adquirirVaga(signal);
+}
@@ -1,4 +1,5 @@
 import axios from 'axios';
+import { CancelamentoError, erroDoSinal, foiCancelado, foiTempoEsgotado } from './cancelamento';
 
 const AZURE_ENDPOINT = (process.env.AZURE_CV_ENDPOINT || '').replace(/\/$/, '');
 const AZURE_KEY = process.env.AZURE_CV_KEY || '';
@@ -16,7 +17,7 @@ export interface AzureReadResult {
     isHandwrittenOnly: boolean;
 }
 
-export async function extractTextWithAzureRead(imageBuffer: Buffer): Promise<AzureReadResult | null> {
+export async function extractTextWithAzureRead(imageBuffer: Buffer, signal?: AbortSignal, timeoutMs?: number): Promise<AzureReadResult | null> {
     if (!AZURE_ENDPOINT || !AZURE_KEY) {
         console.warn('Azure Vision v4.0 (Servios de IA) no configurado.');
         return null;
@@ -37,7 +38,7 @@ export async function extractTextWithAzureRead(imageBuffer: Buffer): Promise<Azu
             'Ocp-Apim-Subscription-Key': AZURE_KEY
         };
 
-        const response = await axios.post(url, imageBuffer, { headers });
+        const response = await axios.post(url, imageBuffer, { headers, signal, timeout: timeoutMs });
 
         const readResult = response.data?.readResult;
         if (!readResult || !readResult.blocks || readResult.blocks.length === 0) {
@@ -68,6 +69,8 @@ export async function extractTextWithAzureRead(imageBuffer: Buffer): Promise<Azu
         return { text, confidence, lines: handwrittenLines, isHandwrittenOnly: handwrittenLines.length > 0 && handwrittenLines.length === allLines.length };
 
     } catch (error: any) {
+        if (foiCancelado(error)) throw erroDoSinal(signal);
+        if (foiTempoEsgotado(error)) throw new CancelamentoError('timeout');
         if (axios.isAxiosError(error)) {
             const status = error.response?.status;
             const data = error.response?.data;
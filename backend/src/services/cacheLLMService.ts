@@ -0,0 +1,190 @@
+// cacheLLMService.ts
+// Cache persistente de respostas do LLM. A chave é o hash do texto de entrada
+// normalizado, da versão do template do prompt, do deployment e dos parâmetros
+// de amostragem: reanalisar o mesmo texto (ex.: clique duplo em "reanalisar")
+// não refaz as chamadas. Camada em memória (LRU) na frente da tabela
+// RespostaLLMCache; falhas do banco viram "miss", nunca erro para o usuário.
+
+import { PrismaClient } from '@prisma/client';
+import { hashConteudo, normalizarTexto } from './singleFlight';
+import { incrementar, obterContador, registrarMedidor } from './metricasService';
+
+const prisma = new PrismaClient();
+
+const TTL_PADRAO_MS = Number(process.env.LLM_CACHE_TTL_MS) || 7 * 24 * 60 * 60 * 1000;
+const MAX_MEMORIA = Number(process.env.LLM_CACHE_MAX_MEMORIA) || 500;
+let ativo = process.env.LLM_CACHE !== 'false';
+
+export interface EntradaCacheLLM {
+    texto: string;
+    promptTokens: number;
+    completionTokens: number;
+}
+
+export interface ParametrosChaveLLM {
+    mensagens: Array<{ role: string; content: string }>;
+    versaoPrompt: string;
+    deployment: string;
+    maxTokens: number;
+    temperature: number;
+    formatoResposta?: string;
+}
+
+export interface OpcoesGravacaoCache {
+    uso: string;
+    versaoPrompt: string;
+    deployment: string;
+    ttlMs?: number;
+}
+
+type EntradaMemoria = EntradaCacheLLM & { uso: string; versaoPrompt: string; expiraEm: number };
+
+// Map preserva a ordem de inserção: reinserir no acesso dá um LRU simples
+const memoria = new Map<string, EntradaMemoria>();
+// A limpeza dos vencidos no banco roda uma vez por execução, na primeira leitura
+let limpezaIniciada = false;
+
+registrarMedidor('llm.cache.taxa_acerto_pct', () => {
+    const acertos = obterContador('llm.cache.acerto');
+    const total = acertos + obterContador('llm.cache.falta');
+    return total ? Math.round((acertos / total) * 100) : 0;
+});
+registrarMedidor('llm.cache.memoria', () => memoria.size);
+
+/** Liga/desliga o cache (ex.: benchmarks que precisam de chamadas reais). */
+export function definirCacheLLMAtivo(valor: boolean): void {
+    ativo = valor;
+}
+
+export function cacheLLMAtivo(): boolean {
+    return ativo;
+}
+
+export function chaveCacheLLM(p: ParametrosChaveLLM): string {
+    return hashConteudo(
+        p.versaoPrompt,
+        p.deployment,
+        `max=${p.maxTokens};temp=${p.temperature};formato=${p.formatoResposta || ''}`,
+        ...p.mensagens.map(m => `${m.role}:${normalizarTexto(m.content)}`)
+    );
+}
+
+function guardarNaMemoria(chave: string, entrada: EntradaMemoria): void {
+    memoria.delete(chave);
+    memoria.set(chave, entrada);
+    if (memoria.size > MAX_MEMORIA) memoria.delete(memoria.keys().next().value as string);
+}
+
+/**
+ * Remove do banco as respostas vencidas. Versões antigas do prompt não são apagadas
+ * aqui: a versão faz parte da chave, então elas nunca viram acerto e saem pelo
+ * `expiraEm`, sem quebrar o cache de instâncias que ainda rodam a versão anterior
+ * (deploy gradual, rollback).
+ */
+export async function removerExpiradosLLM(): Promise<number> {
+    const { count } = await prisma.respostaLLMCache.deleteMany({ where: { expiraEm: { lt: new Date() } } });
+    if (count > 0) {
+        incrementar('llm.cache.expirado', count);
+        console.log(`🧹 Cache LLM: ${count} resposta(s) vencida(s) removidas.`);
+    }
+    return count;
+}
+
+export interface FiltroInvalidacao {
+    uso: string;
+    // Apaga só esta versão do prompt (tem precedência sobre `manterVersao`)
+    versaoPrompt?: string;
+    // Apaga todas as versões menos esta
+    manterVersao?: string;
+}
+
+/**
+ * Invalidação explícita (manutenção, ver scripts/limparCacheLLM.ts): rode depois
+ * que todas as instâncias estiverem na versão nova do prompt.
+ */
+export async function invalidarCacheLLM(filtro: FiltroInvalidacao): Promise<number> {
+    const { uso, versaoPrompt, manterVersao } = filtro;
+    const corresponde = (versao: string) => versaoPrompt !== undefined
+        ? versao === versaoPrompt
+        : versao !== manterVersao;
+    for (const [chave, entrada] of memoria) {
+        if (entrada.uso === uso && corresponde(entrada.versaoPrompt)) memoria.delete(chave);
+    }
+    const filtroVersao = versaoPrompt !== undefined ? versaoPrompt : manterVersao !== undefined ? { not: manterVersao } : undefined;
+    const { count } = await prisma.respostaLLMCache.deleteMany({
+        where: filtroVersao !== undefined ? { uso, versaoPrompt: filtroVersao } : { uso },
+    });
+    if (count > 0) {
+        incrementar('llm.cache.invalidado', count);
+        console.log(`🧹 Cache LLM: ${count} resposta(s) do prompt '${uso}' invalidadas.`);
+    }
+    return count;
+}
+
+export async function lerCacheLLM(chave: string, uso: string, versaoPrompt: string): Promise<EntradaCacheLLM | null> {
+    if (!ativo) return null;
+    const agora = Date.now();
+
+    const local = memoria.get(chave);
+    if (local && local.expiraEm > agora) {
+        guardarNaMemoria(chave, local);
+        incrementar('llm.cache.acerto');
+        incrementar(`llm.cache.${uso}.acerto`);
+        return local;
+    }
+    if (local) memoria.delete(chave);
+
+    if (!limpezaIniciada) {
+        limpezaIniciada = true;
+        // Em segundo plano: a leitura não espera a limpeza
+        removerExpiradosLLM().catch(error => console.warn(`⚠️ Cache LLM: falha ao remover vencidos: ${error.message}`));
+    }
+    try {
+        const registro = await prisma.respostaLLMCache.findUnique({ where: { chave } });
+        if (registro && registro.expiraEm.getTime() > agora) {
+            const entrada: EntradaMemoria = {
+                texto: registro.resposta,
+                promptTokens: registro.promptTokens,
+                completionTokens: registro.completionTokens,
+                uso,
+                versaoPrompt,
+                expiraEm: registro.expiraEm.getTime(),
+            };
+            guardarNaMemoria(chave, entrada);
+            incrementar('llm.cache.acerto');
+            incrementar(`llm.cache.${uso}.acerto`);
+            return entrada;
+        }
+        if (registro) {
+            prisma.respostaLLMCache.delete({ where: { chave } }).catch(() => undefined);
+            incrementar('llm.cache.expirado');
+        }
+    } catch (error: any) {
+        incrementar('llm.cache.erro');
+        console.warn(`⚠️ Cache LLM indisponível (leitura): ${error.message}`);
+    }
+    incrementar('llm.cache.falta');
+    incrementar(`llm.cache.${uso}.falta`);
+    return null;
+}
+
+export async function gravarCacheLLM(chave: string, entrada: EntradaCacheLLM, opcoes: OpcoesGravacaoCache): Promise<void> {
+    if (!ativo) return;
+    const expiraEm = Date.now() + (opcoes.ttlMs ?? TTL_PADRAO_MS);
+    guardarNaMemoria(chave, { ...entrada, uso: opcoes.uso, versaoPrompt: opcoes.versaoPrompt, expiraEm });
+    try {
+        const dados = {
+            uso: opcoes.uso,
+            versaoPrompt: opcoes.versaoPrompt,
+            deployment: opcoes.deployment,
+            resposta: entrada.texto,
+            promptTokens: entrada.promptTokens,
+            completionTokens: entrada.completionTokens,
+            expiraEm: new Date(expiraEm),
+        };
+        await prisma.respostaLLMCache.upsert({ where: { chave }, create: { chave, ...dados }, update: dados });
+    } catch (error: any) {
+        incrementar('llm.cache.erro');
+        console.warn(`⚠️ Cache LLM indisponível (gravação): ${error.message}`);
+    }
+}
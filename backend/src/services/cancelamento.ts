@@ -0,0 +1,81 @@
+// cancelamento.ts
+// Utilitários de cancelamento (AbortSignal) para o pipeline de OCR e IA.
+
+import { Request, Response } from 'express';
+import axios from 'axios';
+import { incrementar } from './metricasService';
+
+export type MotivoCancelamento = 'exclusao' | 'desconexao' | 'timeout' | 'sem-interessados';
+
+export class CancelamentoError extends Error {
+    motivo: MotivoCancelamento | string;
+
+    constructor(motivo: MotivoCancelamento | string = 'cancelado') {
+        super(`Operação cancelada (${motivo}).`);
+        this.name = 'CancelamentoError';
+        this.motivo = motivo;
+    }
+}
+
+export function erroDoSinal(signal?: AbortSignal): CancelamentoError {
+    const razao = signal?.reason;
+    if (razao instanceof CancelamentoError) return razao;
+    return new CancelamentoError(typeof razao === 'string' ? razao : 'cancelado');
+}
+
+/** Indica se o erro veio de um cancelamento (nosso, do axios ou de um AbortController). */
+export function foiCancelado(error: any): boolean {
+    return error instanceof CancelamentoError || axios.isCancel(error) || error?.name === 'AbortError';
+}
+
+/**
+ * Indica se o erro é um timeout da chamada (axios, node-fetch ou gRPC): o prazo
+ * acabou no meio da etapa, o que não diz nada sobre a entrada.
+ */
+export function foiTempoEsgotado(error: any): boolean {
+    return error?.code === 'ECONNABORTED' || error?.code === 'ETIMEDOUT'
+        || error?.type === 'request-timeout' // node-fetch
+        || error?.name === 'TimeoutError'
+        || /DEADLINE_EXCEEDED/.test(error?.message || ''); // gRPC (status 4)
+}
+
+export function lancarSeCancelado(signal?: AbortSignal): void {
+    if (signal?.aborted) throw erroDoSinal(signal);
+}
+
+/** Aborta o controller registrando o motivo nas métricas. */
+export function cancelar(controller: AbortController, motivo: MotivoCancelamento): void {
+    if (controller.signal.aborted) return;
+    incrementar(`cancelamento.${motivo}`);
+    controller.abort(new CancelamentoError(motivo));
+}
+
+/**
+ * Faz a promessa rejeitar assim que o sinal for abortado. Útil para clientes
+ * que não aceitam AbortSignal (ex.: SDK do Google Vision): o resultado é
+ * descartado mesmo que a chamada remota continue.
+ */
+export function comSinal<T>(promessa: Promise<T>, signal?: AbortSignal): Promise<T> {
+    if (!signal) return promessa;
+    if (signal.aborted) return Promise.reject(erroDoSinal(signal));
+    return new Promise<T>((resolve, reject) => {
+        const aoAbortar = () => reject(erroDoSinal(signal));
+        signal.addEventListener('abort', aoAbortar, { once: true });
+        promessa.then(
+            valor => { signal.removeEventListener('abort', aoAbortar); resolve(valor); },
+            erro => { signal.removeEventListener('abort', aoAbortar); reject(erro); }
+        );
+    });
+}
+
+/**
+ * Cria um AbortController que é abortado se o cliente fechar a conexão
+ * antes de a resposta ser enviada (rotas síncronas).
+ */
+export function cancelarAoDesconectar(_req: Request, res: Response): AbortController {
+    const controller = new AbortController();
+    res.on('close', () => {
+        if (!res.writableFinished) cancelar(controller, 'desconexao');
+    });
+    return controller;
+}
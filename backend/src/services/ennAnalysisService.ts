@@ -1,4 +1,55 @@
-import { chamarLLM } from './openaiService'; // Voltamos a usar o serviço do Azure OpenAI
+import { chamarLLM, chamarLLMComEscalada, MensagemLLM, registrarEscalada, textoIncompleto } from './openaiService'; // Voltamos a usar o serviço do Azure OpenAI
+import { executarUmaVez, hashConteudo, normalizarTexto } from './singleFlight';
+import { foiCancelado, lancarSeCancelado } from './cancelamento';
+import { OpcoesExecucao } from './prazo';
+import { incrementar, registrarDuracao } from './metricasService';
+import { ExtratorIncremental, parseJsonTolerante } from './jsonTolerante';
+import { aguardarQuorum } from './quorum';
+import { CamadaModelo, camadasDistintas } from './llmRouter';
+
+// Versões dos prompts: alterar ao mudar o texto dos templates, pois entram na
+// chave de coalescência (textos iguais só compartilham resultado com o mesmo prompt).
+export const VERSAO_PROMPT_ENEM = 'enem-v3';
+export const VERSAO_PROMPT_FORMATACAO = 'formatacao-v1';
+export const VERSAO_PROMPT_DELTA = 'enem-delta-v1';
+export const VERSAO_PROMPT_FUNDIDO = 'enem-fundido-v1';
+export const VERSAO_PROMPT_NOTAS = 'enem-notas-v1';
+export const VERSAO_PROMPT_FEEDBACK = 'enem-feedback-v1';
+export const VERSAO_PROMPT_LOTE = 'enem-lote-v1';
+
+// Orçamento mínimo para disparar os corretores e para a formatação (reanálise)
+const AVALIACAO_MIN_MS = Number(process.env.PRAZO_MIN_AVALIACAO_MS) || 10000;
+const FORMATACAO_MIN_MS = Number(process.env.PRAZO_MIN_FORMATACAO_MS) || 8000;
+
+// Ensemble adaptativo: começa com poucos corretores e só chama os demais quando
+// alguma competência diverge mais que o limiar (em pontos da escala 0–200).
+const CORRETORES_INICIAIS = Number(process.env.ENEM_CORRETORES_INICIAIS) || 2;
+const LIMIAR_DIVERGENCIA = Number(process.env.ENEM_LIMIAR_DIVERGENCIA) || 40;
+
+// Estratégia do ensemble: 'adaptativa' (padrão, acima), 'quorum' (todos os
+// corretores em paralelo, respondendo com os `ENEM_QUORUM_MINIMO` primeiros;
+// em ambas, após `ENEM_QUORUM_PRAZO_MS` basta uma análise válida) ou
+// 'chamada-unica' (uma só requisição devolve as avaliações de todos os perfis).
+export type EstrategiaEnem = 'adaptativa' | 'quorum' | 'chamada-unica';
+const ESTRATEGIAS_ENEM: EstrategiaEnem[] = ['adaptativa', 'quorum', 'chamada-unica'];
+const ESTRATEGIA_ENEM: EstrategiaEnem = ESTRATEGIAS_ENEM.includes(process.env.ENEM_ESTRATEGIA as EstrategiaEnem)
+    ? process.env.ENEM_ESTRATEGIA as EstrategiaEnem
+    : 'adaptativa';
+const QUORUM_MINIMO = Number(process.env.ENEM_QUORUM_MINIMO) || 2;
+const QUORUM_PRAZO_MS = Number(process.env.ENEM_QUORUM_PRAZO_MS) || 20000;
+const MAX_AMOSTRAS_CALIBRACAO = 200;
+// Camada dos corretores iniciais. Com 'pequeno', só sobem para o modelo grande a
+// análise inválida (refeita) e o desempate quando os corretores divergem.
+const CAMADA_ENEM: CamadaModelo = process.env.ENEM_CAMADA === 'pequeno' ? 'pequeno' : 'grande';
+// Feedback sob demanda: os corretores devolvem só as notas e a tese (resposta curta);
+// comentários e pontos de cada competência são gerados quando o aluno abre a seção
+const FEEDBACK_SOB_DEMANDA = process.env.ENEM_FEEDBACK_SOB_DEMANDA === 'true';
+// Avaliação em lote (backfill): redações por requisição, limite de texto por
+// pacote, pacotes em paralelo e teto de tokens de saída de uma requisição
+const LOTE_TAMANHO = Number(process.env.ENEM_LOTE_TAMANHO) || 5;
+const LOTE_MAX_CARACTERES = Number(process.env.ENEM_LOTE_MAX_CARACTERES) || 12000;
+const LOTE_CONCORRENCIA = Number(process.env.ENEM_LOTE_CONCORRENCIA) || 4;
+const LOTE_MAX_TOKENS_SAIDA = Number(process.env.ENEM_LOTE_MAX_TOKENS_SAIDA) || 16384;
 
 // --- Interfaces para a Análise Estruturada do ENEM ---
 export interface DetalheCompetencia {
@@ -16,23 +67,226 @@ export interface AnaliseENEM {
     competencias: {
         c1: DetalheCompetencia; c2: DetalheCompetencia; c3: DetalheCompetencia; c4: DetalheCompetencia; c5: DetalheCompetencia;
     };
+    // Seções com comentário vazio são geradas sob demanda (gerarFeedback)
+    feedbackSobDemanda?: boolean;
+}
+
+// --- Schema da resposta (saída estruturada) e validação ---
+const NOTAS_VALIDAS = [0, 40, 80, 120, 160, 200];
+export const CHAVES_COMPETENCIAS = ['c1', 'c2', 'c3', 'c4', 'c5'] as const;
+export type ChaveCompetencia = typeof CHAVES_COMPETENCIAS[number];
+const NOMES_COMPETENCIAS: Record<ChaveCompetencia, string> = {
+    c1: 'Competência I: domínio da escrita formal',
+    c2: 'Competência II: compreensão da proposta',
+    c3: 'Competência III: seleção e organização dos argumentos',
+    c4: 'Competência IV: mecanismos de coesão',
+    c5: 'Competência V: proposta de intervenção',
+};
+
+const schemaCompetencia = {
+    type: 'object',
+    additionalProperties: false,
+    required: ['nome', 'nota', 'comentario', 'pontosFortes', 'pontosAMelhorar'],
+    properties: {
+        nome: { type: 'string' },
+        nota: { type: 'integer', enum: NOTAS_VALIDAS },
+        comentario: { type: 'string' },
+        pontosFortes: { type: 'array', items: { type: 'string' } },
+        pontosAMelhorar: { type: 'array', items: { type: 'string' } },
+    },
+};
+
+export const schemaAnaliseENEM = {
+    type: 'object',
+    additionalProperties: false,
+    required: ['notaFinal1000', 'tesePrincipal', 'tituloSugerido', 'comentarioGeral', 'competencias'],
+    properties: {
+        notaFinal1000: { type: 'integer' },
+        tesePrincipal: { type: 'string' },
+        tituloSugerido: { type: 'string' },
+        comentarioGeral: { type: 'string' },
+        competencias: {
+            type: 'object',
+            additionalProperties: false,
+            required: [...CHAVES_COMPETENCIAS],
+            properties: Object.fromEntries(CHAVES_COMPETENCIAS.map(c => [c, schemaCompetencia])),
+        },
+    },
+};
+
+// Feedback sob demanda: só as notas e a tese
+const schemaNotasENEM = {
+    type: 'object',
+    additionalProperties: false,
+    required: ['tesePrincipal', 'competencias'],
+    properties: {
+        tesePrincipal: { type: 'string' },
+        competencias: {
+            type: 'object',
+            additionalProperties: false,
+            required: [...CHAVES_COMPETENCIAS],
+            properties: Object.fromEntries(CHAVES_COMPETENCIAS.map(c => [c, {
+                type: 'object',
+                additionalProperties: false,
+                required: ['nota'],
+                properties: { nota: { type: 'integer', enum: NOTAS_VALIDAS } },
+            }])),
+        },
+    },
+};
+
+const comoTexto = (v: any): string => (typeof v === 'string' ? v : v == null ? '' : String(v));
+const comoLista = (v: any): string[] => (Array.isArray(v) ? v.map(comoTexto).filter(Boolean) : []);
+
+/** Valida uma competência; nota ausente ou não numérica a invalida. */
+function validarCompetencia(c: any): { detalhe: DetalheCompetencia | null; reparos: number } {
+    const nota = Number(c?.nota);
+    if (!c || typeof c !== 'object' || c.nota === null || c.nota === '' || !Number.isFinite(nota)) {
+        return { detalhe: null, reparos: 0 };
+    }
+    let reparos = 0;
+    // Escala oficial: arredonda para o múltiplo de 40 mais próximo entre 0 e 200
+    const notaAjustada = Math.min(200, Math.max(0, Math.round(nota / 40) * 40));
+    if (notaAjustada !== c.nota) reparos++;
+    if (!Array.isArray(c.pontosFortes) || !Array.isArray(c.pontosAMelhorar)) reparos++;
+    return {
+        detalhe: {
+            nome: comoTexto(c.nome),
+            nota: notaAjustada,
+            comentario: comoTexto(c.comentario),
+            pontosFortes: comoLista(c.pontosFortes),
+            pontosAMelhorar: comoLista(c.pontosAMelhorar),
+        },
+        reparos,
+    };
+}
+
+/**
+ * Valida um objeto contra o formato de AnaliseENEM. Reparos seguros (nota fora
+ * da escala oficial, número vindo como string, listas ausentes) são aplicados e
+ * contados; competência ou nota ausente invalida a análise.
+ */
+export function validarAnaliseENEM(bruto: any): { analise: AnaliseENEM | null; reparos: number } {
+    let reparos = 0;
+    if (!bruto || typeof bruto !== 'object' || !bruto.competencias || typeof bruto.competencias !== 'object') {
+        return { analise: null, reparos };
+    }
+    const competencias = {} as AnaliseENEM['competencias'];
+    for (const chave of CHAVES_COMPETENCIAS) {
+        const { detalhe, reparos: r } = validarCompetencia(bruto.competencias[chave]);
+        if (!detalhe) return { analise: null, reparos };
+        reparos += r;
+        competencias[chave] = detalhe;
+    }
+    return {
+        analise: {
+            // A nota final é sempre recalculada a partir das competências
+            notaFinal1000: CHAVES_COMPETENCIAS.reduce((soma, c) => soma + competencias[c].nota, 0),
+            tesePrincipal: comoTexto(bruto.tesePrincipal),
+            tituloSugerido: comoTexto(bruto.tituloSugerido),
+            comentarioGeral: comoTexto(bruto.comentarioGeral),
+            competencias,
+        },
+        reparos,
+    };
+}
+
+/** Competência só com a nota: completa o nome e deixa o feedback vazio (gerado sob demanda). */
+const completarCompetencia = (chave: ChaveCompetencia, c: any) =>
+    c && typeof c === 'object' ? { nome: NOMES_COMPETENCIAS[chave], comentario: '', pontosFortes: [], pontosAMelhorar: [], ...c } : c;
+
+/** Resposta no formato de notas (schemaNotasENEM) levada ao formato de AnaliseENEM. */
+function completarNotas(valor: any): any {
+    if (!valor || typeof valor !== 'object' || !valor.competencias || typeof valor.competencias !== 'object') return valor;
+    return {
+        tituloSugerido: '',
+        comentarioGeral: '',
+        ...valor,
+        competencias: Object.fromEntries(CHAVES_COMPETENCIAS.map(c => [c, completarCompetencia(c, valor.competencias[c])])),
+    };
 }
 
-// --- PROMPT COMPLETO E CORRIGIDO ---
-const promptTemplateEnem = (texto: string, perfilCorretor: string): string => `
-Você é um corretor especialista em redações do ENEM. Adote o seguinte perfil: ${perfilCorretor}.
-Sua tarefa é avaliar o texto abaixo com extremo rigor, conforme a Cartilha do Participante. Para cada uma das 5 competências, siga a escala oficial (0, 40, 80, 120, 160, 200) e justifique sua decisão.
+// Validação sem métricas nem logs: decide se uma resposta pode entrar no cache do LLM.
+// Só entra o que passa no validador; resposta que apenas "parseia" ficaria presa no cache.
+const analiseValida = (valor: any, sobDemanda: boolean): boolean =>
+    validarAnaliseENEM(sobDemanda ? completarNotas(valor) : valor).analise !== null;
+
+const respostaEnemValida = (resposta: string, sobDemanda: boolean): boolean => {
+    const json = parseJsonTolerante(resposta);
+    return Boolean(json) && analiseValida(json!.valor, sobDemanda);
+};
+
+/** Interpreta a resposta do LLM (JSON estrito ou texto livre com JSON) e contabiliza falhas e reparos. */
+export function interpretarRespostaEnem(resposta: string, sobDemanda = false): AnaliseENEM | null {
+    incrementar('enem.parse.total');
+    const json = parseJsonTolerante(resposta);
+    if (!json) {
+        incrementar('enem.parse.falha');
+        console.warn(`⚠️ Resposta do corretor sem JSON interpretável: ${resposta.slice(0, 200)}`);
+        return null;
+    }
+    if (json.reparado) incrementar('enem.parse.reparado');
+    return validarComMetricas(sobDemanda ? completarNotas(json.valor) : json.valor, resposta);
+}
+
+function validarComMetricas(valor: any, resposta: string): AnaliseENEM | null {
+    const { analise, reparos } = validarAnaliseENEM(valor);
+    if (!analise) {
+        incrementar('enem.validacao.falha');
+        console.warn(`⚠️ Resposta do corretor fora do schema AnaliseENEM: ${resposta.slice(0, 200)}`);
+        return null;
+    }
+    if (reparos > 0) incrementar('enem.validacao.reparada');
+    return analise;
+}
+
+const schemaAvaliacoesMultiplas = (sobDemanda: boolean) => ({
+    type: 'object',
+    additionalProperties: false,
+    required: ['avaliacoes'],
+    properties: { avaliacoes: { type: 'array', items: sobDemanda ? schemaNotasENEM : schemaAnaliseENEM } },
+});
+
+/** Resposta da estratégia de chamada única: `{ "avaliacoes": [AnaliseENEM, ...] }`, uma por perfil. */
+export function interpretarRespostaMultipla(resposta: string, sobDemanda = false): AnaliseENEM[] {
+    incrementar('enem.parse.total');
+    const json = parseJsonTolerante(resposta);
+    const avaliacoes = json?.valor?.avaliacoes;
+    if (!json || !Array.isArray(avaliacoes)) {
+        incrementar('enem.parse.falha');
+        console.warn(`⚠️ Resposta multi-perfil sem JSON interpretável: ${resposta.slice(0, 200)}`);
+        return [];
+    }
+    // Em resposta truncada, o reparo mantém apenas as avaliações completas
+    if (json.reparado) incrementar('enem.parse.reparado');
+    return avaliacoes
+        .map((a: any) => validarComMetricas(sobDemanda ? completarNotas(a) : a, resposta))
+        .filter((a: AnaliseENEM | null): a is AnaliseENEM => a !== null);
+}
+
+// --- PROMPT EM CAMADAS (amigável ao cache de prompt) ---
+// A parte estática (instruções, rubrica e estrutura do JSON) vem primeiro e é
+// idêntica em todas as chamadas, depois o perfil do corretor e por último a
+// redação. Assim o provedor reaproveita o prefixo entre os corretores e entre
+// redações. Não interpolar nada variável neste bloco. A rubrica abre também os
+// prompts de notas e de feedback, que assim compartilham o início do prefixo.
+const RUBRICA_ENEM = `Você é um corretor especialista em redações do ENEM.
+Sua tarefa é avaliar o texto enviado pelo usuário com extremo rigor, conforme a Cartilha do Participante. Para cada uma das 5 competências, siga a escala oficial (0, 40, 80, 120, 160, 200) e justifique sua decisão.
+
+Competências avaliadas:
+- Competência I: domínio da modalidade escrita formal da língua portuguesa (gramática, ortografia, pontuação, escolha de registro).
+- Competência II: compreensão da proposta e aplicação de conceitos de várias áreas do conhecimento para desenvolver o tema, dentro dos limites estruturais do texto dissertativo-argumentativo em prosa (inclui repertório sociocultural legitimado e pertinente).
+- Competência III: seleção, relação, organização e interpretação de informações, fatos, opiniões e argumentos em defesa de um ponto de vista (projeto de texto).
+- Competência IV: conhecimento dos mecanismos linguísticos necessários para a construção da argumentação (coesão entre frases e parágrafos, conectivos, referenciação).
+- Competência V: elaboração de proposta de intervenção para o problema abordado, respeitando os direitos humanos.
 
 Um exemplo para a Competência V (Proposta de Intervenção):
 - Nota 200: Apresenta proposta completa com Agente + Ação + Meio/Modo + Finalidade + Detalhamento, articulada à discussão.
 - Nota 160: Apresenta 4 dos 5 elementos.
 - Nota 120: Apresenta 3 dos 5 elementos ou a proposta não é articulada à discussão.
-- Abaixo disso: Apresenta menos de 3 elementos ou desrespeita os direitos humanos.
+- Abaixo disso: Apresenta menos de 3 elementos ou desrespeita os direitos humanos.`;
 
-Texto para avaliação:
-"""
-${texto}
-"""
+const PREFIXO_SISTEMA_ENEM = `${RUBRICA_ENEM}
 
 Sua resposta DEVE ser um único objeto JSON, sem nenhum texto introdutório, final ou comentários, seguindo estritamente esta estrutura:
 {
@@ -48,84 +302,893 @@ Sua resposta DEVE ser um único objeto JSON, sem nenhum texto introdutório, fin
     "c5": { "nome": "Competência V...", "nota": <0-200>, "comentario": "...", "pontosFortes": ["..."], "pontosAMelhorar": ["..."] }
   }
 }
-INSTRUÇÃO CRÍTICA: A "notaFinal1000" DEVE ser a soma exata das notas das 5 competências.
-`;
+INSTRUÇÃO CRÍTICA: A "notaFinal1000" DEVE ser a soma exata das notas das 5 competências.`;
 
-const analisarSinglePrompt = async (texto: string, perfil: string): Promise<AnaliseENEM | null> => {
+const PREFIXO_SISTEMA_NOTAS = `${RUBRICA_ENEM}
+
+Nesta etapa atribua apenas as notas: NÃO escreva comentários nem justificativas (o feedback é elaborado depois, à parte).
+Sua resposta DEVE ser um único objeto JSON, sem nenhum texto introdutório, final ou comentários, seguindo estritamente esta estrutura:
+{
+  "tesePrincipal": "...",
+  "competencias": {
+    "c1": { "nota": <0-200> },
+    "c2": { "nota": <0-200> },
+    "c3": { "nota": <0-200> },
+    "c4": { "nota": <0-200> },
+    "c5": { "nota": <0-200> }
+  }
+}`;
+
+// Modo fundido: os demais corretores avaliam o texto do OCR ainda sem correção
+const AVISO_TEXTO_OCR = 'O texto foi transcrito por OCR de uma redação manuscrita e ainda não foi revisado: desconsidere erros típicos de reconhecimento (letras trocadas, palavras partidas, símbolos soltos) e não os penalize na Competência I.';
+
+const mensagensEnem = (texto: string, perfilCorretor: string, origemOCR = false, sobDemanda = false): MensagemLLM[] => [
+    { role: 'system', content: sobDemanda ? PREFIXO_SISTEMA_NOTAS : PREFIXO_SISTEMA_ENEM },
+    { role: 'system', content: `Adote o seguinte perfil de corretor: ${perfilCorretor}${origemOCR ? `\n${AVISO_TEXTO_OCR}` : ''}` },
+    { role: 'user', content: `Texto para avaliação:\n"""\n${texto}\n"""` },
+];
+
+// Tamanho aproximado (em tokens) de uma chamada de corretor, para estimativas de economia
+const estimarTokensPrompt = (mensagens: MensagemLLM[]): number =>
+    Math.ceil(mensagens.reduce((s, m) => s + m.content.length, 0) / 4);
+
+// Chamada única: mesmo prefixo estático, seguido da lista de perfis e da redação
+const mensagensMultiplas = (texto: string, perfis: string[], sobDemanda = false): MensagemLLM[] => [
+    { role: 'system', content: sobDemanda ? PREFIXO_SISTEMA_NOTAS : PREFIXO_SISTEMA_ENEM },
+    {
+        role: 'system',
+        content: `Nesta tarefa você fará ${perfis.length} avaliações independentes da mesma redação, uma para cada perfil de corretor abaixo, sem que uma influencie a outra:\n` +
+            perfis.map((perfil, i) => `${i + 1}. ${perfil}`).join('\n') +
+            `\nResponda com um único objeto JSON no formato {"avaliacoes": [ ... ]}, com uma avaliação por perfil, na mesma ordem, cada uma seguindo exatamente a estrutura acima.`,
+    },
+    { role: 'user', content: `Texto para avaliação:\n"""\n${texto}\n"""` },
+];
+
+/** Recebe cada competência assim que um corretor a conclui (antes do consenso). */
+export type AoCompetencia = (chave: ChaveCompetencia, detalhe: DetalheCompetencia, perfil: number) => void;
+
+/** Com callback, a chamada é feita em streaming e as competências são extraídas à medida que chegam. */
+const extrairCompetencias = (aoCompetencia: AoCompetencia | undefined, perfil: number) => {
+    if (!aoCompetencia) return undefined;
+    const extrator = new ExtratorIncremental('competencias', (chave, valor) => {
+        if (!(CHAVES_COMPETENCIAS as readonly string[]).includes(chave)) return;
+        const { detalhe } = validarCompetencia(completarCompetencia(chave as ChaveCompetencia, valor));
+        if (detalhe) aoCompetencia(chave as ChaveCompetencia, detalhe, perfil);
+    });
+    return (trecho: string) => extrator.alimentar(trecho);
+};
+
+const analisarSinglePrompt = async (
+    texto: string,
+    perfil: number,
+    signal?: AbortSignal,
+    timeoutMs?: number,
+    aoCompetencia?: AoCompetencia,
+    camada: CamadaModelo = CAMADA_ENEM,
+    origemOCR = false,
+    sobDemanda = false
+): Promise<AnaliseENEM | null> => {
     try {
-        const prompt = promptTemplateEnem(texto, perfil);
-        const respostaLLM = await chamarLLM(prompt);
-        const jsonMatch = respostaLLM.match(/\{[\s\S]*\}/);
-        if (!jsonMatch) return null;
-        const parsed = JSON.parse(jsonMatch[0]) as AnaliseENEM;
-        if (!parsed.competencias?.c1) return null;
-
-        // Auto-correção da nota
-        const c = parsed.competencias;
-        parsed.notaFinal1000 = (c.c1.nota || 0) + (c.c2.nota || 0) + (c.c3.nota || 0) + (c.c4.nota || 0) + (c.c5.nota || 0);
-        return parsed;
+        const respostaLLM = await chamarLLM(mensagensEnem(texto, PERFIS_CORRETORES[perfil], origemOCR, sobDemanda), sobDemanda ? 512 : 2048, 0.3, {
+            signal,
+            timeoutMs,
+            camada,
+            aoFragmento: extrairCompetencias(aoCompetencia, perfil),
+            // Rótulo próprio: as notas são outro prompt (cache e métricas separados)
+            rotulo: sobDemanda ? 'enem-notas' : 'enem',
+            formatoResposta: sobDemanda
+                ? { nome: 'NotasENEM', schema: schemaNotasENEM }
+                : { nome: 'AnaliseENEM', schema: schemaAnaliseENEM },
+            cache: { versaoPrompt: sobDemanda ? VERSAO_PROMPT_NOTAS : VERSAO_PROMPT_ENEM, aceitar: texto => respostaEnemValida(texto, sobDemanda) },
+        });
+        return interpretarRespostaEnem(respostaLLM, sobDemanda);
     } catch (e) {
-        console.error(`Erro em uma das análises paralelas (perfil: ${perfil}):`, e);
+        // Cancelamento não é uma "análise inválida": propaga para abortar o ensemble inteiro
+        if (foiCancelado(e)) throw e;
+        console.error(`Erro em uma das análises paralelas (perfil: ${PERFIS_CORRETORES[perfil]}):`, e);
         return null;
     }
 };
 
-export async function analisarEnem(texto: string): Promise<AnaliseENEM> {
+export interface OpcoesAnaliseEnem extends OpcoesExecucao {
+    // Sobrepõe ENEM_ESTRATEGIA (usado pelo benchmark para comparar as estratégias)
+    estrategia?: EstrategiaEnem;
+    // Resultados parciais por competência (streaming). Quem se junta a uma análise
+    // já em andamento (mesmo texto) recebe só o resultado final.
+    aoCompetencia?: AoCompetencia;
+    // Modo fundido: análise do corretor que também corrige o OCR (corrigirEAvaliar),
+    // já em andamento. Ocupa a vaga do primeiro perfil; os demais avaliam o texto do OCR.
+    corretorFundido?: Promise<AnaliseENEM | null>;
+    // Sobrepõe ENEM_FEEDBACK_SOB_DEMANDA: só notas e tese; o feedback vem de gerarFeedback
+    feedbackSobDemanda?: boolean;
+}
+
+export async function analisarEnem(texto: string, opcoes: OpcoesAnaliseEnem = {}): Promise<AnaliseENEM> {
     if (!texto || texto.trim().length < 50) {
         throw new Error("Texto muito curto para análise.");
     }
+    const { signal, prazo } = opcoes;
+    if (prazo && !prazo.temOrcamento(AVALIACAO_MIN_MS)) {
+        incrementar('prazo.etapa_pulada.avaliacao');
+        throw new Error(`Prazo insuficiente para a análise ENEM (restam ${prazo.restanteMs()} ms).`);
+    }
+    const timeoutMs = prazo?.timeoutEtapa();
+
+    // Redações com o mesmo texto (normalizado) compartilham a mesma análise em andamento
+    const { corretorFundido } = opcoes;
+    const escolhida = opcoes.estrategia || ESTRATEGIA_ENEM;
+    // O corretor fundido ocupa uma vaga do ensemble: não se aplica à chamada única
+    const estrategia = corretorFundido && escolhida === 'chamada-unica' ? 'adaptativa' : escolhida;
+    const sobDemanda = opcoes.feedbackSobDemanda ?? FEEDBACK_SOB_DEMANDA;
+    const versao = sobDemanda ? VERSAO_PROMPT_NOTAS : VERSAO_PROMPT_ENEM;
+    const chave = `enem:${versao}:${estrategia}${corretorFundido ? ':fundido' : ''}:${hashConteudo(normalizarTexto(texto))}`;
+    return executarUmaVez(chave, sinal => estrategia === 'chamada-unica'
+        ? executarAnaliseChamadaUnica(texto, sinal, timeoutMs, opcoes.aoCompetencia, sobDemanda)
+        : executarAnaliseEnem(texto, estrategia, sinal, timeoutMs, opcoes.aoCompetencia, corretorFundido, sobDemanda), signal);
+}
+
+const PERFIS_CORRETORES = [
+    "Você é um corretor muito rigoroso com a norma culta (Competência I) e coesão (Competência IV).",
+    "Você é um corretor focado na qualidade da argumentação (Competência III) e no uso do repertório (Competência II).",
+    "Você é um corretor criativo, focado na originalidade da tese e na qualidade da proposta de intervenção (Competência V)."
+];
+
+/** Maior diferença de nota, em qualquer competência, entre as análises. */
+export function divergenciaMaxima(analises: AnaliseENEM[]): number {
+    let maior = 0;
+    for (const chave of CHAVES_COMPETENCIAS) {
+        const notas = analises.map(a => a.competencias[chave].nota);
+        maior = Math.max(maior, Math.max(...notas) - Math.min(...notas));
+    }
+    return maior;
+}
+
+/** Consenso: média de cada competência arredondada para a escala oficial; comentário geral mais detalhado. */
+function consolidarAnalises(analisesValidas: AnaliseENEM[]): AnaliseENEM {
+    const analiseFinal: AnaliseENEM = JSON.parse(JSON.stringify(analisesValidas[0])); // Começa com uma cópia da primeira análise válida
 
-    console.log("🤖 Iniciando análise de alta precisão com 3 corretores de IA em paralelo...");
+    const numAnalises = analisesValidas.length;
+    for (const chave of CHAVES_COMPETENCIAS) {
+        analiseFinal.competencias[chave].nota = Math.round(analisesValidas.reduce((s, a) => s + a.competencias[chave].nota, 0) / numAnalises / 40) * 40;
+    }
+    analiseFinal.notaFinal1000 = Object.values(analiseFinal.competencias).reduce((s, c) => s + c.nota, 0);
+
+    // Combina os comentários (pega o mais detalhado)
+    analiseFinal.comentarioGeral = [...analisesValidas].sort((a, b) => b.comentarioGeral.length - a.comentarioGeral.length)[0].comentarioGeral;
+    return analiseFinal;
+}
 
-    const perfis = [
-        "Você é um corretor muito rigoroso com a norma culta (Competência I) e coesão (Competência IV).",
-        "Você é um corretor focado na qualidade da argumentação (Competência III) e no uso do repertório (Competência II).",
-        "Você é um corretor criativo, focado na originalidade da tese e na qualidade da proposta de intervenção (Competência V)."
-    ];
+// Corretores que responderam depois do quórum: comparados ao consenso já devolvido
+export interface AmostraCalibracao {
+    perfil: number;
+    latenciaMs: number;
+    notaFinal1000: number;
+    notaConsenso: number;
+    divergencia: number;
+    em: string;
+}
+const amostrasCalibracao: AmostraCalibracao[] = [];
+
+export function obterCalibracaoCorretores(): AmostraCalibracao[] {
+    return [...amostrasCalibracao];
+}
+
+function registrarAtrasado(analise: AnaliseENEM, perfil: number, latenciaMs: number, consenso: AnaliseENEM | null): void {
+    incrementar('enem.quorum.atrasado');
+    if (!consenso) return;
+    amostrasCalibracao.push({
+        perfil,
+        latenciaMs,
+        notaFinal1000: analise.notaFinal1000,
+        notaConsenso: consenso.notaFinal1000,
+        divergencia: divergenciaMaxima([consenso, analise]),
+        em: new Date().toISOString(),
+    });
+    if (amostrasCalibracao.length > MAX_AMOSTRAS_CALIBRACAO) amostrasCalibracao.shift();
+}
+
+/**
+ * Um corretor, com a latência individual registrada (base para comparar com o
+ * p99 do ensemble). Análise inválida do modelo pequeno é refeita no grande.
+ */
+async function corrigirComPerfil(
+    texto: string,
+    perfil: number,
+    signal?: AbortSignal,
+    timeoutMs?: number,
+    aoCompetencia?: AoCompetencia,
+    camada: CamadaModelo = CAMADA_ENEM,
+    origemOCR = false,
+    sobDemanda = false
+): Promise<AnaliseENEM | null> {
+    const inicio = Date.now();
+    try {
+        const analise = await analisarSinglePrompt(texto, perfil, signal, timeoutMs, aoCompetencia, camada, origemOCR, sobDemanda);
+        if (analise || camada === 'grande' || !camadasDistintas()) return analise;
+        registrarEscalada('enem', 'validacao');
+        return await analisarSinglePrompt(texto, perfil, signal, timeoutMs, aoCompetencia, 'grande', origemOCR, sobDemanda);
+    } finally {
+        registrarDuracao('enem.corretor.latencia', Date.now() - inicio);
+    }
+}
 
-    const resultados = await Promise.all([
-        analisarSinglePrompt(texto, perfis[0]),
-        analisarSinglePrompt(texto, perfis[1]),
-        analisarSinglePrompt(texto, perfis[2])
-    ]);
+async function executarAnaliseEnem(
+    texto: string,
+    estrategia: EstrategiaEnem,
+    signal?: AbortSignal,
+    timeoutMs?: number,
+    aoCompetencia?: AoCompetencia,
+    corretorFundido?: Promise<AnaliseENEM | null>,
+    sobDemanda = false
+): Promise<AnaliseENEM> {
+    const inicio = Date.now();
+    const quorum = estrategia === 'quorum';
+    const iniciais = quorum
+        ? PERFIS_CORRETORES.length
+        : Math.min(Math.max(1, CORRETORES_INICIAIS), PERFIS_CORRETORES.length);
+    const minimo = quorum ? Math.min(Math.max(1, QUORUM_MINIMO), iniciais) : iniciais;
+    console.log(quorum
+        ? `🤖 Iniciando análise com ${iniciais} corretores de IA em paralelo (quórum de ${minimo})...`
+        : `🤖 Iniciando análise com ${iniciais} corretores de IA em paralelo (até ${PERFIS_CORRETORES.length} se divergirem)...`);
 
-    const analisesValidas = resultados.filter((r): r is AnaliseENEM => r !== null);
+    // Referência preenchida ao final, para comparar os corretores que chegarem atrasados
+    let consenso: AnaliseENEM | null = null;
+    const rodada = await aguardarQuorum(
+        Array.from({ length: iniciais }, (_, i) => i === 0 && corretorFundido
+            ? corretorFundido
+            : corrigirComPerfil(texto, i, signal, timeoutMs, aoCompetencia, CAMADA_ENEM, Boolean(corretorFundido), sobDemanda)),
+        {
+            minimo,
+            prazoMs: timeoutMs !== undefined ? Math.min(QUORUM_PRAZO_MS, timeoutMs) : QUORUM_PRAZO_MS,
+            signal,
+            aoAtrasar: (analise, perfil, ms) => registrarAtrasado(analise, perfil, ms, consenso),
+        }
+    );
+    lancarSeCancelado(signal);
+    if (rodada.porPrazo) incrementar('enem.quorum.por_prazo');
+    if (rodada.pendentes > 0) incrementar('enem.quorum.pendentes', rodada.pendentes);
+    let chamados = iniciais;
+    let analisesValidas = rodada.resultados;
+
+    // Desempate (estratégia adaptativa): chama o próximo corretor enquanto houver divergência
+    // acima do limiar (ou menos de duas análises válidas) e o prazo do quórum não tiver estourado
+    while (!quorum && !rodada.porPrazo && chamados < PERFIS_CORRETORES.length &&
+        (analisesValidas.length < 2 || divergenciaMaxima(analisesValidas) > LIMIAR_DIVERGENCIA)) {
+        incrementar('enem.ensemble.desempate');
+        // O desempate usa sempre o modelo grande
+        if (CAMADA_ENEM === 'pequeno' && camadasDistintas()) registrarEscalada('enem', 'divergencia');
+        const extra = await corrigirComPerfil(texto, chamados, signal, timeoutMs, aoCompetencia, 'grande', Boolean(corretorFundido), sobDemanda);
+        lancarSeCancelado(signal);
+        chamados++;
+        if (extra) analisesValidas = [...analisesValidas, extra];
+    }
 
     if (analisesValidas.length === 0) {
         throw new Error("Nenhum dos corretores de IA conseguiu retornar uma análise válida.");
     }
-    console.log(`✅ ${analisesValidas.length} de 3 corretores de IA retornaram análises válidas.`);
 
-    // LÓGICA DE CONSENSO: Calcular a média das notas
-    const analiseFinal: AnaliseENEM = JSON.parse(JSON.stringify(analisesValidas[0])); // Começa com uma cópia da primeira análise válida
+    // Estatísticas de concordância e economia frente ao ensemble fixo com todos os corretores
+    const divergencia = divergenciaMaxima(analisesValidas);
+    const economizados = PERFIS_CORRETORES.length - chamados;
+    // Estimativa por chamada: prompt + teto de saída
+    const tokensEconomizados = economizados * (estimarTokensPrompt(mensagensEnem(texto, PERFIS_CORRETORES[0], false, sobDemanda)) + (sobDemanda ? 512 : 2048));
+    incrementar('enem.ensemble.analises');
+    incrementar('enem.ensemble.corretores_chamados', chamados);
+    incrementar('enem.ensemble.chamadas_economizadas', economizados);
+    incrementar('enem.ensemble.tokens_economizados_estimados', tokensEconomizados);
+    incrementar(divergencia <= LIMIAR_DIVERGENCIA ? 'enem.ensemble.concordancia' : 'enem.ensemble.discordancia_final');
+    console.log(`✅ ${analisesValidas.length} de ${chamados} corretores de IA retornaram análises válidas (divergência máx. ${divergencia} pts; ${economizados} chamada(s) e ~${tokensEconomizados} tokens economizados${rodada.pendentes ? `; ${rodada.pendentes} ainda em andamento` : ''}).`);
 
-    // Calcula a média para cada competência e para a nota final
-    const numAnalises = analisesValidas.length;
-    analiseFinal.competencias.c1.nota = Math.round(analisesValidas.reduce((s, a) => s + a.competencias.c1.nota, 0) / numAnalises / 40) * 40;
-    analiseFinal.competencias.c2.nota = Math.round(analisesValidas.reduce((s, a) => s + a.competencias.c2.nota, 0) / numAnalises / 40) * 40;
-    analiseFinal.competencias.c3.nota = Math.round(analisesValidas.reduce((s, a) => s + a.competencias.c3.nota, 0) / numAnalises / 40) * 40;
-    analiseFinal.competencias.c4.nota = Math.round(analisesValidas.reduce((s, a) => s + a.competencias.c4.nota, 0) / numAnalises / 40) * 40;
-    analiseFinal.competencias.c5.nota = Math.round(analisesValidas.reduce((s, a) => s + a.competencias.c5.nota, 0) / numAnalises / 40) * 40;
+    const analiseFinal = consolidarAnalises(analisesValidas);
+    if (sobDemanda) analiseFinal.feedbackSobDemanda = true;
+    consenso = analiseFinal;
+    registrarDuracao('enem.avaliacao.total', Date.now() - inicio);
+    console.log(`📊 Nota final de consenso calculada: ${analiseFinal.notaFinal1000}/1000`);
+    return analiseFinal;
+}
 
-    analiseFinal.notaFinal1000 = Object.values(analiseFinal.competencias).reduce((s, c) => s + c.nota, 0);
+/**
+ * Uma única requisição com todos os perfis: envia a redação e a rubrica uma
+ * vez só (em vez de uma por corretor), ao custo de uma saída mais longa e de
+ * avaliações geradas no mesmo contexto.
+ */
+async function executarAnaliseChamadaUnica(texto: string, signal?: AbortSignal, timeoutMs?: number, aoCompetencia?: AoCompetencia, sobDemanda = false): Promise<AnaliseENEM> {
+    const inicio = Date.now();
+    console.log(`🤖 Iniciando análise com ${PERFIS_CORRETORES.length} perfis de corretor em uma única chamada de IA...`);
+    const avaliar = async (camada: CamadaModelo) => {
+        const resposta = await chamarLLM(mensagensMultiplas(texto, PERFIS_CORRETORES, sobDemanda), (sobDemanda ? 512 : 2048) * PERFIS_CORRETORES.length, 0.3, {
+            signal,
+            timeoutMs,
+            camada,
+            aoFragmento: extrairCompetencias(aoCompetencia, 0),
+            rotulo: sobDemanda ? 'enem-notas' : 'enem',
+            formatoResposta: { nome: 'AvaliacoesENEM', schema: schemaAvaliacoesMultiplas(sobDemanda) },
+            cache: {
+                versaoPrompt: sobDemanda ? VERSAO_PROMPT_NOTAS : VERSAO_PROMPT_ENEM,
+                // Só a resposta com todas as avaliações válidas: com alguma inválida, uma nova chamada pode recuperá-la
+                aceitar: texto => {
+                    const avaliacoes = parseJsonTolerante(texto)?.valor?.avaliacoes;
+                    return Array.isArray(avaliacoes) && avaliacoes.length >= PERFIS_CORRETORES.length &&
+                        avaliacoes.every((a: any) => analiseValida(a, sobDemanda));
+                },
+            },
+        });
+        lancarSeCancelado(signal);
+        return interpretarRespostaMultipla(resposta, sobDemanda).slice(0, PERFIS_CORRETORES.length);
+    };
+    let analisesValidas = await avaliar(CAMADA_ENEM);
+    // Modelo pequeno: nenhuma avaliação válida ou avaliações divergentes sobem para o grande
+    if (CAMADA_ENEM === 'pequeno' && camadasDistintas() &&
+        (analisesValidas.length === 0 || divergenciaMaxima(analisesValidas) > LIMIAR_DIVERGENCIA)) {
+        registrarEscalada('enem', analisesValidas.length === 0 ? 'validacao' : 'divergencia');
+        analisesValidas = await avaliar('grande');
+    }
+    if (analisesValidas.length === 0) {
+        throw new Error("A chamada única não retornou nenhuma análise válida.");
+    }
 
-    // Combina os comentários (pega o mais detalhado)
-    analiseFinal.comentarioGeral = analisesValidas.sort((a, b) => b.comentarioGeral.length - a.comentarioGeral.length)[0].comentarioGeral;
+    const divergencia = divergenciaMaxima(analisesValidas);
+    incrementar('enem.ensemble.analises');
+    incrementar('enem.ensemble.corretores_chamados', 1);
+    incrementar(divergencia <= LIMIAR_DIVERGENCIA ? 'enem.ensemble.concordancia' : 'enem.ensemble.discordancia_final');
+    console.log(`✅ ${analisesValidas.length} de ${PERFIS_CORRETORES.length} avaliações válidas na chamada única (divergência máx. ${divergencia} pts).`);
 
+    const analiseFinal = consolidarAnalises(analisesValidas);
+    if (sobDemanda) analiseFinal.feedbackSobDemanda = true;
+    registrarDuracao('enem.avaliacao.total', Date.now() - inicio);
     console.log(`📊 Nota final de consenso calculada: ${analiseFinal.notaFinal1000}/1000`);
     return analiseFinal;
 }
 
-export async function formatarTextoComLLM(texto: string): Promise<{ textoFormatado: string }> {
+// --- MODO FUNDIDO: CORREÇÃO DO OCR + AVALIAÇÃO EM UMA CHAMADA ---
+export interface EdicaoOCR {
+    original: string;
+    corrigido: string;
+}
+
+export interface ResultadoFundido {
+    textoCorrigido: string;
+    // null se a avaliação da resposta não for válida (a correção pode ter sido aproveitada)
+    analise: AnaliseENEM | null;
+    edicoesAplicadas: number;
+    edicoesIgnoradas: number;
+}
+
+const schemaCorrecaoEAvaliacao = {
+    type: 'object',
+    additionalProperties: false,
+    required: ['edicoes', 'analise'],
+    properties: {
+        edicoes: {
+            type: 'array',
+            items: {
+                type: 'object',
+                additionalProperties: false,
+                required: ['original', 'corrigido'],
+                properties: { original: { type: 'string' }, corrigido: { type: 'string' } },
+            },
+        },
+        analise: schemaAnaliseENEM,
+    },
+};
+
+const mensagensCorrecaoEAvaliacao = (textoOCR: string): MensagemLLM[] => [
+    { role: 'system', content: PREFIXO_SISTEMA_ENEM },
+    {
+        role: 'system',
+        content: `Adote o seguinte perfil de corretor: ${PERFIS_CORRETORES[0]}\n` +
+            'O texto foi transcrito por OCR de uma redação manuscrita. Nesta tarefa você faz duas coisas em uma única resposta:\n' +
+            '1. Em "edicoes", liste as correções de erros de OCR e de ortografia, na ordem em que aparecem: "original" é o trecho exato como está no texto (curto, só o necessário para ser único) e "corrigido" é a versão corrigida. NÃO altere o conteúdo, os argumentos nem o estilo do autor.\n' +
+            '2. Em "analise", avalie a redação JÁ CORRIGIDA, na estrutura JSON acima.\n' +
+            'Responda com um único objeto JSON {"edicoes": [...], "analise": {...}}.',
+    },
+    { role: 'user', content: `Texto extraído por OCR:\n"""\n${textoOCR}\n"""` },
+];
+
+/**
+ * Aplica as edições em ordem: cada uma é procurada a partir do fim da anterior
+ * (e, se não achar, no texto todo). Edições que não casam são ignoradas.
+ */
+export function aplicarEdicoes(texto: string, edicoes: EdicaoOCR[]): { texto: string; aplicadas: number; ignoradas: number } {
+    let resultado = texto;
+    let cursor = 0;
+    let aplicadas = 0;
+    for (const { original, corrigido } of edicoes) {
+        if (!original || original === corrigido) continue;
+        let posicao = resultado.indexOf(original, cursor);
+        if (posicao < 0) posicao = resultado.indexOf(original);
+        if (posicao < 0) continue;
+        resultado = resultado.slice(0, posicao) + corrigido + resultado.slice(posicao + original.length);
+        cursor = posicao + corrigido.length;
+        aplicadas++;
+    }
+    const validas = edicoes.filter(e => e.original && e.original !== e.corrigido).length;
+    return { texto: resultado, aplicadas, ignoradas: validas - aplicadas };
+}
+
+/**
+ * Modo fundido do upload: uma única chamada devolve a correção do OCR (como
+ * edições, bem mais curtas que o texto reescrito) e a avaliação de um
+ * corretor. Assim a primeira nota sai junto com a correção, e os demais
+ * corretores (`corretorFundido` em analisarEnem) rodam em paralelo.
+ * Nunca falha por causa do LLM: sem resposta utilizável, devolve o texto do OCR.
+ */
+export async function corrigirEAvaliar(textoOCR: string, opcoes: OpcoesAnaliseEnem = {}): Promise<ResultadoFundido> {
+    const { signal, prazo, aoCompetencia } = opcoes;
+    const semResultado: ResultadoFundido = { textoCorrigido: textoOCR, analise: null, edicoesAplicadas: 0, edicoesIgnoradas: 0 };
+    const chave = `fundido:${VERSAO_PROMPT_FUNDIDO}:${VERSAO_PROMPT_ENEM}:${hashConteudo(normalizarTexto(textoOCR))}`;
+    return executarUmaVez(chave, async sinal => {
+        const inicio = Date.now();
+        try {
+            const resposta = await chamarLLM(mensagensCorrecaoEAvaliacao(textoOCR), 4096, 0.2, {
+                signal: sinal,
+                timeoutMs: prazo?.timeoutEtapa(),
+                aoFragmento: extrairCompetencias(aoCompetencia, 0),
+                rotulo: 'fundido',
+                formatoResposta: { nome: 'CorrecaoEAvaliacao', schema: schemaCorrecaoEAvaliacao },
+                cache: {
+                    versaoPrompt: `${VERSAO_PROMPT_FUNDIDO}:${VERSAO_PROMPT_ENEM}`,
+                    aceitar: texto => {
+                        const json = parseJsonTolerante(texto)?.valor;
+                        return Array.isArray(json?.edicoes) && analiseValida(json?.analise, false);
+                    },
+                },
+            });
+            const json = parseJsonTolerante(resposta)?.valor;
+            if (!json) {
+                incrementar('enem.fundido.falha');
+                console.warn(`⚠️ Resposta do modo fundido sem JSON interpretável: ${resposta.slice(0, 200)}`);
+                return semResultado;
+            }
+            const edicoes: EdicaoOCR[] = Array.isArray(json.edicoes)
+                ? json.edicoes.map((e: any) => ({ original: comoTexto(e?.original), corrigido: comoTexto(e?.corrigido) }))
+                : [];
+            const aplicado = aplicarEdicoes(textoOCR, edicoes);
+            // Edições que apagaram boa parte do texto não são confiáveis: fica o OCR
+            const textoCorrigido = textoIncompleto(aplicado.texto, textoOCR) ? textoOCR : aplicado.texto;
+            const analise = validarComMetricas(json.analise, resposta);
+            incrementar('enem.fundido.edicoes.aplicadas', aplicado.aplicadas);
+            incrementar('enem.fundido.edicoes.ignoradas', aplicado.ignoradas);
+            registrarDuracao('enem.fundido.latencia', Date.now() - inicio);
+            console.log(`✅ Modo fundido: ${aplicado.aplicadas} correções aplicadas (${aplicado.ignoradas} ignoradas) e ${analise ? `nota ${analise.notaFinal1000}/1000` : 'avaliação inválida'} em ${Date.now() - inicio} ms.`);
+            return { textoCorrigido, analise, edicoesAplicadas: aplicado.aplicadas, edicoesIgnoradas: aplicado.ignoradas };
+        } catch (e: any) {
+            if (foiCancelado(e)) throw e;
+            incrementar('enem.fundido.falha');
+            console.error('❌ Erro no modo fundido (correção + avaliação):', e.message);
+            return semResultado;
+        }
+    }, signal);
+}
+
+// --- FEEDBACK SOB DEMANDA ---
+// Seção da análise cujo texto é gerado quando o aluno a abre: uma competência ou
+// o comentário geral (com o título sugerido)
+export type SecaoFeedback = ChaveCompetencia | 'geral';
+export const SECOES_FEEDBACK: readonly SecaoFeedback[] = [...CHAVES_COMPETENCIAS, 'geral'];
+
+const schemaFeedbackCompetencia = {
+    type: 'object',
+    additionalProperties: false,
+    required: ['comentario', 'pontosFortes', 'pontosAMelhorar'],
+    properties: {
+        comentario: { type: 'string' },
+        pontosFortes: { type: 'array', items: { type: 'string' } },
+        pontosAMelhorar: { type: 'array', items: { type: 'string' } },
+    },
+};
+
+const schemaFeedbackGeral = {
+    type: 'object',
+    additionalProperties: false,
+    required: ['comentarioGeral', 'tituloSugerido'],
+    properties: { comentarioGeral: { type: 'string' }, tituloSugerido: { type: 'string' } },
+};
+
+const PREFIXO_SISTEMA_FEEDBACK = `${RUBRICA_ENEM}
+
+Nesta tarefa as notas já foram atribuídas e NÃO devem ser alteradas: escreva apenas o feedback pedido, dirigido ao aluno, coerente com a nota e apoiado em trechos do texto.
+Sua resposta DEVE ser um único objeto JSON, sem nenhum texto introdutório, final ou comentários, na estrutura indicada no pedido.`;
+
+// A redação vem antes do pedido: as seções de uma mesma redação compartilham o prefixo
+const mensagensFeedback = (texto: string, analise: AnaliseENEM, secao: SecaoFeedback): MensagemLLM[] => [
+    { role: 'system', content: PREFIXO_SISTEMA_FEEDBACK },
+    {
+        role: 'user',
+        content: `Texto avaliado:\n"""\n${texto}\n"""\n` +
+            `Tese principal identificada: ${analise.tesePrincipal || '(não identificada)'}\n` +
+            `Notas atribuídas: ${CHAVES_COMPETENCIAS.map(c => `${c.toUpperCase()} = ${analise.competencias[c].nota}`).join(', ')} (total ${analise.notaFinal1000}).`,
+    },
+    {
+        role: 'user',
+        content: secao === 'geral'
+            ? 'Escreva um comentário geral sobre a redação e sugira um título: {"comentarioGeral": "...", "tituloSugerido": "..."}'
+            : `Escreva o feedback da ${NOMES_COMPETENCIAS[secao]} (nota ${analise.competencias[secao].nota}): {"comentario": "...", "pontosFortes": ["..."], "pontosAMelhorar": ["..."]}`,
+    },
+];
+
+/** A resposta do LLM traz o texto da seção pedida. */
+const feedbackValido = (json: any, secao: SecaoFeedback): boolean =>
+    Boolean(comoTexto(secao === 'geral' ? json?.comentarioGeral : json?.comentario));
+
+/** Seção ainda sem texto (a gerar com gerarFeedback). */
+export function feedbackPendente(analise: AnaliseENEM, secao: SecaoFeedback): boolean {
+    return secao === 'geral' ? !analise.comentarioGeral : !analise.competencias[secao].comentario;
+}
+
+/**
+ * Gera o feedback de uma seção de uma análise feita só com notas, coerente com
+ * as notas já atribuídas, e o grava na própria `analise` (que é a guardada no
+ * cache de análises). Seções já preenchidas não disparam chamada; pedidos
+ * simultâneos da mesma seção compartilham a chamada, e a resposta fica no cache do LLM.
+ */
+export async function gerarFeedback(texto: string, analise: AnaliseENEM, secao: SecaoFeedback, opcoes: OpcoesExecucao = {}): Promise<AnaliseENEM> {
+    if (!feedbackPendente(analise, secao)) return analise;
+    const { signal, prazo } = opcoes;
+    const notas = CHAVES_COMPETENCIAS.map(c => analise.competencias[c].nota).join(',');
+    const chave = `feedback:${VERSAO_PROMPT_FEEDBACK}:${secao}:${hashConteudo(normalizarTexto(texto), notas)}`;
+    const valor = await executarUmaVez(chave, async sinal => {
+        const inicio = Date.now();
+        const resposta = await chamarLLM(mensagensFeedback(texto, analise, secao), 1024, 0.3, {
+            signal: sinal,
+            timeoutMs: prazo?.timeoutEtapa(),
+            rotulo: 'enem-feedback',
+            formatoResposta: secao === 'geral'
+                ? { nome: 'FeedbackGeralENEM', schema: schemaFeedbackGeral }
+                : { nome: 'FeedbackCompetenciaENEM', schema: schemaFeedbackCompetencia },
+            cache: { versaoPrompt: VERSAO_PROMPT_FEEDBACK, aceitar: texto => feedbackValido(parseJsonTolerante(texto)?.valor, secao) },
+        });
+        const json = parseJsonTolerante(resposta)?.valor;
+        if (!feedbackValido(json, secao)) {
+            incrementar('enem.feedback.falha');
+            console.warn(`⚠️ Feedback sob demanda (${secao}) sem conteúdo válido: ${resposta.slice(0, 200)}`);
+            throw new Error('A IA não retornou um feedback válido.');
+        }
+        incrementar('enem.feedback.gerado');
+        registrarDuracao('enem.feedback.latencia', Date.now() - inicio);
+        return json;
+    }, signal);
+
+    if (secao === 'geral') {
+        analise.comentarioGeral = comoTexto(valor.comentarioGeral);
+        analise.tituloSugerido = analise.tituloSugerido || comoTexto(valor.tituloSugerido);
+    } else {
+        Object.assign(analise.competencias[secao], {
+            comentario: comoTexto(valor.comentario),
+            pontosFortes: comoLista(valor.pontosFortes),
+            pontosAMelhorar: comoLista(valor.pontosAMelhorar),
+        });
+    }
+    return analise;
+}
+
+// --- AVALIAÇÃO EM LOTE (backfill e correção em massa) ---
+// Várias redações curtas em uma única requisição por corretor: rubrica e perfil
+// vão uma vez por pacote, e não uma vez por redação. Cada redação tem seu bloco
+// na resposta, validado à parte; só as redações com bloco inválido são refeitas.
+export interface RedacaoLote {
+    id: string;
+    texto: string;
+}
+
+export interface ResultadoLote {
+    id: string;
+    analise: AnaliseENEM | null;
+    // Avaliações refeitas individualmente (bloco inválido ou ausente no pacote)
+    reenvios: number;
+    erro?: string;
+}
+
+export interface OpcoesLote extends OpcoesExecucao {
+    // Sobrepõem ENEM_LOTE_TAMANHO e ENEM_LOTE_CONCORRENCIA (tamanho 1 = uma redação por chamada)
+    tamanhoPacote?: number;
+    concorrencia?: number;
+    feedbackSobDemanda?: boolean;
+    // Progresso: chamado a cada redação concluída
+    aoConcluir?: (resultado: ResultadoLote) => void;
+}
+
+/** Agrupa as redações em pacotes de até `tamanho` redações e `maxCaracteres` de texto (redação maior vai sozinha). */
+export function montarPacotes<T extends RedacaoLote>(redacoes: T[], tamanho: number, maxCaracteres: number): T[][] {
+    const pacotes: T[][] = [];
+    let atual: T[] = [];
+    let caracteres = 0;
+    for (const redacao of redacoes) {
+        if (atual.length && (atual.length >= tamanho || caracteres + redacao.texto.length > maxCaracteres)) {
+            pacotes.push(atual);
+            atual = [];
+            caracteres = 0;
+        }
+        atual.push(redacao);
+        caracteres += redacao.texto.length;
+    }
+    if (atual.length) pacotes.push(atual);
+    return pacotes;
+}
+
+const schemaLote = (sobDemanda: boolean) => {
+    const base = sobDemanda ? schemaNotasENEM : schemaAnaliseENEM;
+    return {
+        type: 'object',
+        additionalProperties: false,
+        required: ['avaliacoes'],
+        properties: {
+            avaliacoes: {
+                type: 'array',
+                items: { ...base, required: ['id', ...base.required], properties: { id: { type: 'string' }, ...base.properties } },
+            },
+        },
+    };
+};
+
+// Ids curtos e locais ao pacote (R1, R2...): o modelo os repete com menos erro que ids do banco
+const mensagensLote = (pacote: RedacaoLote[], perfilCorretor: string, sobDemanda: boolean): MensagemLLM[] => [
+    { role: 'system', content: sobDemanda ? PREFIXO_SISTEMA_NOTAS : PREFIXO_SISTEMA_ENEM },
+    {
+        role: 'system',
+        content: `Adote o seguinte perfil de corretor: ${perfilCorretor}\n` +
+            `Nesta tarefa você avaliará ${pacote.length} redações de autores diferentes, cada uma identificada por um id. Avalie cada redação isoladamente, sem compará-las entre si. ` +
+            'Responda com um único objeto JSON no formato {"avaliacoes": [ ... ]}, com uma avaliação por redação, na mesma ordem, cada uma com o campo "id" e exatamente a estrutura acima.',
+    },
+    { role: 'user', content: pacote.map((r, i) => `Redação id="R${i + 1}":\n"""\n${r.texto}\n"""`).join('\n\n') },
+];
+
+/** Um corretor avalia o pacote inteiro; null na posição de cada bloco inválido ou ausente. */
+async function avaliarPacote(
+    pacote: RedacaoLote[],
+    perfil: number,
+    sobDemanda: boolean,
+    signal?: AbortSignal,
+    timeoutMs?: number
+): Promise<Array<AnaliseENEM | null>> {
+    if (pacote.length === 1) {
+        return [await corrigirComPerfil(pacote[0].texto, perfil, signal, timeoutMs, undefined, CAMADA_ENEM, false, sobDemanda)];
+    }
+    let resposta = '';
+    try {
+        resposta = await chamarLLM(mensagensLote(pacote, PERFIS_CORRETORES[perfil], sobDemanda), Math.min((sobDemanda ? 512 : 2048) * pacote.length, LOTE_MAX_TOKENS_SAIDA), 0.3, {
+            signal,
+            timeoutMs,
+            camada: CAMADA_ENEM,
+            // Rótulo por modo: prompts diferentes, métricas e invalidação do cache separadas
+            rotulo: sobDemanda ? 'enem-lote-notas' : 'enem-lote',
+            formatoResposta: { nome: 'AvaliacoesLoteENEM', schema: schemaLote(sobDemanda) },
+            cache: {
+                versaoPrompt: `${VERSAO_PROMPT_LOTE}:${sobDemanda ? VERSAO_PROMPT_NOTAS : VERSAO_PROMPT_ENEM}`,
+                // Só o pacote com um bloco válido para cada redação: os inválidos são refeitos um a um
+                aceitar: texto => {
+                    const avaliacoes = parseJsonTolerante(texto)?.valor?.avaliacoes;
+                    if (!Array.isArray(avaliacoes)) return false;
+                    const blocos = new Map(avaliacoes.filter((b: any) => b && typeof b === 'object').map((b: any) => [comoTexto(b.id), b]));
+                    return pacote.every((_, i) => blocos.has(`R${i + 1}`) && analiseValida(blocos.get(`R${i + 1}`), sobDemanda));
+                },
+            },
+        });
+    } catch (e) {
+        if (foiCancelado(e)) throw e;
+        // Pacote perdido: todas as redações dele serão refeitas individualmente
+        console.error(`Erro no pacote de ${pacote.length} redações (perfil: ${PERFIS_CORRETORES[perfil]}):`, e);
+    }
+    const avaliacoes = parseJsonTolerante(resposta)?.valor?.avaliacoes;
+    const blocos = new Map<string, any>();
+    for (const bloco of Array.isArray(avaliacoes) ? avaliacoes : []) {
+        if (bloco && typeof bloco === 'object') blocos.set(comoTexto(bloco.id), bloco);
+    }
+    return pacote.map((_, i) => {
+        const bloco = blocos.get(`R${i + 1}`);
+        return bloco ? validarComMetricas(sobDemanda ? completarNotas(bloco) : bloco, resposta) : null;
+    });
+}
+
+/**
+ * Avalia muitas redações (backfill, correção em massa) em pacotes. Cada
+ * corretor inicial recebe o pacote inteiro em uma requisição; blocos inválidos
+ * ou ausentes são refeitos só para a redação afetada, e redações com corretores
+ * divergentes passam pelo desempate, como na estratégia adaptativa. Não falha
+ * por redação: quem não tiver análise válida volta com `erro`.
+ */
+export async function analisarEnemEmLote(redacoes: RedacaoLote[], opcoes: OpcoesLote = {}): Promise<ResultadoLote[]> {
+    const { signal, prazo, aoConcluir } = opcoes;
+    const sobDemanda = opcoes.feedbackSobDemanda ?? FEEDBACK_SOB_DEMANDA;
+    const corretores = Math.min(Math.max(1, CORRETORES_INICIAIS), PERFIS_CORRETORES.length);
+    const pacotes = montarPacotes(redacoes, Math.max(1, opcoes.tamanhoPacote ?? LOTE_TAMANHO), LOTE_MAX_CARACTERES);
+    const resultados = new Map<RedacaoLote, ResultadoLote>();
+
+    const processar = async (pacote: RedacaoLote[]) => {
+        const inicio = Date.now();
+        const timeoutMs = prazo?.timeoutEtapa();
+        const porCorretor = await Promise.all(
+            Array.from({ length: corretores }, (_, perfil) => avaliarPacote(pacote, perfil, sobDemanda, signal, timeoutMs))
+        );
+        lancarSeCancelado(signal);
+        await Promise.all(pacote.map(async (redacao, i) => {
+            let reenvios = 0;
+            const analises: AnaliseENEM[] = [];
+            for (let perfil = 0; perfil < corretores; perfil++) {
+                let analise = porCorretor[perfil][i];
+                if (!analise && pacote.length > 1) {
+                    reenvios++;
+                    analise = await corrigirComPerfil(redacao.texto, perfil, signal, timeoutMs, undefined, CAMADA_ENEM, false, sobDemanda);
+                }
+                if (analise) analises.push(analise);
+            }
+            for (let perfil = corretores; perfil < PERFIS_CORRETORES.length &&
+                (analises.length < 2 || divergenciaMaxima(analises) > LIMIAR_DIVERGENCIA); perfil++) {
+                incrementar('enem.lote.desempate');
+                const extra = await corrigirComPerfil(redacao.texto, perfil, signal, timeoutMs, undefined, 'grande', false, sobDemanda);
+                if (extra) analises.push(extra);
+            }
+            lancarSeCancelado(signal);
+
+            let resultado: ResultadoLote;
+            if (analises.length) {
+                const analise = consolidarAnalises(analises);
+                if (sobDemanda) analise.feedbackSobDemanda = true;
+                resultado = { id: redacao.id, analise, reenvios };
+            } else {
+                incrementar('enem.lote.falha');
+                resultado = { id: redacao.id, analise: null, reenvios, erro: 'Nenhum dos corretores de IA conseguiu retornar uma análise válida.' };
+            }
+            incrementar('enem.lote.reenvios', reenvios);
+            resultados.set(redacao, resultado);
+            aoConcluir?.(resultado);
+        }));
+        incrementar('enem.lote.pacotes');
+        incrementar('enem.lote.redacoes', pacote.length);
+        registrarDuracao('enem.lote.pacote.latencia', Date.now() - inicio);
+    };
+
+    // Pacotes em paralelo, limitados (a cota e a concorrência adaptativa do cliente do LLM seguem valendo)
+    const fila = [...pacotes];
+    const trabalhador = async () => {
+        for (let pacote = fila.shift(); pacote; pacote = fila.shift()) await processar(pacote);
+    };
+    console.log(`📦 Avaliação em lote: ${redacoes.length} redações em ${pacotes.length} pacote(s), ${corretores} corretor(es) por pacote.`);
+    await Promise.all(Array.from({ length: Math.min(Math.max(1, opcoes.concorrencia ?? LOTE_CONCORRENCIA), pacotes.length) }, trabalhador));
+    return redacoes.map(r => resultados.get(r) as ResultadoLote);
+}
+
+// --- AVALIAÇÃO OFFLINE (Batch API) ---
+// Corpo de chat completions de um único corretor (o primeiro perfil), no mesmo
+// formato que chamarLLM envia: é o que vai em cada linha do JSONL dos jobs
+// assíncronos (scripts/loteBatch.ts). A resposta volta por interpretarRespostaEnem.
+export function requisicaoAvaliacaoEnem(texto: string, sobDemanda = FEEDBACK_SOB_DEMANDA) {
+    const formato = sobDemanda
+        ? { name: 'NotasENEM', schema: schemaNotasENEM }
+        : { name: 'AnaliseENEM', schema: schemaAnaliseENEM };
+    return {
+        versaoPrompt: sobDemanda ? VERSAO_PROMPT_NOTAS : VERSAO_PROMPT_ENEM,
+        corpo: {
+            messages: mensagensEnem(texto, PERFIS_CORRETORES[0], false, sobDemanda),
+            max_completion_tokens: sobDemanda ? 512 : 2048,
+            response_format: { type: 'json_schema', json_schema: { ...formato, strict: true } },
+        },
+    };
+}
+
+// --- REAVALIAÇÃO INCREMENTAL (delta) ---
+export interface AlteracaoParagrafo {
+    antes: string;
+    depois: string;
+}
+
+const schemaDelta = (chaves: ChaveCompetencia[]) => ({
+    type: 'object',
+    additionalProperties: false,
+    required: ['comentarioGeral', 'competencias'],
+    properties: {
+        comentarioGeral: { type: 'string' },
+        competencias: {
+            type: 'object',
+            additionalProperties: false,
+            required: chaves,
+            properties: Object.fromEntries(chaves.map(c => [c, schemaCompetencia])),
+        },
+    },
+});
+
+const mensagensDelta = (anterior: AnaliseENEM, chaves: ChaveCompetencia[], alteracoes: AlteracaoParagrafo[]): MensagemLLM[] => [
+    { role: 'system', content: PREFIXO_SISTEMA_ENEM },
+    {
+        role: 'system',
+        content: `Nesta tarefa você NÃO avalia a redação inteira: o aluno alterou alguns parágrafos de uma redação já corrigida. ` +
+            `Reavalie somente as competências ${chaves.map(c => c.toUpperCase()).join(', ')}, partindo da nota anterior e considerando apenas o efeito das alterações. ` +
+            `Responda com um único objeto JSON {"comentarioGeral": "...", "competencias": {${chaves.map(c => `"${c}": {...}`).join(', ')}}}, cada competência na estrutura acima.`,
+    },
+    {
+        role: 'user',
+        content: [
+            `Tese principal identificada: ${anterior.tesePrincipal || '(não identificada)'}`,
+            'Avaliação anterior das competências a reavaliar:',
+            ...chaves.map(c => `- ${c.toUpperCase()} (${anterior.competencias[c].nota}): ${anterior.competencias[c].comentario}`),
+            '',
+            'Parágrafos alterados:',
+            ...alteracoes.map((a, i) => `${i + 1}. ANTES:\n"""\n${a.antes || '(parágrafo novo)'}\n"""\nDEPOIS:\n"""\n${a.depois || '(parágrafo removido)'}\n"""`),
+        ].join('\n'),
+    },
+];
+
+/**
+ * Reavalia apenas as competências afetadas por uma edição, com um prompt
+ * pequeno (parágrafos antes/depois + avaliação anterior). As demais
+ * competências são mantidas. Retorna null se a resposta não for utilizável
+ * (o chamador deve cair para a análise completa).
+ */
+export async function reavaliarCompetencias(
+    anterior: AnaliseENEM,
+    chaves: ChaveCompetencia[],
+    alteracoes: AlteracaoParagrafo[],
+    opcoes: OpcoesExecucao = {}
+): Promise<AnaliseENEM | null> {
+    const { signal, prazo } = opcoes;
+    const analise: AnaliseENEM = JSON.parse(JSON.stringify(anterior));
+    if (chaves.length === 0) return analise;
+    try {
+        const resposta = await chamarLLM(mensagensDelta(anterior, chaves, alteracoes), 1024 * chaves.length, 0.3, {
+            signal,
+            timeoutMs: prazo?.timeoutEtapa(),
+            rotulo: 'enem-delta',
+            formatoResposta: { nome: 'ReavaliacaoENEM', schema: schemaDelta(chaves) },
+            cache: {
+                versaoPrompt: `${VERSAO_PROMPT_ENEM}:${VERSAO_PROMPT_DELTA}`,
+                aceitar: texto => {
+                    const competencias = parseJsonTolerante(texto)?.valor?.competencias;
+                    return chaves.every(c => validarCompetencia(competencias?.[c]).detalhe !== null);
+                },
+            },
+        });
+        const json = parseJsonTolerante(resposta);
+        for (const chave of chaves) {
+            const { detalhe } = validarCompetencia(json?.valor?.competencias?.[chave]);
+            if (!detalhe) {
+                incrementar('enem.delta.falha');
+                console.warn(`⚠️ Reavaliação incremental sem ${chave.toUpperCase()} válida: ${resposta.slice(0, 200)}`);
+                return null;
+            }
+            analise.competencias[chave] = { ...detalhe, nome: detalhe.nome || anterior.competencias[chave].nome };
+        }
+        if (json?.valor?.comentarioGeral) analise.comentarioGeral = comoTexto(json.valor.comentarioGeral);
+        analise.notaFinal1000 = CHAVES_COMPETENCIAS.reduce((soma, c) => soma + analise.competencias[c].nota, 0);
+        return analise;
+    } catch (e) {
+        if (foiCancelado(e)) throw e;
+        incrementar('enem.delta.falha');
+        console.error('Erro na reavaliação incremental:', e);
+        return null;
+    }
+}
+
+export async function formatarTextoComLLM(texto: string, opcoes: OpcoesExecucao = {}): Promise<{ textoFormatado: string }> {
     if (!texto || texto.trim().length === 0) {
         return { textoFormatado: texto };
     }
-    const prompt = `Corrija e formate o seguinte texto extraído por OCR, organizando-o em parágrafos. Retorne apenas o texto limpo.\n\nTexto Bruto:\n"""${texto}"""`;
-    try {
-        const textoFormatado = await chamarLLM(prompt);
-        return { textoFormatado };
-    } catch (err: any) {
-        console.warn(`Formatação com LLM falhou, retornando texto original. Erro: ${err.message}`);
+    const { signal, prazo } = opcoes;
+    // Formatação é opcional: sem orçamento, segue com o texto como veio
+    if (prazo && !prazo.temOrcamento(FORMATACAO_MIN_MS + AVALIACAO_MIN_MS)) {
+        incrementar('prazo.etapa_pulada.formatacao');
         return { textoFormatado: texto };
     }
+    // Reserva tempo para a avaliação que vem em seguida
+    const timeoutMs = prazo ? prazo.timeoutEtapa() - AVALIACAO_MIN_MS : undefined;
+    const prompt = `Corrija e formate o seguinte texto extraído por OCR, organizando-o em parágrafos. Retorne apenas o texto limpo.\n\nTexto Bruto:\n"""${texto}"""`;
+    const chave = `formatacao:${VERSAO_PROMPT_FORMATACAO}:${hashConteudo(normalizarTexto(texto))}`;
+    return executarUmaVez(chave, async sinal => {
+        try {
+            const textoFormatado = await chamarLLMComEscalada(prompt, 2048, 0.3, {
+                signal: sinal,
+                timeoutMs,
+                rotulo: 'formatacao',
+                cache: { versaoPrompt: VERSAO_PROMPT_FORMATACAO },
+            }, resultado => !textoIncompleto(resultado, texto));
+            if (textoIncompleto(textoFormatado, texto)) {
+                console.warn('⚠️ Formatação com LLM voltou incompleta, retornando texto original.');
+                return { textoFormatado: texto };
+            }
+            return { textoFormatado };
+        } catch (err: any) {
+            if (foiCancelado(err)) throw err;
+            console.warn(`Formatação com LLM falhou, retornando texto original. Erro: ${err.message}`);
+            return { textoFormatado: texto };
+        }
+    }, signal);
 }
\ No newline at end of file
@@ -0,0 +1,101 @@
+// geminiClient.ts
+// Cliente do Gemini (Vertex AI) no contrato LLMClient: traduz o corpo de chat
+// completions para generateContent e a resposta de volta, reaproveitando a
+// cota, o retry e o streaming de ClienteLLMHttp. Usa a API REST (e não o SDK)
+// para que o endpoint possa apontar para um mock local (GEMINI_VERTEX_ENDPOINT).
+
+import { GoogleAuth } from 'google-auth-library';
+import { ClienteLLMHttp, EventoStream, RequisicaoHttp } from './llmClient';
+
+const GCP_PROJECT_ID = process.env.GCP_PROJECT_ID || '';
+const GCP_LOCATION = process.env.GCP_LOCATION || '';
+const GEMINI_MODELO = process.env.GEMINI_MODELO || 'gemini-1.5-flash';
+const GEMINI_ENDPOINT = process.env.GEMINI_VERTEX_ENDPOINT || (GCP_LOCATION ? `https://${GCP_LOCATION}-aiplatform.googleapis.com` : '');
+// Token fixo (ex.: mock local); sem ele, usa as credenciais padrão do Google
+const GEMINI_TOKEN = process.env.GEMINI_TOKEN || '';
+const GEMINI_RPM = Number(process.env.GEMINI_RPM) || 0;
+const GEMINI_TPM = Number(process.env.GEMINI_TPM) || 0;
+
+let autenticacao: GoogleAuth | null = null;
+
+async function obterToken(): Promise<string> {
+    if (GEMINI_TOKEN) return GEMINI_TOKEN;
+    if (!autenticacao) autenticacao = new GoogleAuth({ scopes: 'https://www.googleapis.com/auth/cloud-platform' });
+    const token = await autenticacao.getAccessToken();
+    if (!token) throw new Error('Não foi possível obter o token de acesso do Google Cloud.');
+    return token;
+}
+
+const usoGemini = (u: any = {}) => ({
+    prompt_tokens: u.promptTokenCount || 0,
+    completion_tokens: u.candidatesTokenCount || 0,
+    total_tokens: u.totalTokenCount || 0,
+    prompt_tokens_details: { cached_tokens: u.cachedContentTokenCount || 0 },
+});
+
+const textoCandidato = (data: any): string =>
+    (data?.candidates?.[0]?.content?.parts || []).map((p: any) => p.text || '').join('');
+
+export class ClienteGeminiVertex extends ClienteLLMHttp {
+    readonly provedor = 'gemini';
+
+    constructor(modelo: string) {
+        super(modelo, { rpm: GEMINI_RPM, tpm: GEMINI_TPM });
+    }
+
+    get configurado(): boolean {
+        return Boolean(GEMINI_ENDPOINT && GCP_PROJECT_ID && GCP_LOCATION && this.modelo);
+    }
+
+    protected async montarRequisicao(body: any, streaming: boolean): Promise<RequisicaoHttp> {
+        const mensagens: Array<{ role: string; content: string }> = body.messages || [];
+        // O Gemini recebe as mensagens de sistema à parte; o restante vira `contents`
+        const sistema = mensagens.filter(m => m.role === 'system').map(m => m.content).join('\n\n');
+        const corpo: Record<string, any> = {
+            contents: mensagens
+                .filter(m => m.role !== 'system')
+                .map(m => ({ role: m.role === 'assistant' ? 'model' : 'user', parts: [{ text: m.content }] })),
+            generationConfig: {
+                maxOutputTokens: body.max_completion_tokens ?? body.max_tokens,
+                temperature: body.temperature,
+                // O schema da OpenAI não é compatível com o do Gemini: pede só JSON
+                // (a validação e o parser tolerante seguem valendo)
+                responseMimeType: body.response_format ? 'application/json' : undefined,
+            },
+        };
+        if (sistema) corpo.systemInstruction = { parts: [{ text: sistema }] };
+
+        const metodo = streaming ? 'streamGenerateContent?alt=sse' : 'generateContent';
+        return {
+            url: `${GEMINI_ENDPOINT.replace(/\/+$/, '')}/v1/projects/${GCP_PROJECT_ID}/locations/${GCP_LOCATION}/publishers/google/models/${encodeURIComponent(this.modelo)}:${metodo}`,
+            headers: { 'Content-Type': 'application/json', Authorization: `Bearer ${await obterToken()}` },
+            corpo,
+        };
+    }
+
+    protected lerEvento(evento: any): EventoStream {
+        return { trecho: textoCandidato(evento), usage: evento.usageMetadata ? usoGemini(evento.usageMetadata) : undefined };
+    }
+
+    protected converterResposta(data: any): any {
+        const motivo = data?.candidates?.[0]?.finishReason;
+        if (motivo === 'SAFETY') {
+            throw new Error('A resposta da IA foi bloqueada pelo filtro de segurança do Google (SAFETY).');
+        }
+        return {
+            choices: [{ message: { role: 'assistant', content: textoCandidato(data) }, finish_reason: motivo }],
+            usage: usoGemini(data?.usageMetadata),
+        };
+    }
+}
+
+const clientes = new Map<string, ClienteGeminiVertex>();
+
+export function obterClienteGemini(modelo = GEMINI_MODELO): ClienteGeminiVertex {
+    let cliente = clientes.get(modelo);
+    if (!cliente) {
+        cliente = new ClienteGeminiVertex(modelo);
+        clientes.set(modelo, cliente);
+    }
+    return cliente;
+}
@@ -1,7 +1,11 @@
 // googleVisionService.ts
+// Com GOOGLE_VISION_ENDPOINT, usa a API REST (images:annotate) em vez do cliente
+// gRPC, para que o OCR possa apontar para um mock local (mock_ocr.py).
 
 import { ImageAnnotatorClient } from '@google-cloud/vision';
+import axios from 'axios';
 import * as fs from 'fs';
+import { CancelamentoError, comSinal, foiCancelado, foiTempoEsgotado } from './cancelamento';
 
 export interface GoogleVisionResult { text: string; confidence: number; }
 
@@ -25,15 +29,39 @@ function createClient(): ImageAnnotatorClient {
     }
 }
 
-const client = createClient();
+const VISION_ENDPOINT = (process.env.GOOGLE_VISION_ENDPOINT || '').replace(/\/+$/, '');
+const VISION_API_KEY = process.env.GOOGLE_VISION_API_KEY || '';
 
-export async function extractTextWithGoogleVision(imageBuffer: Buffer): Promise<GoogleVisionResult | null> {
+const client = VISION_ENDPOINT ? null : createClient();
+
+/** documentTextDetection pela API REST; a resposta tem o mesmo formato da do cliente gRPC. */
+async function anotarViaRest(imageBuffer: Buffer, signal?: AbortSignal, timeoutMs?: number): Promise<any> {
+    const response = await axios.post(`${VISION_ENDPOINT}/v1/images:annotate`, {
+        requests: [{
+            image: { content: imageBuffer.toString('base64') },
+            features: [{ type: 'DOCUMENT_TEXT_DETECTION' }],
+            imageContext: { languageHints: ['pt'] },
+        }],
+    }, {
+        headers: VISION_API_KEY ? { 'x-goog-api-key': VISION_API_KEY } : {},
+        signal,
+        timeout: timeoutMs,
+    });
+    const resultado = response.data?.responses?.[0] || {};
+    if (resultado.error) throw new Error(resultado.error.message || `Erro ${resultado.error.code} do Google Vision`);
+    return resultado;
+}
+
+export async function extractTextWithGoogleVision(imageBuffer: Buffer, signal?: AbortSignal, timeoutMs?: number): Promise<GoogleVisionResult | null> {
     try {
         console.log("Enviando imagem para a API Google Cloud Vision (Document Text)...");
-        const [result] = await client.documentTextDetection({
-            image: { content: imageBuffer },
-            imageContext: { languageHints: ['pt'] }
-        });
+        // O cliente gRPC não aceita AbortSignal: o resultado é descartado ao cancelar
+        const [result] = client
+            ? await comSinal(client.documentTextDetection({
+                image: { content: imageBuffer },
+                imageContext: { languageHints: ['pt'] }
+            }, timeoutMs ? { timeout: timeoutMs } : undefined), signal)
+            : [await anotarViaRest(imageBuffer, signal, timeoutMs)];
         const detection = result.fullTextAnnotation;
 
         if (!detection || !detection.text) {
@@ -47,6 +75,9 @@ export async function extractTextWithGoogleVision(imageBuffer: Buffer): Promise<
             confidence: Math.round(avgConfidence * 100),
         };
     } catch (error: any) {
+        if (foiCancelado(error)) throw error;
+        // Prazo esgotado no meio do OCR: sobe como timeout em vez de "sem texto"
+        if (foiTempoEsgotado(error)) throw new CancelamentoError('timeout');
         console.error("Erro na API Google Cloud Vision:", error.message);
         return null;
     }
@@ -0,0 +1,71 @@
+// janelasTexto.ts
+// Divide um texto longo em janelas do tamanho de parágrafos para processamento
+// em paralelo. Cada janela tem um "núcleo" (o trecho a processar) e, como
+// contexto somente leitura, o fim da janela anterior e o início da seguinte.
+// Costurar é só juntar os núcleos na ordem: o resultado é determinístico e
+// não depende de deduplicar a sobreposição.
+
+export interface JanelaTexto {
+    indice: number;
+    nucleo: string;
+    contextoAnterior: string;
+    contextoPosterior: string;
+}
+
+// Do separador mais forte para o mais fraco: parágrafo, linha, frase
+const SEPARADORES: RegExp[] = [/\n\s*\n/, /\n/, /(?<=[.!?;])\s+/];
+
+/** Quebra o texto em unidades de até `maxCaracteres`, preferindo fronteiras de parágrafo. */
+export function dividirEmUnidades(texto: string, maxCaracteres: number, nivel = 0): string[] {
+    const limpo = texto.trim();
+    if (!limpo) return [];
+    if (limpo.length <= maxCaracteres || nivel >= SEPARADORES.length) return [limpo];
+    const partes = limpo.split(SEPARADORES[nivel]).map(p => p.trim()).filter(Boolean);
+    if (partes.length === 1) return dividirEmUnidades(limpo, maxCaracteres, nivel + 1);
+    return partes.flatMap(p => dividirEmUnidades(p, maxCaracteres, nivel + 1));
+}
+
+// Recortes de contexto sem cortar palavras ao meio
+function inicioDe(texto: string, max: number): string {
+    if (texto.length <= max) return texto;
+    const corte = texto.lastIndexOf(' ', max);
+    return texto.slice(0, corte > 0 ? corte : max);
+}
+
+function fimDe(texto: string, max: number): string {
+    if (texto.length <= max) return texto;
+    const corte = texto.indexOf(' ', texto.length - max);
+    return texto.slice(corte >= 0 ? corte + 1 : texto.length - max);
+}
+
+/**
+ * Agrupa as unidades em janelas de até `maxCaracteres` (uma unidade nunca é
+ * partida entre janelas) com até `sobreposicao` caracteres de contexto de cada lado.
+ */
+export function dividirEmJanelas(texto: string, maxCaracteres: number, sobreposicao: number): JanelaTexto[] {
+    const nucleos: string[] = [];
+    let atual: string[] = [];
+    let tamanho = 0;
+    for (const unidade of dividirEmUnidades(texto, maxCaracteres)) {
+        if (atual.length && tamanho + unidade.length + 1 > maxCaracteres) {
+            nucleos.push(atual.join('\n'));
+            atual = [];
+            tamanho = 0;
+        }
+        atual.push(unidade);
+        tamanho += unidade.length + 1;
+    }
+    if (atual.length) nucleos.push(atual.join('\n'));
+
+    return nucleos.map((nucleo, indice) => ({
+        indice,
+        nucleo,
+        contextoAnterior: indice > 0 && sobreposicao > 0 ? fimDe(nucleos[indice - 1], sobreposicao) : '',
+        contextoPosterior: indice < nucleos.length - 1 && sobreposicao > 0 ? inicioDe(nucleos[indice + 1], sobreposicao) : '',
+    }));
+}
+
+/** Junta os núcleos processados na ordem das janelas. */
+export function costurarJanelas(resultados: Array<{ indice: number; texto: string }>): string {
+    return [...resultados].sort((a, b) => a.indice - b.indice).map(r => r.texto.trim()).filter(Boolean).join('\n');
+}
@@ -0,0 +1,172 @@
+// jsonTolerante.ts
+// Parser de JSON tolerante para respostas de LLM: ignora texto ao redor e
+// cercas ```json, escapa quebras de linha cruas dentro de strings, remove
+// vírgulas sobrando e fecha estruturas truncadas (resposta cortada por
+// max_tokens), recuando até o último valor completo se necessário.
+
+export interface ResultadoJson<T> {
+    valor: T;
+    reparado: boolean;
+}
+
+type PontoDeCorte = { posicao: number; pilha: string[] };
+
+const fechamentos = (pilha: string[]): string =>
+    pilha.slice().reverse().map(c => (c === '{' ? '}' : ']')).join('');
+
+/**
+ * Percorre o texto a partir do primeiro `{` com um autômato simples
+ * (dentro/fora de string, escape, pilha de `{`/`[`) e devolve o trecho
+ * normalizado e os pontos onde é seguro cortar em caso de truncamento.
+ */
+function varrer(texto: string) {
+    const inicio = texto.indexOf('{');
+    let saida = '';
+    const pilha: string[] = [];
+    const cortes: PontoDeCorte[] = [];
+    let emString = false;
+    let escape = false;
+    let completo = false;
+
+    for (let i = Math.max(0, inicio); inicio >= 0 && i < texto.length; i++) {
+        const ch = texto[i];
+        if (emString) {
+            if (escape) { escape = false; saida += ch; continue; }
+            if (ch === '\\') { escape = true; saida += ch; continue; }
+            if (ch === '"') { emString = false; saida += ch; continue; }
+            // Quebras de linha e tabs crus não são válidos dentro de strings JSON
+            if (ch === '\n') { saida += '\\n'; continue; }
+            if (ch === '\r') { continue; }
+            if (ch === '\t') { saida += '\\t'; continue; }
+            saida += ch;
+            continue;
+        }
+        if (ch === '"') { emString = true; saida += ch; continue; }
+        if (ch === '{' || ch === '[') { pilha.push(ch); saida += ch; continue; }
+        if (ch === '}' || ch === ']') {
+            // Remove vírgula sobrando antes do fechamento: {"a": 1,}
+            saida = saida.replace(/,\s*$/, '');
+            pilha.pop();
+            saida += ch;
+            if (pilha.length === 0) { completo = true; break; }
+            continue;
+        }
+        if (ch === ',') cortes.push({ posicao: saida.length, pilha: pilha.slice() });
+        saida += ch;
+    }
+    return { saida, pilha, cortes, emString, completo, encontrado: inicio >= 0 };
+}
+
+const tentar = (candidato: string): { ok: true; valor: any } | { ok: false } => {
+    try {
+        return { ok: true, valor: JSON.parse(candidato) };
+    } catch {
+        return { ok: false };
+    }
+};
+
+export function parseJsonTolerante<T = any>(texto: string): ResultadoJson<T> | null {
+    if (!texto) return null;
+    const semCercas = texto.replace(/```(?:json)?/gi, '');
+
+    // Caminho feliz: o primeiro objeto balanceado é JSON válido como veio
+    const { saida, pilha, cortes, emString, completo, encontrado } = varrer(semCercas);
+    if (!encontrado) return null;
+
+    const direto = completo ? tentar(saida) : { ok: false as const };
+    if (direto.ok) {
+        const original = semCercas.slice(semCercas.indexOf('{')).trim();
+        return { valor: direto.valor, reparado: !original.startsWith(saida) };
+    }
+
+    // Truncado: fecha a string aberta e as estruturas pendentes
+    if (!completo) {
+        const fechado = (emString ? saida + '"' : saida).replace(/,\s*$/, '') + fechamentos(pilha);
+        const r = tentar(fechado);
+        if (r.ok) return { valor: r.valor, reparado: true };
+    }
+
+    // Recuo: corta no último valor completo (antes de uma vírgula) e fecha a partir dali
+    for (let i = cortes.length - 1, tentativas = 0; i >= 0 && tentativas < 50; i--, tentativas++) {
+        const { posicao, pilha: pilhaNoCorte } = cortes[i];
+        const r = tentar(saida.slice(0, posicao) + fechamentos(pilhaNoCorte));
+        if (r.ok) return { valor: r.valor, reparado: true };
+    }
+    return null;
+}
+
+type Quadro = { tipo: '{' | '['; chave: string | null; esperandoChave: boolean; inicio: number; emitir: string | null };
+
+/**
+ * Parser incremental para respostas em streaming: recebe o texto em trechos
+ * e, assim que cada membro de um objeto com a chave `chavePai` fecha (ex.:
+ * `"competencias": { "c1": {...}, ... }`), entrega `(chave, valor)` sem
+ * esperar o restante da resposta.
+ */
+export class ExtratorIncremental {
+    private texto = '';
+    private readonly pilha: Quadro[] = [];
+    private emString = false;
+    private escape = false;
+    private stringAtual = '';
+    private ultimaString = '';
+
+    constructor(
+        private readonly chavePai: string,
+        private readonly aoMembro: (chave: string, valor: any) => void
+    ) {}
+
+    alimentar(trecho: string): void {
+        for (const ch of trecho) {
+            const posicao = this.texto.length;
+            this.texto += ch;
+            this.processar(ch, posicao);
+        }
+    }
+
+    private processar(ch: string, posicao: number): void {
+        const topo = this.pilha[this.pilha.length - 1];
+        if (this.emString) {
+            if (this.escape) { this.escape = false; this.stringAtual += ch; return; }
+            if (ch === '\\') { this.escape = true; this.stringAtual += ch; return; }
+            if (ch === '"') {
+                this.emString = false;
+                this.ultimaString = this.stringAtual;
+                return;
+            }
+            this.stringAtual += ch;
+            return;
+        }
+        switch (ch) {
+            case '"':
+                this.emString = true;
+                this.stringAtual = '';
+                return;
+            case ':':
+                if (topo?.tipo === '{' && topo.esperandoChave) {
+                    topo.chave = this.ultimaString;
+                    topo.esperandoChave = false;
+                }
+                return;
+            case ',':
+                if (topo?.tipo === '{') topo.esperandoChave = true;
+                return;
+            case '{':
+            case '[': {
+                // Membro a emitir: valor de uma chave dentro do objeto que é valor de `chavePai`
+                const avo = this.pilha[this.pilha.length - 2];
+                const emitir = ch === '{' && topo?.tipo === '{' && topo.chave && avo?.chave === this.chavePai ? topo.chave : null;
+                this.pilha.push({ tipo: ch, chave: null, esperandoChave: ch === '{', inicio: posicao, emitir });
+                return;
+            }
+            case '}':
+            case ']': {
+                const quadro = this.pilha.pop();
+                if (!quadro?.emitir) return;
+                const trecho = parseJsonTolerante(this.texto.slice(quadro.inicio, posicao + 1));
+                if (trecho) this.aoMembro(quadro.emitir, trecho.valor);
+                return;
+            }
+        }
+    }
+}
@@ -0,0 +1,475 @@
+// llmClient.ts
+// Camada de cliente HTTP dos provedores de LLM usada por chamarLLM (Azure OpenAI
+// aqui; Gemini em geminiClient.ts; a escolha entre eles fica em llmRouter.ts):
+// - conexões persistentes (keep-alive) reaproveitadas entre chamadas;
+// - baldes de tokens por deployment (RPM/TPM), ajustados pelos headers x-ratelimit-*;
+// - retry com jitter em 429/5xx respeitando retry-after;
+// - concorrência adaptativa (AIMD): cresce devagar no sucesso, cai pela metade no 429.
+// Assim a vazão se estabiliza na cota do deployment em vez de colapsar em rajadas de 429.
+// Também lê respostas em streaming (SSE), repassando cada trecho de texto.
+
+import axios, { AxiosResponse } from 'axios';
+import http from 'http';
+import https from 'https';
+import { Readable } from 'stream';
+import { StringDecoder } from 'string_decoder';
+import { erroDoSinal, lancarSeCancelado } from './cancelamento';
+import { incrementar, registrarDuracao, registrarMedidor } from './metricasService';
+
+const azureEndpoint = process.env.AZURE_OPENAI_ENDPOINT || '';
+const azureKey = process.env.AZURE_OPENAI_KEY || '';
+const azureApiVersion = process.env.AZURE_OPENAI_API_VERSION || '2024-02-01';
+
+// Cota do deployment (0 = desconhecida: o limite é aprendido só pelos headers)
+const RPM = Number(process.env.AZURE_OPENAI_RPM) || 0;
+const TPM = Number(process.env.AZURE_OPENAI_TPM) || 0;
+const MAX_TENTATIVAS = Number(process.env.LLM_MAX_TENTATIVAS) || 4;
+const RETRY_BASE_MS = 500;
+const RETRY_TETO_MS = 20000;
+const CONCORRENCIA_INICIAL = Number(process.env.LLM_CONCORRENCIA_INICIAL) || 4;
+const CONCORRENCIA_MAX = Number(process.env.LLM_CONCORRENCIA_MAX) || 16;
+const MAX_SOCKETS = Number(process.env.LLM_MAX_SOCKETS) || 32;
+
+const httpsAgent = new https.Agent({
+    keepAlive: true,
+    maxSockets: MAX_SOCKETS,
+    rejectUnauthorized: false
+});
+// Endpoints http:// (ex.: mock local) também reaproveitam conexões
+const httpAgent = new http.Agent({ keepAlive: true, maxSockets: MAX_SOCKETS });
+const clienteHttp = axios.create({ httpAgent, httpsAgent });
+
+const STATUS_RETENTAVEIS = new Set([408, 429, 500, 502, 503, 504]);
+
+export class TempoEsgotadoError extends Error {
+    code = 'ETIMEDOUT';
+
+    constructor(mensagem: string) {
+        super(mensagem);
+        this.name = 'TempoEsgotadoError';
+    }
+}
+
+/** Erro transitório do provedor (429, 5xx, rede, cota indisponível no prazo): vale tentar outro. */
+export function erroRetentavel(error: any): boolean {
+    if (error instanceof TempoEsgotadoError) return true;
+    if (!axios.isAxiosError(error)) return false;
+    if (error.response) return STATUS_RETENTAVEIS.has(error.response.status);
+    return error.code !== 'ERR_CANCELED';
+}
+
+const esperar = (ms: number, signal?: AbortSignal): Promise<void> => new Promise((resolve, reject) => {
+    if (signal?.aborted) return reject(erroDoSinal(signal));
+    const timer = setTimeout(() => {
+        signal?.removeEventListener('abort', aoAbortar);
+        resolve();
+    }, ms);
+    const aoAbortar = () => {
+        clearTimeout(timer);
+        reject(erroDoSinal(signal));
+    };
+    signal?.addEventListener('abort', aoAbortar, { once: true });
+});
+
+/** Balde de tokens com reposição contínua; `porMinuto = 0` desativa o limite. */
+class BaldeDeTokens {
+    private nivel: number;
+    private ultimo = Date.now();
+
+    constructor(private readonly porMinuto: number) {
+        this.nivel = porMinuto || Infinity;
+    }
+
+    private reabastecer() {
+        if (!this.porMinuto) return;
+        const agora = Date.now();
+        this.nivel = Math.min(this.porMinuto, this.nivel + ((agora - this.ultimo) * this.porMinuto) / 60000);
+        this.ultimo = agora;
+    }
+
+    /** Milissegundos até haver `quantidade` disponível (0 = já disponível). */
+    tempoAte(quantidade: number): number {
+        this.reabastecer();
+        if (!this.porMinuto) return 0;
+        // Pedidos maiores que a cota inteira esperam apenas o balde encher
+        const alvo = Math.min(quantidade, this.porMinuto);
+        if (this.nivel >= alvo) return 0;
+        return Math.ceil(((alvo - this.nivel) * 60000) / this.porMinuto);
+    }
+
+    consumir(quantidade: number) {
+        this.reabastecer();
+        if (this.porMinuto) this.nivel -= quantidade;
+    }
+
+    devolver(quantidade: number) {
+        if (this.porMinuto) this.nivel = Math.min(this.porMinuto, this.nivel + quantidade);
+    }
+
+    /** O servidor informou quanto resta: nunca acreditar em mais do que isso. */
+    ajustarRestante(restante: number) {
+        this.reabastecer();
+        if (this.porMinuto && restante < this.nivel) this.nivel = restante;
+    }
+}
+
+/** Semáforo com limite adaptativo (additive increase / multiplicative decrease). */
+class LimitadorAIMD {
+    limite = CONCORRENCIA_INICIAL;
+    emUso = 0;
+    private fila: Array<() => void> = [];
+
+    async adquirir(signal?: AbortSignal): Promise<void> {
+        if (this.emUso < Math.floor(this.limite)) {
+            this.emUso++;
+            return;
+        }
+        await new Promise<void>((resolve, reject) => {
+            const liberar = () => {
+                signal?.removeEventListener('abort', aoAbortar);
+                resolve();
+            };
+            const aoAbortar = () => {
+                this.fila = this.fila.filter(f => f !== liberar);
+                reject(erroDoSinal(signal));
+            };
+            signal?.addEventListener('abort', aoAbortar, { once: true });
+            this.fila.push(liberar);
+        });
+    }
+
+    liberar() {
+        // Acorda quem estiver esperando, respeitando o limite atual (que pode ter caído)
+        if (this.fila.length > 0 && this.emUso <= Math.floor(this.limite)) {
+            this.fila.shift()!();
+        } else {
+            this.emUso--;
+        }
+    }
+
+    sucesso() {
+        this.limite = Math.min(CONCORRENCIA_MAX, this.limite + 1 / this.limite);
+        // Com o limite maior, libera quem estava na fila
+        while (this.fila.length > 0 && this.emUso < Math.floor(this.limite)) {
+            this.emUso++;
+            this.fila.shift()!();
+        }
+    }
+
+    limitado() {
+        this.limite = Math.max(1, this.limite / 2);
+    }
+}
+
+const lerNumero = (valor: unknown): number | undefined => {
+    const n = Number(valor);
+    return valor !== undefined && valor !== null && valor !== '' && Number.isFinite(n) ? n : undefined;
+};
+
+/** Tempo sugerido pelo servidor (retry-after-ms / retry-after em segundos ou data HTTP). */
+export const lerRetryAfterMs = (headers: Record<string, any> = {}): number | undefined => {
+    const ms = lerNumero(headers['retry-after-ms']);
+    if (ms !== undefined) return ms;
+    const valor = headers['retry-after'];
+    const segundos = lerNumero(valor);
+    if (segundos !== undefined) return segundos * 1000;
+    if (typeof valor === 'string') {
+        const data = Date.parse(valor);
+        if (!Number.isNaN(data)) return Math.max(0, data - Date.now());
+    }
+    return undefined;
+};
+
+const estimarTokens = (body: any): number => {
+    const entrada = Math.ceil(JSON.stringify(body.messages || '').length / 4);
+    return entrada + (body.max_completion_tokens || body.max_tokens || 0);
+};
+
+export interface OpcoesRequisicao {
+    signal?: AbortSignal;
+    timeoutMs?: number;
+    // Com callback, a resposta vem em streaming e cada trecho de texto é repassado
+    aoFragmento?: (texto: string) => void;
+    // Tentativas neste provedor (o roteador usa 1 quando há outro provedor para o failover)
+    maxTentativas?: number;
+}
+
+export interface RespostaProvedor {
+    // Corpo no formato do chat completions da OpenAI (choices[0].message.content, usage)
+    data: any;
+    headers: Record<string, any>;
+    provedor: string;
+    modelo: string;
+}
+
+/**
+ * Contrato comum dos provedores e do roteador: recebe um corpo de chat
+ * completions (messages, max_completion_tokens, response_format...) e devolve
+ * a resposta nesse mesmo formato, seja qual for a API por trás.
+ */
+export interface LLMClient {
+    readonly provedor: string;
+    readonly modelo: string;
+    readonly configurado: boolean;
+    completar(body: any, opcoes?: OpcoesRequisicao): Promise<RespostaProvedor>;
+}
+
+export interface RequisicaoHttp {
+    url: string;
+    headers: Record<string, string>;
+    corpo: any;
+}
+
+// Trecho de texto e/ou uso de tokens contidos em um evento do streaming
+export type EventoStream = { trecho?: string; usage?: any };
+
+/** Lê o corpo de um erro em streaming (para a mensagem e a detecção de parâmetro recusado). */
+const lerCorpoStream = (stream: Readable): Promise<any> => new Promise(resolve => {
+    let texto = '';
+    stream.on('data', (c: Buffer) => { texto += c.toString('utf8'); });
+    stream.on('end', () => {
+        try { resolve(JSON.parse(texto)); } catch { resolve(texto); }
+    });
+    stream.on('error', () => resolve(texto));
+});
+
+/**
+ * Consome o stream SSE de chat completions (`data: {...}` até `data: [DONE]`),
+ * repassando cada trecho e montando um corpo igual ao da resposta sem streaming.
+ */
+function lerStreamSSE(
+    stream: Readable,
+    aoFragmento: (texto: string) => void,
+    lerEvento: (evento: any) => EventoStream,
+    signal: AbortSignal | undefined,
+    restanteMs: number
+): Promise<any> {
+    return new Promise((resolve, reject) => {
+        const decoder = new StringDecoder('utf8');
+        const inicio = Date.now();
+        let buffer = '';
+        let conteudo = '';
+        let usage: any;
+        let finalizado = false;
+
+        const terminar = (erro?: Error) => {
+            if (finalizado) return;
+            finalizado = true;
+            if (timer) clearTimeout(timer);
+            signal?.removeEventListener('abort', aoAbortar);
+            if (erro) {
+                stream.destroy();
+                reject(erro);
+            } else {
+                resolve({ choices: [{ message: { role: 'assistant', content: conteudo } }], usage });
+            }
+        };
+        const aoAbortar = () => terminar(erroDoSinal(signal));
+        // O timeout do axios só cobre a chegada dos headers; o corpo tem o próprio limite
+        const timer = Number.isFinite(restanteMs)
+            ? setTimeout(() => terminar(new TempoEsgotadoError('Tempo esgotado durante o streaming da resposta do LLM.')), restanteMs)
+            : undefined;
+        if (signal?.aborted) return aoAbortar();
+        signal?.addEventListener('abort', aoAbortar, { once: true });
+
+        stream.on('data', (chunk: Buffer) => {
+            buffer += decoder.write(chunk);
+            const linhas = buffer.split('\n');
+            buffer = linhas.pop() || '';
+            for (const linha of linhas) {
+                const dado = linha.trim();
+                if (!dado.startsWith('data:')) continue;
+                const payload = dado.slice(5).trim();
+                if (payload === '[DONE]') return terminar();
+                let evento: any;
+                try {
+                    evento = JSON.parse(payload);
+                } catch {
+                    continue; // keep-alive ou linha malformada
+                }
+                const lido = lerEvento(evento);
+                if (lido.usage) usage = lido.usage;
+                const trecho = lido.trecho;
+                if (!trecho) continue;
+                if (!conteudo) registrarDuracao('llm.ttft', Date.now() - inicio);
+                conteudo += trecho;
+                try {
+                    aoFragmento(trecho);
+                } catch (erro: any) {
+                    console.warn('Falha ao processar trecho do streaming:', erro.message);
+                }
+            }
+        });
+        stream.on('end', () => terminar());
+        stream.on('error', (erro: Error) => terminar(erro));
+    });
+}
+
+/**
+ * Base dos clientes HTTP: cota, concorrência adaptativa, retry e streaming são
+ * comuns; cada provedor só traduz a requisição e a resposta.
+ */
+export abstract class ClienteLLMHttp implements LLMClient {
+    abstract readonly provedor: string;
+    private readonly requisicoes: BaldeDeTokens;
+    private readonly tokens: BaldeDeTokens;
+    private readonly concorrencia = new LimitadorAIMD();
+    private pausadoAte = 0;
+
+    constructor(readonly modelo: string, cota: { rpm: number; tpm: number }) {
+        this.requisicoes = new BaldeDeTokens(cota.rpm);
+        this.tokens = new BaldeDeTokens(cota.tpm);
+        registrarMedidor(`llm.${modelo}.limite_concorrencia`, () => Math.floor(this.concorrencia.limite));
+        registrarMedidor(`llm.${modelo}.em_uso`, () => this.concorrencia.emUso);
+    }
+
+    abstract get configurado(): boolean;
+
+    /** URL, headers e corpo no formato da API do provedor. */
+    protected abstract montarRequisicao(body: any, streaming: boolean): Promise<RequisicaoHttp>;
+
+    /** Texto e uso de um evento do streaming. */
+    protected abstract lerEvento(evento: any): EventoStream;
+
+    /** Converte o corpo da resposta para o formato do chat completions. */
+    protected converterResposta(data: any): any {
+        return data;
+    }
+
+    /** Aguarda cota (pausa por 429, RPM e TPM) sem ultrapassar o prazo. */
+    private async aguardarCota(tokensEstimados: number, limite: number, signal?: AbortSignal) {
+        const inicio = Date.now();
+        for (;;) {
+            const espera = Math.max(
+                this.pausadoAte - Date.now(),
+                this.requisicoes.tempoAte(1),
+                this.tokens.tempoAte(tokensEstimados)
+            );
+            if (espera <= 0) break;
+            if (Date.now() + espera > limite) {
+                throw new TempoEsgotadoError(`Cota de ${this.provedor} (${this.modelo}) indisponível dentro do prazo.`);
+            }
+            await esperar(espera, signal);
+        }
+        this.requisicoes.consumir(1);
+        this.tokens.consumir(tokensEstimados);
+        registrarDuracao('llm.espera_cota', Date.now() - inicio);
+    }
+
+    private aplicarHeaders(headers: Record<string, any> = {}) {
+        const reqRestantes = lerNumero(headers['x-ratelimit-remaining-requests']);
+        const tokRestantes = lerNumero(headers['x-ratelimit-remaining-tokens']);
+        if (reqRestantes !== undefined) this.requisicoes.ajustarRestante(reqRestantes);
+        if (tokRestantes !== undefined) this.tokens.ajustarRestante(tokRestantes);
+        // Sem cota configurada, o único sinal é o servidor dizer que zerou
+        if (reqRestantes === 0 || tokRestantes === 0) {
+            this.pausadoAte = Math.max(this.pausadoAte, Date.now() + (lerRetryAfterMs(headers) ?? 1000));
+        }
+    }
+
+    async completar(body: any, opcoes: OpcoesRequisicao = {}): Promise<RespostaProvedor> {
+        const { signal, timeoutMs, aoFragmento } = opcoes;
+        const maxTentativas = opcoes.maxTentativas ?? MAX_TENTATIVAS;
+        const limite = timeoutMs !== undefined ? Date.now() + timeoutMs : Infinity;
+        const tokensEstimados = estimarTokens(body);
+        const { url, headers, corpo } = await this.montarRequisicao(body, Boolean(aoFragmento));
+
+        for (let tentativa = 1; ; tentativa++) {
+            lancarSeCancelado(signal);
+            await this.concorrencia.adquirir(signal);
+            let atrasoMs = 0;
+            try {
+                await this.aguardarCota(tokensEstimados, limite, signal);
+                const restante = limite - Date.now();
+                if (restante <= 0) throw new TempoEsgotadoError(`Prazo esgotado antes da chamada a ${this.provedor}.`);
+
+                const inicio = Date.now();
+                incrementar('llm.tentativas');
+                const response: AxiosResponse = await clienteHttp.post(url, corpo, {
+                    headers,
+                    signal,
+                    timeout: Number.isFinite(restante) ? restante : undefined,
+                    responseType: aoFragmento ? 'stream' : 'json'
+                });
+                if (aoFragmento) {
+                    // Depois do primeiro trecho entregue não há retry: o chamador já consumiu parte da resposta
+                    response.data = await lerStreamSSE(response.data, aoFragmento, e => this.lerEvento(e), signal, limite - Date.now());
+                } else {
+                    response.data = this.converterResposta(response.data);
+                }
+                registrarDuracao('llm.latencia', Date.now() - inicio);
+
+                this.aplicarHeaders(response.headers);
+                this.concorrencia.sucesso();
+                // Ajusta a estimativa ao consumo real informado pela API
+                const usados = response.data?.usage?.total_tokens;
+                if (typeof usados === 'number') this.tokens.devolver(tokensEstimados - usados);
+                return { data: response.data, headers: response.headers as Record<string, any>, provedor: this.provedor, modelo: this.modelo };
+            } catch (error: any) {
+                if (aoFragmento && error.response?.data instanceof Readable) {
+                    error.response.data = await lerCorpoStream(error.response.data);
+                }
+                const status = error.response?.status;
+                const redeInstavel = axios.isAxiosError(error) && !error.response && error.code !== 'ECONNABORTED' && error.code !== 'ERR_CANCELED';
+                if (!(STATUS_RETENTAVEIS.has(status) || redeInstavel) || tentativa >= maxTentativas) throw error;
+
+                const sugerido = lerRetryAfterMs(error.response?.headers);
+                if (status === 429) {
+                    incrementar('llm.retry.429');
+                    this.concorrencia.limitado();
+                    this.pausadoAte = Math.max(this.pausadoAte, Date.now() + (sugerido ?? RETRY_BASE_MS));
+                } else {
+                    incrementar(status ? 'llm.retry.5xx' : 'llm.retry.rede');
+                }
+                // "Full jitter": espera aleatória até o teto exponencial, ou o que o servidor pediu
+                const exponencial = Math.min(RETRY_TETO_MS, RETRY_BASE_MS * 2 ** (tentativa - 1));
+                atrasoMs = sugerido ?? Math.random() * exponencial;
+                if (Date.now() + atrasoMs >= limite) throw error; // não há tempo para outra tentativa
+            } finally {
+                this.concorrencia.liberar();
+            }
+            console.warn(`${this.provedor} (${this.modelo}): nova tentativa ${tentativa + 1}/${maxTentativas} em ${Math.round(atrasoMs)} ms.`);
+            await esperar(atrasoMs, signal);
+        }
+    }
+}
+
+export class ClienteAzureOpenAI extends ClienteLLMHttp {
+    readonly provedor = 'azure';
+
+    constructor(readonly deployment: string) {
+        super(deployment, { rpm: RPM, tpm: TPM });
+    }
+
+    get configurado(): boolean {
+        return Boolean(azureEndpoint && azureKey && this.deployment);
+    }
+
+    get url(): string {
+        return `${azureEndpoint.replace(/\/+$/, '')}/openai/deployments/${encodeURIComponent(this.deployment)}/chat/completions?api-version=${azureApiVersion}`;
+    }
+
+    protected async montarRequisicao(body: any, streaming: boolean): Promise<RequisicaoHttp> {
+        return {
+            url: this.url,
+            headers: { 'Content-Type': 'application/json', 'api-key': azureKey },
+            corpo: streaming ? { ...body, stream: true, stream_options: { include_usage: true } } : body,
+        };
+    }
+
+    protected lerEvento(evento: any): EventoStream {
+        return { trecho: evento.choices?.[0]?.delta?.content, usage: evento.usage };
+    }
+}
+
+const clientes = new Map<string, ClienteAzureOpenAI>();
+
+/** Um cliente por deployment: cota e concorrência são por deployment no Azure. */
+export function obterClienteAzure(deployment = process.env.AZURE_OPENAI_DEPLOYMENT || ''): ClienteAzureOpenAI {
+    let cliente = clientes.get(deployment);
+    if (!cliente) {
+        cliente = new ClienteAzureOpenAI(deployment);
+        clientes.set(deployment, cliente);
+    }
+    return cliente;
+}
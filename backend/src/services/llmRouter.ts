@@ -0,0 +1,341 @@
+// llmRouter.ts
+// Roteador entre provedores de LLM (Azure OpenAI, Gemini no Vertex AI) atrás do
+// mesmo contrato LLMClient. Mantém, por provedor e modelo, latência e taxa de
+// erro numa janela deslizante e o custo acumulado; escolhe a ordem de tentativa
+// pela política (mais barato saudável, mais rápido ou fixo) e, em 429/5xx,
+// passa para o próximo provedor (failover) ou dispara um segundo pedido
+// quando o primeiro demora (hedge).
+
+import { CancelamentoError, erroDoSinal, foiCancelado } from './cancelamento';
+import { erroRetentavel, lerRetryAfterMs, LLMClient, obterClienteAzure, OpcoesRequisicao, RespostaProvedor } from './llmClient';
+import { obterClienteGemini } from './geminiClient';
+import { incrementar, registrarDuracao } from './metricasService';
+
+export type PoliticaRoteamento = 'mais-barato' | 'mais-rapido' | 'fixo';
+// Camada de modelo por tarefa: 'pequeno' (rápido e barato: correção, formatação)
+// e 'grande' (avaliação pela rubrica). Sem configuração, ambas usam o mesmo modelo.
+export type CamadaModelo = 'pequeno' | 'grande';
+
+const PROVEDORES = (process.env.LLM_PROVEDORES || 'azure').split(',').map(p => p.trim()).filter(Boolean);
+const POLITICAS: PoliticaRoteamento[] = ['mais-barato', 'mais-rapido', 'fixo'];
+const POLITICA: PoliticaRoteamento = POLITICAS.includes(process.env.LLM_POLITICA as PoliticaRoteamento)
+    ? (process.env.LLM_POLITICA as PoliticaRoteamento)
+    : 'mais-barato';
+const PROVEDOR_FIXO = process.env.LLM_PROVEDOR_FIXO || PROVEDORES[0];
+// Sem resposta do primeiro provedor neste tempo, dispara o segundo em paralelo (0 = desligado)
+const HEDGE_MS = Number(process.env.LLM_HEDGE_MS) || 0;
+const JANELA = Number(process.env.LLM_ROTEADOR_JANELA) || 50;
+const MIN_AMOSTRAS = 5;
+const MAX_TAXA_ERRO = Number(process.env.LLM_ROTEADOR_MAX_TAXA_ERRO) || 0.5;
+const QUARENTENA_MS = Number(process.env.LLM_ROTEADOR_QUARENTENA_MS) || 30000;
+
+const MODELOS_POR_CAMADA: Record<CamadaModelo, { azure?: string; gemini?: string }> = {
+    grande: {
+        azure: process.env.AZURE_OPENAI_DEPLOYMENT_GRANDE || undefined,
+        gemini: process.env.GEMINI_MODELO_GRANDE || undefined,
+    },
+    pequeno: {
+        azure: process.env.AZURE_OPENAI_DEPLOYMENT_PEQUENO || process.env.AZURE_OPENAI_DEPLOYMENT_GRANDE || undefined,
+        gemini: process.env.GEMINI_MODELO_PEQUENO || process.env.GEMINI_MODELO_GRANDE || undefined,
+    },
+};
+
+type Preco = { entrada: number; saida: number };
+
+// Preço em US$ por 1000 tokens (entrada, saída), configurável por provedor
+const PRECOS: Record<string, Preco> = {
+    azure: {
+        entrada: Number(process.env.AZURE_OPENAI_PRECO_ENTRADA_1K) || 0.0025,
+        saida: Number(process.env.AZURE_OPENAI_PRECO_SAIDA_1K) || 0.01,
+    },
+    gemini: {
+        entrada: Number(process.env.GEMINI_PRECO_ENTRADA_1K) || 0.000075,
+        saida: Number(process.env.GEMINI_PRECO_SAIDA_1K) || 0.0003,
+    },
+};
+
+// Preço por modelo/deployment (camadas com modelos diferentes), ex.:
+// LLM_PRECOS_1K={"gpt-4o-mini":{"entrada":0.00015,"saida":0.0006}}
+const PRECOS_POR_MODELO: Record<string, Preco> = (() => {
+    try {
+        return JSON.parse(process.env.LLM_PRECOS_1K || '{}');
+    } catch {
+        console.warn('⚠️ LLM_PRECOS_1K não é um JSON válido; usando os preços por provedor.');
+        return {};
+    }
+})();
+
+const precoDe = (provedor: string, modelo: string): Preco =>
+    PRECOS_POR_MODELO[modelo] || PRECOS[provedor] || { entrada: 0, saida: 0 };
+
+/** Custo em US$ de uma chamada, pelo uso informado (formato chat completions). */
+export function custoChamada(provedor: string, modelo: string, usage: any = {}): number {
+    const preco = precoDe(provedor, modelo);
+    return ((usage.prompt_tokens || 0) * preco.entrada + (usage.completion_tokens || 0) * preco.saida) / 1000;
+}
+
+class EstatisticasProvedor {
+    private amostras: Array<{ ms: number; erro: boolean }> = [];
+    chamadas = 0;
+    falhas = 0;
+    custoUsd = 0;
+    quarentenaAte = 0;
+
+    registrar(ms: number, erro: boolean, custoUsd = 0) {
+        this.chamadas++;
+        if (erro) this.falhas++;
+        this.custoUsd += custoUsd;
+        this.amostras.push({ ms, erro });
+        if (this.amostras.length > JANELA) this.amostras.shift();
+        // Muitos erros recentes: fica de fora por um tempo e volta com a janela zerada
+        if (this.amostras.length >= MIN_AMOSTRAS && this.taxaErro > MAX_TAXA_ERRO) {
+            this.colocarEmQuarentena(QUARENTENA_MS);
+        }
+    }
+
+    colocarEmQuarentena(ms: number) {
+        this.quarentenaAte = Math.max(this.quarentenaAte, Date.now() + ms);
+        this.amostras = [];
+    }
+
+    get taxaErro(): number {
+        return this.amostras.length ? this.amostras.filter(a => a.erro).length / this.amostras.length : 0;
+    }
+
+    // Sem amostras a latência é desconhecida (0): o provedor novo é experimentado primeiro
+    get latenciaMedia(): number {
+        const sucessos = this.amostras.filter(a => !a.erro);
+        return sucessos.length ? sucessos.reduce((s, a) => s + a.ms, 0) / sucessos.length : 0;
+    }
+
+    saudavel(agora = Date.now()): boolean {
+        return this.quarentenaAte <= agora;
+    }
+}
+
+// Compartilhadas entre roteadores (ex.: um por camada de modelo) para o mesmo provedor/modelo
+const estatisticas = new Map<string, EstatisticasProvedor>();
+
+function estatisticasDe(cliente: LLMClient): EstatisticasProvedor {
+    const chave = `${cliente.provedor}:${cliente.modelo}`;
+    let estat = estatisticas.get(chave);
+    if (!estat) {
+        estat = new EstatisticasProvedor();
+        estatisticas.set(chave, estat);
+    }
+    return estat;
+}
+
+/** Estado dos provedores para GET /metricas. */
+export function obterEstatisticasProvedores() {
+    const agora = Date.now();
+    return Object.fromEntries([...estatisticas].map(([chave, e]) => [chave, {
+        chamadas: e.chamadas,
+        falhas: e.falhas,
+        taxaErroRecente: Math.round(e.taxaErro * 100) / 100,
+        latenciaMediaMs: Math.round(e.latenciaMedia),
+        custoUsd: Math.round(e.custoUsd * 10000) / 10000,
+        saudavel: e.saudavel(agora),
+        quarentenaRestanteMs: Math.max(0, e.quarentenaAte - agora),
+    }]));
+}
+
+const descreverErro = (error: any): string =>
+    error?.response?.status ? `status ${error.response.status}` : error?.code || error?.message || 'erro';
+
+export class RoteadorLLM implements LLMClient {
+    readonly provedor = 'roteador';
+
+    constructor(private readonly clientes: LLMClient[], private readonly politica: PoliticaRoteamento = POLITICA) {}
+
+    get modelo(): string {
+        return this.clientes.map(c => c.modelo).join('+');
+    }
+
+    get configurado(): boolean {
+        return this.clientes.some(c => c.configurado);
+    }
+
+    /** Ordem de tentativa: saudáveis pela política; os em quarentena ficam como último recurso. */
+    ordenar(body: any): LLMClient[] {
+        const agora = Date.now();
+        const configurados = this.clientes.filter(c => c.configurado);
+        const tokensEntrada = Math.ceil(JSON.stringify(body.messages || '').length / 4);
+        const tokensSaida = body.max_completion_tokens || body.max_tokens || 0;
+        const criterio = (c: LLMClient): number => {
+            if (this.politica === 'fixo') return c.provedor === PROVEDOR_FIXO ? 0 : 1;
+            if (this.politica === 'mais-rapido') return estatisticasDe(c).latenciaMedia;
+            const preco = precoDe(c.provedor, c.modelo);
+            return tokensEntrada * preco.entrada + tokensSaida * preco.saida;
+        };
+        const saudaveis = configurados.filter(c => estatisticasDe(c).saudavel(agora));
+        const emQuarentena = configurados.filter(c => !estatisticasDe(c).saudavel(agora));
+        return [
+            ...saudaveis.sort((a, b) => criterio(a) - criterio(b) || estatisticasDe(a).latenciaMedia - estatisticasDe(b).latenciaMedia),
+            ...emQuarentena.sort((a, b) => estatisticasDe(a).quarentenaAte - estatisticasDe(b).quarentenaAte),
+        ];
+    }
+
+    private async executar(cliente: LLMClient, body: any, opcoes: OpcoesRequisicao): Promise<RespostaProvedor> {
+        const estat = estatisticasDe(cliente);
+        const inicio = Date.now();
+        try {
+            const resposta = await cliente.completar(body, opcoes);
+            const ms = Date.now() - inicio;
+            const custo = custoChamada(cliente.provedor, cliente.modelo, resposta.data?.usage);
+            estat.registrar(ms, false, custo);
+            registrarDuracao(`llm.roteador.${cliente.provedor}.latencia`, ms);
+            incrementar(`llm.roteador.${cliente.provedor}.chamadas`);
+            incrementar(`llm.roteador.${cliente.provedor}.custo_micro_usd`, Math.round(custo * 1e6));
+            return resposta;
+        } catch (error: any) {
+            // Cancelamento (inclusive do pedido perdedor do hedge) não é falha do provedor
+            if (!foiCancelado(error)) {
+                estat.registrar(Date.now() - inicio, erroRetentavel(error));
+                incrementar(`llm.roteador.${cliente.provedor}.falhas`);
+                if (error?.response?.status === 429) {
+                    estat.colocarEmQuarentena(Math.min(QUARENTENA_MS, lerRetryAfterMs(error.response.headers) ?? QUARENTENA_MS));
+                }
+            }
+            throw error;
+        }
+    }
+
+    async completar(body: any, opcoes: OpcoesRequisicao = {}): Promise<RespostaProvedor> {
+        const ordem = this.ordenar(body);
+        if (ordem.length === 0) throw new Error('Nenhum provedor de LLM configurado.');
+        if (ordem.length === 1) return this.executar(ordem[0], body, opcoes);
+        if (HEDGE_MS > 0 && !opcoes.aoFragmento) return this.completarComHedge(ordem, body, opcoes);
+
+        const limite = opcoes.timeoutMs !== undefined ? Date.now() + opcoes.timeoutMs : Infinity;
+        // Streaming: depois do primeiro trecho entregue não dá para trocar de provedor
+        let entregou = false;
+        const aoFragmento = opcoes.aoFragmento && ((texto: string) => { entregou = true; opcoes.aoFragmento!(texto); });
+
+        for (let i = 0; ; i++) {
+            const ultimo = i === ordem.length - 1;
+            try {
+                return await this.executar(ordem[i], body, {
+                    ...opcoes,
+                    aoFragmento,
+                    timeoutMs: Number.isFinite(limite) ? limite - Date.now() : undefined,
+                    // Só o último provedor gasta todas as tentativas; os outros cedem a vez no primeiro erro
+                    maxTentativas: ultimo ? opcoes.maxTentativas : 1,
+                });
+            } catch (error: any) {
+                if (ultimo || entregou || foiCancelado(error) || !erroRetentavel(error) || Date.now() >= limite) throw error;
+                incrementar('llm.roteador.failover');
+                console.warn(`🔀 ${ordem[i].provedor} (${ordem[i].modelo}) falhou (${descreverErro(error)}); tentando ${ordem[i + 1].provedor} (${ordem[i + 1].modelo}).`);
+            }
+        }
+    }
+
+    /**
+     * Hedge: dispara o próximo provedor se o atual não responder em HEDGE_MS ou
+     * falhar com erro transitório; a primeira resposta vence e as demais são canceladas.
+     * Todos dividem o mesmo prazo (`timeoutMs` da chamada) e a chamada só falha depois
+     * que todos os pedidos em voo terminarem.
+     */
+    private completarComHedge(ordem: LLMClient[], body: any, opcoes: OpcoesRequisicao): Promise<RespostaProvedor> {
+        const { signal } = opcoes;
+        const limite = opcoes.timeoutMs !== undefined ? Date.now() + opcoes.timeoutMs : Infinity;
+        return new Promise((resolve, reject) => {
+            const controllers: AbortController[] = [];
+            let emAndamento = 0;
+            let terminado = false;
+            // Depois de um erro definitivo não há novos disparos, só a espera pelos que estão em voo
+            let aceitaNovos = true;
+            let ultimoErro: any;
+            let erroDefinitivo: any;
+            let timer: NodeJS.Timeout | undefined;
+
+            const encerrar = () => {
+                terminado = true;
+                if (timer) clearTimeout(timer);
+                signal?.removeEventListener('abort', aoAbortar);
+                controllers.forEach(c => c.abort(new CancelamentoError('hedge')));
+            };
+            const aoAbortar = () => {
+                if (terminado) return;
+                encerrar();
+                reject(erroDoSinal(signal));
+            };
+            if (signal?.aborted) return aoAbortar();
+            signal?.addEventListener('abort', aoAbortar, { once: true });
+
+            const disparar = () => {
+                if (timer) clearTimeout(timer);
+                const indice = controllers.length;
+                if (terminado || !aceitaNovos || indice >= ordem.length) return;
+                // O primeiro pedido sempre sai; hedges só enquanto houver prazo
+                if (indice > 0 && Date.now() >= limite) return;
+                const controller = new AbortController();
+                controllers.push(controller);
+                emAndamento++;
+                if (indice > 0) incrementar('llm.roteador.hedge');
+                this.executar(ordem[indice], body, {
+                    ...opcoes,
+                    signal: signal ? AbortSignal.any([signal, controller.signal]) : controller.signal,
+                    timeoutMs: Number.isFinite(limite) ? Math.max(0, limite - Date.now()) : undefined,
+                    maxTentativas: indice === ordem.length - 1 ? opcoes.maxTentativas : 1,
+                }).then(resposta => {
+                    emAndamento--;
+                    if (terminado) return;
+                    if (indice > 0) incrementar('llm.roteador.hedge.venceu');
+                    encerrar();
+                    resolve(resposta);
+                }, error => {
+                    emAndamento--;
+                    if (terminado) return;
+                    ultimoErro = error;
+                    const retentavel = !foiCancelado(error) && erroRetentavel(error);
+                    if (retentavel && aceitaNovos && controllers.length < ordem.length && Date.now() < limite) {
+                        incrementar('llm.roteador.failover');
+                        return disparar();
+                    }
+                    if (!retentavel) {
+                        aceitaNovos = false;
+                        if (!erroDefinitivo) erroDefinitivo = error;
+                        if (timer) clearTimeout(timer);
+                    }
+                    if (emAndamento === 0) {
+                        encerrar();
+                        reject(erroDefinitivo ?? ultimoErro);
+                    }
+                });
+                if (controllers.length < ordem.length) {
+                    timer = setTimeout(disparar, HEDGE_MS);
+                    timer.unref?.();
+                }
+            };
+            disparar();
+        });
+    }
+}
+
+const roteadores = new Map<CamadaModelo, RoteadorLLM>();
+
+/** Indica se as camadas usam modelos diferentes (senão, escalar não muda nada). */
+export function camadasDistintas(): boolean {
+    return obterClienteLLM('pequeno').modelo !== obterClienteLLM('grande').modelo;
+}
+
+/**
+ * Cliente usado por chamarLLM: roteia entre os provedores de LLM_PROVEDORES
+ * (padrão: só o Azure), com os modelos da camada pedida.
+ */
+export function obterClienteLLM(camada: CamadaModelo = 'grande'): RoteadorLLM {
+    let roteador = roteadores.get(camada);
+    if (!roteador) {
+        const modelos = MODELOS_POR_CAMADA[camada];
+        const clientes: LLMClient[] = [];
+        for (const provedor of PROVEDORES) {
+            if (provedor === 'azure') clientes.push(obterClienteAzure(modelos.azure));
+            else if (provedor === 'gemini') clientes.push(obterClienteGemini(modelos.gemini));
+            else console.warn(`⚠️ Provedor de LLM desconhecido em LLM_PROVEDORES: ${provedor}`);
+        }
+        roteador = new RoteadorLLM(clientes);
+        roteadores.set(camada, roteador);
+    }
+    return roteador;
+}
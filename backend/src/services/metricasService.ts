@@ -0,0 +1,58 @@
+// metricasService.ts
+// Contadores e amostras de duração em memória, expostos em GET /metricas.
+
+const MAX_AMOSTRAS = 1000;
+
+const contadores = new Map<string, number>();
+const duracoes = new Map<string, number[]>();
+// Medidores: valores instantâneos lidos no momento da consulta (ex.: pipelines em execução)
+const medidores = new Map<string, () => number>();
+
+export function incrementar(nome: string, valor = 1): void {
+    contadores.set(nome, (contadores.get(nome) || 0) + valor);
+}
+
+export function registrarDuracao(nome: string, ms: number): void {
+    let amostras = duracoes.get(nome);
+    if (!amostras) {
+        amostras = [];
+        duracoes.set(nome, amostras);
+    }
+    amostras.push(ms);
+    // Mantém apenas as amostras mais recentes (janela deslizante)
+    if (amostras.length > MAX_AMOSTRAS) amostras.shift();
+}
+
+export function registrarMedidor(nome: string, leitura: () => number): void {
+    medidores.set(nome, leitura);
+}
+
+export function obterContador(nome: string): number {
+    return contadores.get(nome) || 0;
+}
+
+const percentil = (ordenadas: number[], p: number): number => {
+    if (ordenadas.length === 0) return 0;
+    const idx = Math.min(ordenadas.length - 1, Math.ceil((p / 100) * ordenadas.length) - 1);
+    return ordenadas[Math.max(0, idx)];
+};
+
+export function obterMetricas() {
+    const resumoDuracoes: Record<string, { n: number; media: number; p50: number; p95: number; p99: number }> = {};
+    for (const [nome, amostras] of duracoes) {
+        const ordenadas = [...amostras].sort((a, b) => a - b);
+        const soma = ordenadas.reduce((s, v) => s + v, 0);
+        resumoDuracoes[nome] = {
+            n: ordenadas.length,
+            media: ordenadas.length ? Math.round(soma / ordenadas.length) : 0,
+            p50: percentil(ordenadas, 50),
+            p95: percentil(ordenadas, 95),
+            p99: percentil(ordenadas, 99),
+        };
+    }
+    const valoresMedidores: Record<string, number> = {};
+    for (const [nome, leitura] of medidores) valoresMedidores[nome] = leitura();
+    return { contadores: Object.fromEntries(contadores), duracoes: resumoDuracoes, medidores: valoresMedidores };
+}
+
+export default { incrementar, registrarDuracao, registrarMedidor, obterContador, obterMetricas };
@@ -1,6 +1,10 @@
 import sharp from 'sharp';
 import googleVisionService from './googleVisionService';
 import fetch from 'node-fetch';
+import { executarUmaVez, hashConteudo } from './singleFlight';
+import { CancelamentoError, erroDoSinal, foiCancelado, foiTempoEsgotado } from './cancelamento';
+import { OpcoesExecucao } from './prazo';
+import { incrementar } from './metricasService';
 
 const posProcessarTextoManuscrito = (texto: string): string => {
     let textoCorrigido = texto;
@@ -81,7 +85,7 @@ const corrigirPalavrasFragmentadas = (texto: string): string => {
     return textoCorrigido;
 };
 
-const ocrCache = new Map<string, Promise<OCRResult>>();
+const ocrCache = new Map<string, OCRResult>();
 
 // Interface para o resultado do OCR
 export type OCRResult = {
@@ -125,12 +129,12 @@ const filtrarTextoOCR = (text: string, isHandwritten: boolean): string => {
     return linhasFiltradas.join('\n');
 };
 
-async function carregarBufferDeImagem(imageUrl: string): Promise<Buffer> {
+async function carregarBufferDeImagem(imageUrl: string, timeoutMs?: number, signal?: AbortSignal): Promise<Buffer> {
     if (imageUrl.startsWith('data:')) {
         const base64 = imageUrl.split(',')[1] || '';
         return Buffer.from(base64, 'base64');
     } else if (/^https?:\/\//.test(imageUrl)) {
-        const resp = await fetch(imageUrl);
+        const resp = await fetch(imageUrl, { timeout: timeoutMs || 0, signal });
         if (!resp.ok) throw new Error(`Falha ao baixar imagem: ${resp.statusText}`);
         return Buffer.from(await resp.arrayBuffer());
     } else {
@@ -139,53 +143,85 @@ async function carregarBufferDeImagem(imageUrl: string): Promise<Buffer> {
     }
 }
 
-export const extrairTextoDaImagem = async (imageUrl: string): Promise<OCRResult> => {
-    const cacheKey = imageUrl.slice(0, 300); // Usar parte da URL como chave de cache
-    if (ocrCache.has(cacheKey)) {
-        return ocrCache.get(cacheKey)!;
+// Versão do pipeline de OCR (pré-processamento + filtros); entra na chave do cache
+const VERSAO_OCR = 'ocr-v1';
+// Teto do OCR dentro do prazo da requisição (download + Google Vision)
+const OCR_TETO_MS = Number(process.env.PRAZO_TETO_OCR_MS) || 20000;
+
+export const extrairTextoDaImagem = async (imageUrl: string, opcoes: OpcoesExecucao = {}): Promise<OCRResult> => {
+    const { signal, prazo } = opcoes;
+    const timeoutMs = prazo?.timeoutEtapa(OCR_TETO_MS);
+    if (timeoutMs === 0) {
+        // Sem OCR não há redação: a rota responde 504 em vez de "texto insuficiente"
+        incrementar('prazo.etapa_pulada.ocr');
+        throw new CancelamentoError('timeout');
+    }
+    let originalBuffer: Buffer;
+    try {
+        originalBuffer = await carregarBufferDeImagem(imageUrl, timeoutMs, signal);
+    } catch (error: any) {
+        // Download abortado (prazo, desconexão): propaga o motivo do sinal
+        if (foiCancelado(error)) throw signal?.aborted ? erroDoSinal(signal) : error;
+        // Timeout da etapa (dispara antes do sinal do prazo, por causa da reserva): não é imagem ruim
+        if (foiTempoEsgotado(error)) throw new CancelamentoError('timeout');
+        console.error('Erro ao carregar imagem para OCR:', error);
+        return { text: `Erro ao processar imagem para OCR: ${error.message}`, confidence: 0, engine: 'google-vision', isHandwritten: false };
     }
 
-    const ocrPromise: Promise<OCRResult> = (async () => {
-        try {
-            const originalBuffer = await carregarBufferDeImagem(imageUrl);
-
-            console.log("Aplicando pré-processamento avançado...");
-            // Pré-processamento mais agressivo para manuscritos
-            const processedBuffer = await sharp(originalBuffer)
-                .grayscale() // Converte para tons de cinza
-                .normalize() // Normaliza o contraste
-                .removeAlpha() // Remove canal alfa se houver (útil para fundos transparentes)
-                .sharpen() // Aumenta a nitidez
-                .toBuffer();
-            console.log("Imagem otimizada.");
-
-            const googleResult = await googleVisionService.extractTextWithGoogleVision(processedBuffer);
-
-            if (!googleResult || !googleResult.text) {
-                return { text: 'Google Vision não conseguiu extrair texto.', confidence: 0, engine: 'google-vision', isHandwritten: true };
-            }
-
-            // Aplica o novo filtro de texto após a extração
-            const filteredText = filtrarTextoOCR(googleResult.text, true); // Assumindo que essa rota é para manuscrito
-
-            // Heurística simples para verificar se realmente parece manuscrito
-            const wordCount = filteredText.split(/\s+/).filter(p => p.length > 1).length;
-            const isActuallyHandwritten = wordCount > 20; // Mais de 20 palavras filtradas, considera manuscrito
-
-            return {
-                text: filteredText,
-                confidence: googleResult.confidence,
-                engine: 'google-vision',
-                isHandwritten: isActuallyHandwritten
-            };
-
-        } catch (error: any) {
-            console.error('Erro crítico no serviço de OCR:', error);
-            // Retorna um resultado de erro, mas mantém a estrutura de OCRResult
-            return { text: `Erro ao processar imagem para OCR: ${error.message}`, confidence: 0, engine: 'google-vision', isHandwritten: false };
+    // A chave é o hash do conteúdo da imagem: a mesma foto enviada em requisições
+    // concorrentes (ou por usuários diferentes) reaproveita o mesmo OCR.
+    const cacheKey = `${VERSAO_OCR}:${hashConteudo(originalBuffer)}`;
+    const cacheado = ocrCache.get(cacheKey);
+    if (cacheado) {
+        incrementar('ocr.cache.hit');
+        return cacheado;
+    }
+    incrementar('ocr.cache.miss');
+
+    return executarUmaVez(`ocr:${cacheKey}`, async sinal => {
+        const resultado = await processarImagem(originalBuffer, sinal, prazo?.timeoutEtapa(OCR_TETO_MS));
+        // Falhas não ficam no cache, para que um novo envio possa tentar de novo
+        if (resultado.confidence > 0) ocrCache.set(cacheKey, resultado);
+        return resultado;
+    }, signal);
+};
+
+const processarImagem = async (originalBuffer: Buffer, signal?: AbortSignal, timeoutMs?: number): Promise<OCRResult> => {
+    try {
+        console.log("Aplicando pré-processamento avançado...");
+        // Pré-processamento mais agressivo para manuscritos
+        const processedBuffer = await sharp(originalBuffer)
+            .grayscale() // Converte para tons de cinza
+            .normalize() // Normaliza o contraste
+            .removeAlpha() // Remove canal alfa se houver (útil para fundos transparentes)
+            .sharpen() // Aumenta a nitidez
+            .toBuffer();
+        console.log("Imagem otimizada.");
+
+        const googleResult = await googleVisionService.extractTextWithGoogleVision(processedBuffer, signal, timeoutMs);
+
+        if (!googleResult || !googleResult.text) {
+            return { text: 'Google Vision não conseguiu extrair texto.', confidence: 0, engine: 'google-vision', isHandwritten: true };
         }
-    })();
 
-    ocrCache.set(cacheKey, ocrPromise); // Cacheia a promessa
-    return ocrPromise;
+        // Aplica o novo filtro de texto após a extração
+        const filteredText = filtrarTextoOCR(googleResult.text, true); // Assumindo que essa rota é para manuscrito
+
+        // Heurística simples para verificar se realmente parece manuscrito
+        const wordCount = filteredText.split(/\s+/).filter(p => p.length > 1).length;
+        const isActuallyHandwritten = wordCount > 20; // Mais de 20 palavras filtradas, considera manuscrito
+
+        return {
+            text: filteredText,
+            confidence: googleResult.confidence,
+            engine: 'google-vision',
+            isHandwritten: isActuallyHandwritten
+        };
+
+    } catch (error: any) {
+        if (foiCancelado(error)) throw error;
+        console.error('Erro crítico no serviço de OCR:', error);
+        // Retorna um resultado de erro, mas mantém a estrutura de OCRResult
+        return { text: `Erro ao processar imagem para OCR: ${error.message}`, confidence: 0, engine: 'google-vision', isHandwritten: false };
+    }
 };
\ No newline at end of file
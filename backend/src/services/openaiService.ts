@@ -1,32 +1,237 @@
 import OpenAI from 'openai';
 import axios from 'axios';
-import https from 'https';
+import { executarUmaVez, hashConteudo, normalizarTexto } from './singleFlight';
+import { erroDoSinal, foiCancelado } from './cancelamento';
+import { incrementar, obterMetricas, registrarDuracao } from './metricasService';
+import { OpcoesExecucao } from './prazo';
+import { CamadaModelo, camadasDistintas, custoChamada, obterClienteLLM } from './llmRouter';
+import { chaveCacheLLM, gravarCacheLLM, lerCacheLLM } from './cacheLLMService';
+import { costurarJanelas, dividirEmJanelas, JanelaTexto } from './janelasTexto';
 
-const azureEndpoint = process.env.AZURE_OPENAI_ENDPOINT || '';
-const azureKey = process.env.AZURE_OPENAI_KEY || '';
-const azureDeployment = process.env.AZURE_OPENAI_DEPLOYMENT || '';
-const azureApiVersion = process.env.AZURE_OPENAI_API_VERSION || '2024-02-01';
+export const VERSAO_PROMPT_CORRECAO_OCR = 'correcao-ocr-v1';
+// Abaixo deste orçamento restante a correção é pulada (o texto do OCR segue direto)
+const CORRECAO_MIN_MS = Number(process.env.PRAZO_MIN_CORRECAO_MS) || 8000;
+const CORRECAO_TETO_MS = Number(process.env.PRAZO_TETO_CORRECAO_MS) || 30000;
 
-const httpsAgent = new https.Agent({
-    rejectUnauthorized: false
-});
+// Correção em blocos (opt-in): textos longos são divididos em janelas corrigidas em paralelo
+// (a concorrência e a cota continuam sob controle do cliente do LLM)
+export const VERSAO_PROMPT_CORRECAO_BLOCO = 'correcao-ocr-bloco-v1';
+const CORRECAO_EM_BLOCOS = process.env.CORRECAO_CHUNK === 'true';
+const CORRECAO_CHUNK_MIN_CARACTERES = Number(process.env.CORRECAO_CHUNK_MIN_CARACTERES) || 1500;
+const CORRECAO_CHUNK_CARACTERES = Number(process.env.CORRECAO_CHUNK_CARACTERES) || 700;
+const CORRECAO_CHUNK_SOBREPOSICAO = Number(process.env.CORRECAO_CHUNK_SOBREPOSICAO ?? 150);
+// Texto reescrito muito menor que o original indica resposta truncada ou resumida
+const RAZAO_MINIMA_TEXTO = 0.6;
 
-export async function chamarLLM(prompt: string, maxTokens = 2048, temperature = 0.3): Promise<string> {
+// Saída estruturada (response_format json_schema). Desligada por env ou automaticamente
+// quando o deployment/api-version recusa o parâmetro (cai para o parser tolerante).
+let jsonSchemaSuportado = process.env.LLM_JSON_SCHEMA !== 'false';
+
+export interface OpcoesLLM {
+    // Aborta a requisição HTTP em andamento (exclusão da redação, desconexão, timeout)
+    signal?: AbortSignal;
+    // Tempo máximo da chamada (normalmente derivado do Prazo da requisição)
+    timeoutMs?: number;
+    // Schema JSON que a resposta deve seguir (usado quando a API suporta json_schema)
+    formatoResposta?: { nome: string; schema: object };
+    // Identifica o uso (ex.: 'enem', 'correcao') nas métricas de tokens, custo e latência e no cache
+    rotulo?: string;
+    // Camada de modelo (padrão 'grande', o deployment principal)
+    camada?: CamadaModelo;
+    // Streaming: recebe cada trecho de texto assim que chega (numa resposta do cache, o texto inteiro)
+    aoFragmento?: (texto: string) => void;
+    // Cache persistente da resposta; `versaoPrompt` deve mudar junto com o template
+    cache?: {
+        versaoPrompt: string;
+        ttlMs?: number;
+        // Só grava respostas aceitas (ex.: JSON interpretável)
+        aceitar?: (texto: string) => boolean;
+    };
+}
+
+export interface MensagemLLM {
+    role: 'system' | 'user' | 'assistant';
+    content: string;
+}
+
+export interface UsoLLM {
+    promptTokens: number;
+    // Parte do prompt servida pelo cache de prefixo do provedor
+    cachedTokens: number;
+    completionTokens: number;
+}
+
+export interface RespostaLLM {
+    texto: string;
+    uso: UsoLLM;
+    doCache?: boolean;
+}
+
+function registrarUso(uso: UsoLLM, rotulo?: string): void {
+    for (const prefixo of rotulo ? ['llm', `llm.${rotulo}`] : ['llm']) {
+        incrementar(`${prefixo}.tokens.prompt`, uso.promptTokens);
+        incrementar(`${prefixo}.tokens.cache`, uso.cachedTokens);
+        incrementar(`${prefixo}.tokens.saida`, uso.completionTokens);
+    }
+}
+
+/** Texto reescrito (correção, formatação) que perdeu parte do original. */
+export const textoIncompleto = (resultado: string, original: string): boolean =>
+    resultado.trim().length < original.trim().length * RAZAO_MINIMA_TEXTO;
+
+/**
+ * Distância de edição (Levenshtein) em palavras entre dois textos, relativa ao
+ * maior deles: 0 = iguais, 1 = nada em comum. Espaçamento e quebras de linha
+ * não contam (o texto é normalizado antes).
+ */
+export function distanciaEdicaoRelativa(a: string, b: string): number {
+    const pa = normalizarTexto(a).split(/\s+/).filter(Boolean);
+    const pb = normalizarTexto(b).split(/\s+/).filter(Boolean);
+    const maior = Math.max(pa.length, pb.length);
+    if (maior === 0) return 0;
+    // Duas linhas da matriz bastam: O(n·m) de tempo, O(m) de memória
+    let anterior = Array.from({ length: pb.length + 1 }, (_, j) => j);
+    for (let i = 1; i <= pa.length; i++) {
+        const atual = [i];
+        for (let j = 1; j <= pb.length; j++) {
+            atual[j] = Math.min(anterior[j] + 1, atual[j - 1] + 1, anterior[j - 1] + (pa[i - 1] === pb[j - 1] ? 0 : 1));
+        }
+        anterior = atual;
+    }
+    return anterior[pb.length] / maior;
+}
+
+/** Escalada da camada pequena para a grande, por tarefa e motivo. */
+export function registrarEscalada(tarefa: string, motivo: 'validacao' | 'divergencia'): void {
+    incrementar(`llm.tarefa.${tarefa}.escaladas`);
+    incrementar(`llm.tarefa.${tarefa}.escaladas.${motivo}`);
+    console.log(`⬆️ ${tarefa}: escalando para o modelo grande (${motivo === 'validacao' ? 'resposta do modelo pequeno inválida' : 'corretores divergentes'}).`);
+}
+
+/** Chamadas, camadas, escaladas, custo e latência por tarefa (para GET /metricas). */
+export function obterResumoTarefasLLM() {
+    const { contadores, duracoes } = obterMetricas();
+    const tarefas = new Set(Object.keys(contadores).filter(c => /^llm\.tarefa\.[^.]+\.chamadas$/.test(c)).map(c => c.split('.')[2]));
+    const contador = (nome: string) => contadores[nome] || 0;
+    return Object.fromEntries([...tarefas].map(t => [t, {
+        chamadas: contador(`llm.tarefa.${t}.chamadas`),
+        doCache: contador(`llm.tarefa.${t}.cache`),
+        porCamada: { pequeno: contador(`llm.tarefa.${t}.pequeno.chamadas`), grande: contador(`llm.tarefa.${t}.grande.chamadas`) },
+        escaladas: contador(`llm.tarefa.${t}.escaladas`),
+        custoUsd: contador(`llm.tarefa.${t}.custo_micro_usd`) / 1e6,
+        latenciaMs: duracoes[`llm.tarefa.${t}.latencia`] || null,
+    }]));
+}
+
+const recusouFormatoResposta = (error: any): boolean =>
+    axios.isAxiosError(error) && error.response?.status === 400 &&
+    /response_format|json_schema/i.test(JSON.stringify(error.response?.data || ''));
+
+export async function chamarLLM(entrada: string | MensagemLLM[], maxTokens = 2048, temperature = 0.3, opcoes: OpcoesLLM = {}): Promise<string> {
+    const { texto } = await chamarLLMDetalhado(entrada, maxTokens, temperature, opcoes);
+    return texto;
+}
+
+/**
+ * Como `chamarLLM`, mas devolve também o uso de tokens. Aceita um prompt único
+ * ou a lista de mensagens (prefixo estático em `system` primeiro, para que o
+ * cache de prompt do provedor reaproveite a parte comum entre chamadas).
+ */
+export async function chamarLLMDetalhado(entrada: string | MensagemLLM[], maxTokens = 2048, temperature = 0.3, opcoes: OpcoesLLM = {}): Promise<RespostaLLM> {
+    const { signal, timeoutMs, formatoResposta, rotulo, cache, aoFragmento, camada = 'grande' } = opcoes;
+    const tarefa = rotulo || 'geral';
     try {
-        if (!azureEndpoint || !azureKey || !azureDeployment) {
-            throw new Error('As variáveis de ambiente do Azure OpenAI não estão configuradas.');
+        // Roteador entre os provedores configurados (LLM_PROVEDORES); por padrão, só o Azure
+        const cliente = obterClienteLLM(camada);
+        if (!cliente.configurado) {
+            throw new Error('As variáveis de ambiente do provedor de LLM (Azure OpenAI ou Gemini) não estão configuradas.');
         }
+        const messages: MensagemLLM[] = typeof entrada === 'string' ? [{ role: 'user', content: entrada }] : entrada;
 
-        const chatUrl = `${azureEndpoint.replace(/\/+$/, '')}/openai/deployments/${encodeURIComponent(azureDeployment)}/chat/completions?api-version=${azureApiVersion}`;
-        const body = { messages: [{ role: 'user', content: prompt }], max_completion_tokens: maxTokens };
-        const headers = { 'Content-Type': 'application/json', 'api-key': azureKey };
+        const usoCache = rotulo || 'geral';
+        const chaveCache = cache && chaveCacheLLM({
+            mensagens: messages,
+            versaoPrompt: cache.versaoPrompt,
+            deployment: cliente.modelo,
+            maxTokens,
+            temperature,
+            formatoResposta: formatoResposta?.nome,
+        });
+        if (cache && chaveCache) {
+            const emCache = await lerCacheLLM(chaveCache, usoCache, cache.versaoPrompt);
+            if (emCache) {
+                incrementar(`llm.tarefa.${tarefa}.cache`);
+                aoFragmento?.(emCache.texto);
+                return {
+                    texto: emCache.texto,
+                    uso: { promptTokens: emCache.promptTokens, cachedTokens: 0, completionTokens: emCache.completionTokens },
+                    doCache: true,
+                };
+            }
+        }
+        // axios trata timeout 0 como "sem limite": prazo esgotado não deve virar chamada sem fim
+        if (timeoutMs !== undefined && timeoutMs <= 0) {
+            incrementar('llm.timeout');
+            throw new Error('Prazo esgotado antes da chamada ao Azure OpenAI.');
+        }
 
-        const response = await axios.post(chatUrl, body, { headers, httpsAgent });
+        const body: Record<string, any> = { messages, max_completion_tokens: maxTokens };
+        if (formatoResposta && jsonSchemaSuportado) {
+            body.response_format = {
+                type: 'json_schema',
+                json_schema: { name: formatoResposta.nome, strict: true, schema: formatoResposta.schema },
+            };
+        }
+
+        // Conexão persistente, limite de cota, retry com jitter e concorrência adaptativa ficam no cliente
+        const inicio = Date.now();
+        let response;
+        try {
+            response = await cliente.completar(body, { signal, timeoutMs, aoFragmento });
+        } catch (error: any) {
+            if (!body.response_format || !recusouFormatoResposta(error)) throw error;
+            // api-version antiga ou modelo sem suporte: desliga e repete sem o parâmetro
+            jsonSchemaSuportado = false;
+            incrementar('llm.json_schema.nao_suportado');
+            console.warn('⚠️ Deployment não aceita response_format json_schema; usando parser tolerante.');
+            delete body.response_format;
+            response = await cliente.completar(body, { signal, timeoutMs, aoFragmento });
+        }
+        if (body.response_format) incrementar('llm.json_schema.usado');
         const content = response.data.choices?.[0]?.message?.content || '';
-        console.log("SUCESSO! Resposta recebida da API Azure OpenAI.");
-        return content.trim();
+        const usage = response.data.usage || {};
+        const uso: UsoLLM = {
+            promptTokens: usage.prompt_tokens || 0,
+            cachedTokens: usage.prompt_tokens_details?.cached_tokens || 0,
+            completionTokens: usage.completion_tokens || 0,
+        };
+        registrarUso(uso, rotulo);
+        incrementar(`llm.tarefa.${tarefa}.chamadas`);
+        incrementar(`llm.tarefa.${tarefa}.${camada}.chamadas`);
+        incrementar(`llm.tarefa.${tarefa}.custo_micro_usd`, Math.round(custoChamada(response.provedor, response.modelo, usage) * 1e6));
+        registrarDuracao(`llm.tarefa.${tarefa}.latencia`, Date.now() - inicio);
+        console.log(`SUCESSO! Resposta recebida de ${response.provedor} (${response.modelo}) (prompt: ${uso.promptTokens} tokens, ${uso.cachedTokens} do cache; saída: ${uso.completionTokens}).`);
+        const texto = content.trim();
+        if (cache && chaveCache && texto && (!cache.aceitar || cache.aceitar(texto))) {
+            // Gravação em segundo plano: não atrasa a resposta (erros já são tratados no serviço)
+            void gravarCacheLLM(chaveCache, { texto, promptTokens: uso.promptTokens, completionTokens: uso.completionTokens }, {
+                uso: usoCache,
+                versaoPrompt: cache.versaoPrompt,
+                deployment: cliente.modelo,
+                ttlMs: cache.ttlMs,
+            });
+        }
+        return { texto, uso };
 
     } catch (error: any) {
+        if (foiCancelado(error)) {
+            incrementar('llm.cancelado');
+            throw erroDoSinal(signal);
+        }
+        if (error?.code === 'ECONNABORTED' || error?.code === 'ETIMEDOUT') {
+            incrementar('llm.timeout');
+            throw new Error(`Tempo limite de ${timeoutMs} ms excedido na chamada ao Azure OpenAI.`);
+        }
         if (axios.isAxiosError(error)) {
             const status = error.response?.status || 'N/A';
             const data = error.response?.data || error.message;
@@ -37,10 +242,30 @@ export async function chamarLLM(prompt: string, maxTokens = 2048, temperature =
     }
 }
 
-// Nova função para correção automática de texto OCR
-export async function corrigirTextoOCR(textoOCR: string): Promise<string> {
-    try {
-        const promptCorrecao = `Você é um especialista em correção de textos extraídos por OCR de redações manuscritas. 
+/**
+ * Chama o modelo pequeno e, se a resposta não passar em `valido`, repete no
+ * grande. Respostas inválidas do modelo pequeno não entram no cache.
+ */
+export async function chamarLLMComEscalada(
+    entrada: string | MensagemLLM[],
+    maxTokens: number,
+    temperature: number,
+    opcoes: OpcoesLLM,
+    valido: (texto: string) => boolean
+): Promise<string> {
+    const { cache } = opcoes;
+    const texto = await chamarLLM(entrada, maxTokens, temperature, {
+        ...opcoes,
+        camada: 'pequeno',
+        cache: cache && { ...cache, aceitar: t => valido(t) && (!cache.aceitar || cache.aceitar(t)) },
+    });
+    // Sem modelos distintos por camada, repetir seria a mesma chamada
+    if (valido(texto) || !camadasDistintas()) return texto;
+    registrarEscalada(opcoes.rotulo || 'geral', 'validacao');
+    return chamarLLM(entrada, maxTokens, temperature, { ...opcoes, camada: 'grande' });
+}
+
+const promptCorrecaoOCR = (textoOCR: string): string => `Você é um especialista em correção de textos extraídos por OCR de redações manuscritas. 
 
 Sua tarefa é:
 1. Corrigir erros de OCR (palavras mal interpretadas, caracteres trocados)
@@ -63,13 +288,120 @@ ${textoOCR}
 
 Retorne APENAS o texto corrigido, sem comentários ou explicações:`;
 
-        const textoCorrigido = await chamarLLM(promptCorrecao, 2048, 0.2);
+/** Requisição de chat completions da correção do OCR (texto inteiro), para benchmarks e jobs offline. */
+export function requisicaoCorrecaoOCR(textoOCR: string) {
+    return {
+        versaoPrompt: VERSAO_PROMPT_CORRECAO_OCR,
+        corpo: { messages: [{ role: 'user', content: promptCorrecaoOCR(textoOCR) }], max_completion_tokens: 2048 },
+    };
+}
+
+// Nova função para correção automática de texto OCR
+export async function corrigirTextoOCR(textoOCR: string, opcoes: OpcoesExecucao = {}): Promise<string> {
+    const { signal, prazo } = opcoes;
+    if (prazo && !prazo.temOrcamento(CORRECAO_MIN_MS)) {
+        incrementar('prazo.etapa_pulada.correcao');
+        console.warn(`⏱️ Correção automática pulada: restam apenas ${prazo.restanteMs()} ms do prazo.`);
+        return textoOCR;
+    }
+    const timeoutMs = prazo?.timeoutEtapa(CORRECAO_TETO_MS);
+
+    const chave = `correcao:${VERSAO_PROMPT_CORRECAO_OCR}:${hashConteudo(normalizarTexto(textoOCR))}`;
+    return executarUmaVez(chave, sinal => executarCorrecaoOCR(textoOCR, sinal, timeoutMs), signal);
+}
+
+async function executarCorrecaoOCR(textoOCR: string, signal?: AbortSignal, timeoutMs?: number): Promise<string> {
+    if (CORRECAO_EM_BLOCOS && textoOCR.length >= CORRECAO_CHUNK_MIN_CARACTERES) {
+        const janelas = dividirEmJanelas(textoOCR, CORRECAO_CHUNK_CARACTERES, CORRECAO_CHUNK_SOBREPOSICAO);
+        if (janelas.length > 1) return corrigirEmBlocos(janelas, signal, timeoutMs);
+    }
+    try {
+        const promptCorrecao = promptCorrecaoOCR(textoOCR);
+        const textoCorrigido = await chamarLLMComEscalada(promptCorrecao, 2048, 0.2, {
+            signal,
+            timeoutMs,
+            rotulo: 'correcao',
+            cache: { versaoPrompt: VERSAO_PROMPT_CORRECAO_OCR },
+        }, texto => !textoIncompleto(texto, textoOCR));
+        if (textoIncompleto(textoCorrigido, textoOCR)) {
+            console.warn(`⚠️ Correção voltou incompleta (${textoCorrigido.length}/${textoOCR.length} caracteres); mantendo o texto do OCR.`);
+            return textoOCR;
+        }
         console.log("✅ Texto corrigido com sucesso pelo GPT");
         return textoCorrigido;
 
     } catch (error: any) {
+        if (foiCancelado(error)) throw error;
         console.error("❌ Erro na correção automática:", error.message);
         // Se falhar, retorna o texto original
         return textoOCR;
     }
-}
\ No newline at end of file
+}
+
+function promptCorrecaoBloco(janela: JanelaTexto, total: number): string {
+    const contexto = [
+        janela.contextoAnterior && `Contexto anterior (apenas referência, NÃO inclua na resposta):\n"""\n${janela.contextoAnterior}\n"""`,
+        janela.contextoPosterior && `Contexto seguinte (apenas referência, NÃO inclua na resposta):\n"""\n${janela.contextoPosterior}\n"""`,
+    ].filter(Boolean).join('\n\n');
+
+    return `Você é um especialista em correção de textos extraídos por OCR de redações manuscritas.
+Você receberá o trecho ${janela.indice + 1} de ${total} de uma redação.
+
+Sua tarefa é:
+1. Corrigir erros de OCR (palavras mal interpretadas, caracteres trocados)
+2. Corrigir erros ortográficos e gramaticais
+3. Manter o sentido, o estilo e as quebras de parágrafo do trecho
+
+IMPORTANTE:
+- NÃO altere o conteúdo ou significado do texto
+- NÃO adicione informações que não estavam no original
+- NÃO corrija opiniões ou argumentos do autor
+- O trecho pode começar ou terminar no meio de uma frase: mantenha o corte como está
+- Use os contextos apenas para entender palavras cortadas ou ambíguas
+
+${contexto ? `${contexto}\n\n` : ''}Trecho a corrigir:
+"""
+${janela.nucleo}
+"""
+
+Retorne APENAS o trecho corrigido, sem comentários ou explicações:`;
+}
+
+/**
+ * Corrige as janelas em paralelo e junta os trechos na ordem original. Um
+ * bloco que falhar (ou voltar truncado) mantém o texto do OCR, sem derrubar os demais.
+ */
+async function corrigirEmBlocos(janelas: JanelaTexto[], signal?: AbortSignal, timeoutMs?: number): Promise<string> {
+    const inicio = Date.now();
+    console.log(`✂️ Correção em blocos: ${janelas.length} trechos corrigidos em paralelo.`);
+    incrementar('correcao.blocos', janelas.length);
+
+    const resultados = await Promise.all(janelas.map(async janela => {
+        const inicioBloco = Date.now();
+        try {
+            const corrigido = await chamarLLMComEscalada(promptCorrecaoBloco(janela, janelas.length), Math.min(2048, Math.ceil(janela.nucleo.length / 2.5) + 128), 0.2, {
+                signal,
+                timeoutMs,
+                rotulo: 'correcao-bloco',
+                cache: { versaoPrompt: VERSAO_PROMPT_CORRECAO_BLOCO },
+            }, texto => !textoIncompleto(texto, janela.nucleo));
+            if (textoIncompleto(corrigido, janela.nucleo)) {
+                incrementar('correcao.blocos.descartados');
+                console.warn(`⚠️ Trecho ${janela.indice + 1} voltou incompleto (${corrigido.length}/${janela.nucleo.length} caracteres); mantendo o texto do OCR.`);
+                return { indice: janela.indice, texto: janela.nucleo, ms: Date.now() - inicioBloco };
+            }
+            return { indice: janela.indice, texto: corrigido, ms: Date.now() - inicioBloco };
+        } catch (error: any) {
+            if (foiCancelado(error)) throw error;
+            incrementar('correcao.blocos.falhas');
+            console.error(`❌ Erro na correção do trecho ${janela.indice + 1}:`, error.message);
+            return { indice: janela.indice, texto: janela.nucleo, ms: Date.now() - inicioBloco };
+        } finally {
+            registrarDuracao('correcao.bloco.latencia', Date.now() - inicioBloco);
+        }
+    }));
+
+    registrarDuracao('correcao.blocos.total', Date.now() - inicio);
+    console.log(`✅ Texto corrigido em ${janelas.length} blocos em ${Date.now() - inicio} ms (por bloco: ${resultados.map(r => `${r.ms} ms`).join(', ')}).`);
+    return costurarJanelas(resultados);
+}
@@ -0,0 +1,63 @@
+// prazo.ts
+// Orçamento de tempo de ponta a ponta de uma requisição: criado na rota e
+// consumido por cada etapa (OCR, correção, avaliação), que usa apenas o
+// tempo que ainda resta em vez de timeouts fixos e independentes.
+
+import { cancelar } from './cancelamento';
+
+// Margem reservada para o que vem depois da última etapa (gravar no banco, responder)
+const RESERVA_MS = Number(process.env.PRAZO_RESERVA_MS) || 1000;
+
+export class Prazo {
+    readonly inicio: number;
+    readonly expiraEm: number;
+    private readonly controller = new AbortController();
+    private readonly timer: NodeJS.Timeout;
+
+    constructor(orcamentoMs: number, signalPai?: AbortSignal) {
+        this.inicio = Date.now();
+        this.expiraEm = this.inicio + orcamentoMs;
+        // Salvaguarda: se alguma etapa ignorar o timeout, o sinal aborta tudo no fim do prazo
+        this.timer = setTimeout(() => cancelar(this.controller, 'timeout'), orcamentoMs);
+        this.timer.unref?.();
+
+        if (signalPai) {
+            if (signalPai.aborted) this.controller.abort(signalPai.reason);
+            else signalPai.addEventListener('abort', () => this.controller.abort(signalPai.reason), { once: true });
+        }
+    }
+
+    /** Abortado no fim do prazo ou quando o sinal pai (desconexão, exclusão) abortar. */
+    get signal(): AbortSignal {
+        return this.controller.signal;
+    }
+
+    restanteMs(): number {
+        return Math.max(0, this.expiraEm - Date.now());
+    }
+
+    decorridoMs(): number {
+        return Date.now() - this.inicio;
+    }
+
+    /** Indica se ainda há pelo menos `minimoMs` utilizáveis (descontada a reserva). */
+    temOrcamento(minimoMs: number): boolean {
+        return this.timeoutEtapa() >= minimoMs;
+    }
+
+    /** Timeout de uma etapa: o que resta do prazo (menos a reserva), limitado ao teto da etapa. */
+    timeoutEtapa(tetoMs = Infinity): number {
+        return Math.max(0, Math.min(tetoMs, this.restanteMs() - RESERVA_MS));
+    }
+
+    /** Libera o timer interno; chamar quando a requisição terminar. */
+    encerrar(): void {
+        clearTimeout(this.timer);
+    }
+}
+
+/** Opções comuns às etapas do pipeline. */
+export interface OpcoesExecucao {
+    signal?: AbortSignal;
+    prazo?: Prazo;
+}
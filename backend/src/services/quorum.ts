@@ -0,0 +1,84 @@
+// quorum.ts
+// Agregação por quórum com prazo: em vez de esperar todas as chamadas
+// paralelas (Promise.all), devolve assim que `minimo` resultados válidos
+// chegam, ou no fim do prazo se já houver ao menos um. As chamadas que
+// terminarem depois continuam sendo entregues a `aoAtrasar` (calibração).
+
+import { erroDoSinal } from './cancelamento';
+
+export interface OpcoesQuorum<T> {
+    // Quantidade de resultados válidos suficiente para responder (k de n)
+    minimo: number;
+    // Após este tempo, basta um resultado válido; sem nenhum, espera o primeiro que chegar
+    prazoMs?: number;
+    signal?: AbortSignal;
+    valido?: (resultado: T) => boolean;
+    // Resultados (válidos) que chegaram depois da resposta
+    aoAtrasar?: (resultado: T, indice: number, ms: number) => void;
+}
+
+export interface ResultadoQuorum<T> {
+    resultados: T[];
+    indices: number[];
+    // Chamadas ainda em andamento no momento da resposta
+    pendentes: number;
+    porPrazo: boolean;
+}
+
+export function aguardarQuorum<T>(tarefas: Promise<T>[], opcoes: OpcoesQuorum<T>): Promise<ResultadoQuorum<T>> {
+    const { minimo, prazoMs, signal, aoAtrasar } = opcoes;
+    const valido = opcoes.valido || ((r: T) => r !== null && r !== undefined);
+    const inicio = Date.now();
+
+    return new Promise((resolve, reject) => {
+        const resultados: T[] = [];
+        const indices: number[] = [];
+        let terminadas = 0;
+        let prazoEsgotado = false;
+        let respondido = false;
+        let timer: NodeJS.Timeout | undefined;
+
+        const responder = (porPrazo: boolean) => {
+            respondido = true;
+            if (timer) clearTimeout(timer);
+            signal?.removeEventListener('abort', aoAbortar);
+            resolve({ resultados: [...resultados], indices: [...indices], pendentes: tarefas.length - terminadas, porPrazo });
+        };
+        const aoAbortar = () => {
+            if (respondido) return;
+            respondido = true;
+            if (timer) clearTimeout(timer);
+            reject(erroDoSinal(signal));
+        };
+        if (signal?.aborted) return aoAbortar();
+        signal?.addEventListener('abort', aoAbortar, { once: true });
+
+        if (prazoMs !== undefined && prazoMs > 0) {
+            timer = setTimeout(() => {
+                prazoEsgotado = true;
+                if (!respondido && resultados.length > 0) responder(true);
+            }, prazoMs);
+            timer.unref?.();
+        }
+
+        const concluir = (indice: number, resultado?: T) => {
+            terminadas++;
+            const ok = resultado !== undefined && valido(resultado);
+            if (respondido) {
+                if (ok) aoAtrasar?.(resultado as T, indice, Date.now() - inicio);
+                return;
+            }
+            if (ok) {
+                resultados.push(resultado as T);
+                indices.push(indice);
+            }
+            if (resultados.length >= minimo || terminadas === tarefas.length || (prazoEsgotado && resultados.length > 0)) {
+                responder(prazoEsgotado && resultados.length < minimo);
+            }
+        };
+
+        if (tarefas.length === 0) return responder(false);
+        // Falhas contam como "respondeu sem resultado válido"; o cancelamento vem pelo signal
+        tarefas.forEach((tarefa, indice) => tarefa.then(r => concluir(indice, r), () => concluir(indice)));
+    });
+}
@@ -0,0 +1,205 @@
+// reanaliseIncrementalService.ts
+// Reanálise incremental: compara, parágrafo a parágrafo, o texto enviado com a
+// última versão analisada da mesma redação. Parágrafos iguais reaproveitam a
+// formatação anterior; só as competências cuja evidência está nos parágrafos
+// alterados são reavaliadas (com um prompt de delta), o resto é mantido.
+
+import {
+    AlteracaoParagrafo,
+    AnaliseENEM,
+    analisarEnem,
+    ChaveCompetencia,
+    formatarTextoComLLM,
+    reavaliarCompetencias,
+} from './ennAnalysisService';
+import { normalizarTexto } from './singleFlight';
+import { OpcoesExecucao } from './prazo';
+import { incrementar } from './metricasService';
+import { lancarSeCancelado } from './cancelamento';
+
+// Acima desta fração de parágrafos alterados, a reanálise completa é mais confiável
+const MAX_FRACAO_ALTERADA = Number(process.env.REANALISE_MAX_FRACAO_ALTERADA) || 0.5;
+const VERSAO_TTL_MS = 24 * 60 * 60 * 1000;
+const MAX_VERSOES = 1000;
+
+export interface VersaoAnalisada {
+    paragrafos: string[];
+    // Formatação de cada parágrafo (alinhada a `paragrafos`)
+    formatados: string[];
+    analise: AnaliseENEM;
+    salvoEm: number;
+}
+
+export interface ResultadoReanalise {
+    textoFormatado: string;
+    analise: AnaliseENEM;
+    incremental: {
+        modo: 'completa' | 'delta' | 'sem-alteracao';
+        paragrafosAlterados: number;
+        paragrafosReaproveitados: number;
+        competenciasReavaliadas: ChaveCompetencia[];
+    };
+}
+
+const versoes = new Map<string, VersaoAnalisada>();
+
+export function dividirParagrafos(texto: string): string[] {
+    return normalizarTexto(texto).split(/\n+/).map(p => p.trim()).filter(Boolean);
+}
+
+export function obterVersaoAnalisada(chave: string): VersaoAnalisada | null {
+    const versao = versoes.get(chave);
+    if (!versao) return null;
+    if (Date.now() - versao.salvoEm > VERSAO_TTL_MS) {
+        versoes.delete(chave);
+        return null;
+    }
+    return versao;
+}
+
+/** Registra a versão analisada (ex.: análise inicial da redação, que não passa pela formatação). */
+export function registrarVersaoAnalisada(chave: string, texto: string, textoFormatado: string, analise: AnaliseENEM): void {
+    const paragrafos = dividirParagrafos(texto);
+    const formatadosBrutos = dividirParagrafos(textoFormatado);
+    versoes.delete(chave);
+    versoes.set(chave, {
+        paragrafos,
+        // Se a formatação juntou/separou parágrafos não há como alinhar: os parágrafos
+        // da próxima versão serão formatados individualmente (e ficam no cache do LLM)
+        formatados: formatadosBrutos.length === paragrafos.length ? formatadosBrutos : [],
+        analise,
+        salvoEm: Date.now(),
+    });
+    if (versoes.size > MAX_VERSOES) versoes.delete(versoes.keys().next().value as string);
+}
+
+export function descartarVersaoAnalisada(chave: string): void {
+    versoes.delete(chave);
+}
+
+/**
+ * Alinha os parágrafos pela maior subsequência comum: para cada parágrafo
+ * atual, o índice do parágrafo igual na versão anterior (ou -1 se alterado/novo).
+ */
+export function alinharParagrafos(anteriores: string[], atuais: string[]): number[] {
+    const n = anteriores.length;
+    const m = atuais.length;
+    const lcs: number[][] = Array.from({ length: n + 1 }, () => new Array(m + 1).fill(0));
+    for (let i = n - 1; i >= 0; i--) {
+        for (let j = m - 1; j >= 0; j--) {
+            lcs[i][j] = anteriores[i] === atuais[j] ? lcs[i + 1][j + 1] + 1 : Math.max(lcs[i + 1][j], lcs[i][j + 1]);
+        }
+    }
+    const origem = new Array(m).fill(-1);
+    for (let i = 0, j = 0; i < n && j < m;) {
+        if (anteriores[i] === atuais[j]) { origem[j] = i; i++; j++; }
+        else if (lcs[i + 1][j] >= lcs[i][j + 1]) i++;
+        else j++;
+    }
+    return origem;
+}
+
+type Papel = 'introducao' | 'desenvolvimento' | 'conclusao';
+
+const papel = (indice: number, total: number): Papel =>
+    indice === 0 ? 'introducao' : indice === total - 1 ? 'conclusao' : 'desenvolvimento';
+
+// Onde está a evidência de cada competência: C1 (norma) e C4 (coesão) valem para o
+// texto todo; C2/C3 vêm da tese e dos argumentos; C5 é a proposta na conclusão.
+const COMPETENCIAS_POR_PAPEL: Record<Papel, ChaveCompetencia[]> = {
+    introducao: ['c1', 'c2', 'c3', 'c4'],
+    desenvolvimento: ['c1', 'c2', 'c3', 'c4'],
+    conclusao: ['c1', 'c3', 'c4', 'c5'],
+};
+
+/** Competências afetadas pelas alterações, conforme o papel dos parágrafos alterados. */
+export function competenciasAfetadas(papeis: Papel[]): ChaveCompetencia[] {
+    const afetadas = new Set<ChaveCompetencia>();
+    for (const p of papeis) COMPETENCIAS_POR_PAPEL[p].forEach(c => afetadas.add(c));
+    return (['c1', 'c2', 'c3', 'c4', 'c5'] as ChaveCompetencia[]).filter(c => afetadas.has(c));
+}
+
+async function reanaliseCompleta(texto: string, opcoes: OpcoesExecucao) {
+    const textoFormatado = (await formatarTextoComLLM(texto, opcoes)).textoFormatado;
+    const analise = await analisarEnem(textoFormatado, opcoes);
+    return { textoFormatado, analise };
+}
+
+/**
+ * Reanalisa `texto`. Com `chave` (usuário + redação) e uma versão anterior
+ * registrada, faz a reanálise incremental; senão, a completa. Em ambos os
+ * casos a versão resultante fica registrada para a próxima edição.
+ */
+export async function reanalisar(texto: string, chave: string | undefined, opcoes: OpcoesExecucao = {}): Promise<ResultadoReanalise> {
+    const anterior = chave ? obterVersaoAnalisada(chave) : null;
+    const atuais = dividirParagrafos(texto);
+
+    const completa = async (): Promise<ResultadoReanalise> => {
+        incrementar('reanalise.incremental.completa');
+        const { textoFormatado, analise } = await reanaliseCompleta(texto, opcoes);
+        if (chave) registrarVersaoAnalisada(chave, texto, textoFormatado, analise);
+        return {
+            textoFormatado,
+            analise,
+            incremental: { modo: 'completa', paragrafosAlterados: atuais.length, paragrafosReaproveitados: 0, competenciasReavaliadas: ['c1', 'c2', 'c3', 'c4', 'c5'] },
+        };
+    };
+
+    // Sem versão anterior ou sem estrutura mínima (introdução, desenvolvimento, conclusão)
+    if (!anterior || atuais.length < 3 || anterior.paragrafos.length < 3) return completa();
+
+    const origem = alinharParagrafos(anterior.paragrafos, atuais);
+    const usados = new Set(origem.filter(i => i >= 0));
+    const novos = origem.map((o, j) => (o < 0 ? j : -1)).filter(j => j >= 0);
+    const removidos = anterior.paragrafos.map((_, i) => i).filter(i => !usados.has(i));
+    const alterados = Math.max(novos.length, removidos.length);
+
+    if (alterados === 0) {
+        incrementar('reanalise.incremental.sem_alteracao');
+        const formatados = anterior.formatados.length ? anterior.formatados : anterior.paragrafos;
+        return {
+            textoFormatado: formatados.join('\n'),
+            analise: anterior.analise,
+            incremental: { modo: 'sem-alteracao', paragrafosAlterados: 0, paragrafosReaproveitados: atuais.length, competenciasReavaliadas: [] },
+        };
+    }
+    if (alterados / atuais.length > MAX_FRACAO_ALTERADA) return completa();
+
+    // Formatação: reaproveita os parágrafos iguais e formata só os alterados (em paralelo)
+    const formatados = await Promise.all(atuais.map(async (paragrafo, j) => {
+        if (origem[j] >= 0 && anterior.formatados.length) return anterior.formatados[origem[j]];
+        return (await formatarTextoComLLM(paragrafo, opcoes)).textoFormatado;
+    }));
+    lancarSeCancelado(opcoes.signal);
+    const reaproveitados = atuais.length - novos.length;
+    incrementar('reanalise.paragrafos.reaproveitados', anterior.formatados.length ? reaproveitados : 0);
+    incrementar('reanalise.paragrafos.formatados', anterior.formatados.length ? novos.length : atuais.length);
+
+    // Pares antes/depois para o prompt de delta: parágrafo alterado no lugar do removido
+    // na mesma posição relativa; o excedente entra como novo ou removido
+    const alteracoes: AlteracaoParagrafo[] = [];
+    const papeis: Papel[] = [];
+    for (let k = 0; k < alterados; k++) {
+        const j = novos[k];
+        const i = removidos[k];
+        alteracoes.push({ antes: i !== undefined ? anterior.paragrafos[i] : '', depois: j !== undefined ? atuais[j] : '' });
+        if (j !== undefined) papeis.push(papel(j, atuais.length));
+        if (i !== undefined) papeis.push(papel(i, anterior.paragrafos.length));
+    }
+    const chaves = competenciasAfetadas(papeis);
+
+    const analise = await reavaliarCompetencias(anterior.analise, chaves, alteracoes, opcoes);
+    if (!analise) return completa();
+
+    incrementar('reanalise.incremental.delta');
+    incrementar('reanalise.competencias.reavaliadas', chaves.length);
+    incrementar('reanalise.competencias.mantidas', 5 - chaves.length);
+    const textoFormatado = formatados.join('\n');
+    if (chave) registrarVersaoAnalisada(chave, texto, textoFormatado, analise);
+    console.log(`♻️ Reanálise incremental: ${alterados} parágrafo(s) alterado(s), ${reaproveitados} reaproveitado(s); competências reavaliadas: ${chaves.join(', ').toUpperCase()}.`);
+    return {
+        textoFormatado,
+        analise,
+        incremental: { modo: 'delta', paragrafosAlterados: alterados, paragrafosReaproveitados: reaproveitados, competenciasReavaliadas: chaves },
+    };
+}
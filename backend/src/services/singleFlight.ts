@@ -0,0 +1,92 @@
+// singleFlight.ts
+// Coalescência de requisições: chamadores concorrentes com a mesma chave
+// aguardam uma única computação em andamento e compartilham o resultado.
+
+import crypto from 'crypto';
+import { incrementar } from './metricasService';
+import { cancelar, comSinal, erroDoSinal } from './cancelamento';
+
+type Voo = {
+    promessa: Promise<any>;
+    controller: AbortController;
+    // Chamadores que ainda aguardam o resultado; null = há um chamador sem sinal
+    // (não cancelável), então a computação nunca é abortada por falta de interessados.
+    interessados: number | null;
+};
+
+const emAndamento = new Map<string, Voo>();
+
+/**
+ * Normaliza o texto para fins de comparação: mesma redação com diferenças
+ * apenas de espaçamento ou quebras de linha extras gera a mesma chave.
+ */
+export function normalizarTexto(texto: string): string {
+    return (texto || '')
+        .normalize('NFC')
+        .replace(/\r\n?/g, '\n')
+        .split('\n')
+        .map(linha => linha.replace(/[ \t\u00a0]+/g, ' ').trim())
+        .join('\n')
+        .replace(/\n{3,}/g, '\n\n')
+        .trim();
+}
+
+export function hashConteudo(...partes: Array<string | Buffer>): string {
+    const hash = crypto.createHash('sha256');
+    for (const parte of partes) {
+        hash.update(parte);
+        hash.update('\u0000'); // separador para evitar colisões entre partes
+    }
+    return hash.digest('hex');
+}
+
+const registrarInteressado = (voo: Voo, signal?: AbortSignal) => {
+    if (!signal) {
+        voo.interessados = null;
+        return;
+    }
+    if (voo.interessados !== null) voo.interessados++;
+    signal.addEventListener('abort', () => {
+        if (voo.interessados === null) return;
+        voo.interessados--;
+        // Só aborta o trabalho compartilhado quando ninguém mais espera por ele
+        if (voo.interessados <= 0) cancelar(voo.controller, 'sem-interessados');
+    }, { once: true });
+};
+
+/**
+ * Executa `fn` apenas uma vez por chave enquanto houver uma execução em andamento.
+ * A entrada é removida assim que a promessa termina (sucesso ou erro), então
+ * não há cache de resultado aqui — apenas deduplicação de trabalho em voo.
+ *
+ * `fn` recebe um sinal próprio da computação compartilhada, abortado somente
+ * quando todos os chamadores que passaram `signal` tiverem desistido.
+ */
+export function executarUmaVez<T>(chave: string, fn: (signal: AbortSignal) => Promise<T>, signal?: AbortSignal): Promise<T> {
+    if (signal?.aborted) return Promise.reject(erroDoSinal(signal));
+
+    const existente = emAndamento.get(chave);
+    if (existente && !existente.controller.signal.aborted) {
+        incrementar('singleflight.coalescido');
+        registrarInteressado(existente, signal);
+        return comSinal(existente.promessa as Promise<T>, signal);
+    }
+
+    incrementar('singleflight.executado');
+    const controller = new AbortController();
+    const voo: Voo = { promessa: Promise.resolve(), controller, interessados: 0 };
+    voo.promessa = Promise.resolve()
+        .then(() => fn(controller.signal))
+        .finally(() => {
+            if (emAndamento.get(chave) === voo) emAndamento.delete(chave);
+        });
+    // Evita "unhandled rejection" quando todos os chamadores já desistiram
+    voo.promessa.catch(() => undefined);
+    emAndamento.set(chave, voo);
+    registrarInteressado(voo, signal);
+    return comSinal(voo.promessa as Promise<T>, signal);
+}
+
+export function emAndamentoCount(): number {
+    return emAndamento.size;
+}
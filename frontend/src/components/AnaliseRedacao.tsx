@@ -8,6 +8,8 @@ interface DetalheCompetencia {
 interface AnaliseENEM {
     notaFinal1000: number; tesePrincipal: string; tituloSugerido: string; comentarioGeral: string;
     competencias: { c1: DetalheCompetencia; c2: DetalheCompetencia; c3: DetalheCompetencia; c4: DetalheCompetencia; c5: DetalheCompetencia; };
+    // Só notas e tese: os comentários de cada seção são gerados quando o aluno a abre
+    feedbackSobDemanda?: boolean;
 }
 
 interface AnaliseRedacaoProps {
@@ -19,8 +21,14 @@ interface AnaliseRedacaoProps {
 
 const AnaliseRedacao: React.FC<AnaliseRedacaoProps> = ({ redacaoId, isVisible, onClose, onProgress }) => {
     const [analise, setAnalise] = useState<AnaliseENEM | null>(null);
+    // Competências que chegaram pelo streaming antes do resultado final (provisórias)
+    const [parciais, setParciais] = useState<Partial<Record<string, DetalheCompetencia>>>({});
     const [isLoading, setIsLoading] = useState(true);
     const [error, setError] = useState<string | null>(null);
+    // Feedback sob demanda: seções abertas, em geração e com erro (c1..c5 e 'geral')
+    const [secoesAbertas, setSecoesAbertas] = useState<Record<string, boolean>>({});
+    const [secoesCarregando, setSecoesCarregando] = useState<Record<string, boolean>>({});
+    const [errosSecao, setErrosSecao] = useState<Record<string, string>>({});
     const pollRef = useRef<NodeJS.Timeout | null>(null);
 
     const stopPolling = useCallback(() => {
@@ -58,37 +66,103 @@ const AnaliseRedacao: React.FC<AnaliseRedacaoProps> = ({ redacaoId, isVisible, o
         if (isVisible && redacaoId) {
             setIsLoading(true);
             setAnalise(null);
+            setParciais({});
             setError(null);
+            setSecoesAbertas({});
+            setSecoesCarregando({});
+            setErrosSecao({});
 
-            fetchAnalysis(); // Primeira chamada imediata
+            const controller = new AbortController();
+            let timeoutId: NodeJS.Timeout | undefined;
 
-            const intervalId = setInterval(fetchAnalysis, 5000);
-            pollRef.current = intervalId;
+            const iniciarPolling = () => {
+                fetchAnalysis(); // Primeira chamada imediata
 
-            const timeoutId = setTimeout(() => {
-                if (pollRef.current) { // Verifica se o polling ainda está ativo antes de setar o erro
-                    stopPolling();
-                    setError("A análise excedeu o tempo limite. Por favor, feche e tente novamente.");
+                const intervalId = setInterval(fetchAnalysis, 5000);
+                pollRef.current = intervalId;
+
+                timeoutId = setTimeout(() => {
+                    if (pollRef.current) { // Verifica se o polling ainda está ativo antes de setar o erro
+                        stopPolling();
+                        setError("A análise excedeu o tempo limite. Por favor, feche e tente novamente.");
+                        setIsLoading(false);
+                        onProgress?.('Erro', 'Tempo limite excedido');
+                    }
+                }, 60000); // Timeout de 60 segundos
+            };
+
+            // Streaming: cada competência aparece assim que um corretor a conclui
+            onProgress?.('Analisando redação', 'A IA está avaliando o texto...');
+            redacaoService.streamAnaliseEnem(redacaoId, {
+                signal: controller.signal,
+                onCompetencia: (chave, detalhe) => setParciais(prev => ({ ...prev, [chave]: detalhe })),
+            }).then(analiseFinal => {
+                setAnalise(analiseFinal);
+                setIsLoading(false);
+                onProgress?.('Análise Concluída!', '');
+            }).catch((err: any) => {
+                if (controller.signal.aborted) return;
+                if (err.daAnalise) {
+                    setError(err.message);
                     setIsLoading(false);
-                    onProgress?.('Erro', 'Tempo limite excedido');
+                    onProgress?.('Erro na Análise', err.message);
+                    return;
                 }
-            }, 60000); // Timeout de 60 segundos
+                // Streaming indisponível (proxy, servidor sobrecarregado...): volta ao polling
+                iniciarPolling();
+            });
 
             return () => { // Função de limpeza
+                controller.abort();
                 stopPolling();
-                clearTimeout(timeoutId);
+                if (timeoutId) clearTimeout(timeoutId);
             };
         }
         // Removida dependência de fetchAnalysis para evitar loops infinitos
     }, [isVisible, redacaoId]);
 
-    const renderCompetencia = (c: DetalheCompetencia, key: string) => (
-        <div key={key} className="border border-gray-200 rounded-lg p-4 bg-white shadow-sm">
-            <div className="flex justify-between items-start mb-2 flex-wrap gap-2">
-                <h4 className="font-bold text-gray-800 flex-1">{c.nome}</h4>
-                <span className="text-2xl font-bold text-blue-600 bg-blue-50 px-3 py-1 rounded-lg">{c.nota}</span>
-            </div>
-            <p className="text-sm text-gray-600 italic mb-4">"{c.comentario}"</p>
+    const secaoPendente = (a: AnaliseENEM, secao: string) =>
+        secao === 'geral' ? !a.comentarioGeral : !a.competencias[secao as keyof AnaliseENEM['competencias']].comentario;
+
+    const alternarSecao = async (secao: string) => {
+        const abrir = !secoesAbertas[secao];
+        setSecoesAbertas(prev => ({ ...prev, [secao]: abrir }));
+        if (!abrir || !analise || !secaoPendente(analise, secao) || secoesCarregando[secao]) return;
+
+        setSecoesCarregando(prev => ({ ...prev, [secao]: true }));
+        setErrosSecao(prev => ({ ...prev, [secao]: '' }));
+        try {
+            const { analise: comFeedback } = await redacaoService.getFeedbackEnem(redacaoId, secao);
+            // Junta só a seção pedida: outras podem ter sido geradas ao mesmo tempo
+            setAnalise(prev => prev && (secao === 'geral'
+                ? { ...prev, comentarioGeral: comFeedback.comentarioGeral, tituloSugerido: comFeedback.tituloSugerido }
+                : { ...prev, competencias: { ...prev.competencias, [secao]: comFeedback.competencias[secao] } }));
+        } catch (err: any) {
+            setErrosSecao(prev => ({ ...prev, [secao]: err.response?.data?.erro || 'Não foi possível carregar os comentários.' }));
+        } finally {
+            setSecoesCarregando(prev => ({ ...prev, [secao]: false }));
+        }
+    };
+
+    // Com feedback sob demanda, o conteúdo da seção só é gerado quando o aluno a abre
+    const renderSecaoSobDemanda = (secao: string, conteudo: React.ReactNode) => (
+        <div>
+            <button onClick={() => alternarSecao(secao)} className="text-sm text-blue-600 hover:underline">
+                {secoesAbertas[secao] ? 'Ocultar comentários' : 'Ver comentários'}
+            </button>
+            {secoesAbertas[secao] && (
+                <div className="mt-3">
+                    {secoesCarregando[secao] && <p className="text-sm text-gray-500">Gerando comentários...</p>}
+                    {errosSecao[secao] && <p className="text-sm text-red-600">{errosSecao[secao]}</p>}
+                    {conteudo}
+                </div>
+            )}
+        </div>
+    );
+
+    const renderDetalhes = (c: DetalheCompetencia) => (
+        <>
+            {c.comentario && <p className="text-sm text-gray-600 italic mb-4">"{c.comentario}"</p>}
             {c.pontosFortes && c.pontosFortes.length > 0 && (
                 <div className="mb-3">
                     <h5 className="text-sm font-semibold text-green-700 mb-1">Pontos Fortes:</h5>
@@ -105,6 +179,16 @@ const AnaliseRedacao: React.FC<AnaliseRedacaoProps> = ({ redacaoId, isVisible, o
                     </ul>
                 </div>
             )}
+        </>
+    );
+
+    const renderCompetencia = (c: DetalheCompetencia, key: string, sobDemanda = false) => (
+        <div key={key} className="border border-gray-200 rounded-lg p-4 bg-white shadow-sm">
+            <div className="flex justify-between items-start mb-2 flex-wrap gap-2">
+                <h4 className="font-bold text-gray-800 flex-1">{c.nome}</h4>
+                <span className="text-2xl font-bold text-blue-600 bg-blue-50 px-3 py-1 rounded-lg">{c.nota}</span>
+            </div>
+            {sobDemanda ? renderSecaoSobDemanda(key, renderDetalhes(c)) : renderDetalhes(c)}
         </div>
     );
 
@@ -117,7 +201,22 @@ const AnaliseRedacao: React.FC<AnaliseRedacaoProps> = ({ redacaoId, isVisible, o
                 </div>
 
                 <div className="p-6 overflow-y-auto flex-1">
-                    {isLoading && (
+                    {isLoading && Object.keys(parciais).length > 0 && (
+                        <div className="space-y-4">
+                            <div className="flex items-center justify-center gap-3 text-gray-600">
+                                <div className="animate-spin w-5 h-5 border-4 border-blue-500 border-t-transparent rounded-full"></div>
+                                <p className="text-sm">Resultados provisórios: as notas finais saem do consenso entre os corretores.</p>
+                            </div>
+                            {['c1', 'c2', 'c3', 'c4', 'c5'].map(chave => parciais[chave]
+                                ? renderCompetencia(parciais[chave] as DetalheCompetencia, chave)
+                                : (
+                                    <div key={chave} className="border border-dashed border-gray-300 rounded-lg p-4 text-sm text-gray-400">
+                                        Competência {chave.toUpperCase()} em avaliação...
+                                    </div>
+                                ))}
+                        </div>
+                    )}
+                    {isLoading && Object.keys(parciais).length === 0 && (
                         <div className="text-center py-12 flex flex-col items-center justify-center h-full">
                             <div className="animate-spin w-8 h-8 border-4 border-blue-500 border-t-transparent rounded-full mb-4"></div>
                             <p className="text-gray-600">Carregando análise...</p>
@@ -141,7 +240,9 @@ const AnaliseRedacao: React.FC<AnaliseRedacaoProps> = ({ redacaoId, isVisible, o
 
                             <div className="bg-white p-4 rounded-lg shadow-sm">
                                 <h3 className="font-semibold text-gray-800 mb-2">Comentário Geral do Corretor</h3>
-                                <p className="text-sm text-gray-600">{analise.comentarioGeral}</p>
+                                {analise.feedbackSobDemanda
+                                    ? renderSecaoSobDemanda('geral', analise.comentarioGeral && <p className="text-sm text-gray-600">{analise.comentarioGeral}</p>)
+                                    : <p className="text-sm text-gray-600">{analise.comentarioGeral}</p>}
                             </div>
                             <div className="bg-white p-4 rounded-lg shadow-sm">
                                 <h3 className="font-semibold text-gray-800 mb-2">Tese Principal Identificada</h3>
@@ -151,11 +252,11 @@ const AnaliseRedacao: React.FC<AnaliseRedacaoProps> = ({ redacaoId, isVisible, o
                             <div>
                                 <h3 className="text-xl font-bold text-gray-800 mb-4 text-center">Análise por Competência</h3>
                                 <div className="space-y-4">
-                                    {analise.competencias.c1 && renderCompetencia(analise.competencias.c1, "c1")}
-                                    {analise.competencias.c2 && renderCompetencia(analise.competencias.c2, "c2")}
-                                    {analise.competencias.c3 && renderCompetencia(analise.competencias.c3, "c3")}
-                                    {analise.competencias.c4 && renderCompetencia(analise.competencias.c4, "c4")}
-                                    {analise.competencias.c5 && renderCompetencia(analise.competencias.c5, "c5")}
+                                    {analise.competencias.c1 && renderCompetencia(analise.competencias.c1, "c1", analise.feedbackSobDemanda)}
+                                    {analise.competencias.c2 && renderCompetencia(analise.competencias.c2, "c2", analise.feedbackSobDemanda)}
+                                    {analise.competencias.c3 && renderCompetencia(analise.competencias.c3, "c3", analise.feedbackSobDemanda)}
+                                    {analise.competencias.c4 && renderCompetencia(analise.competencias.c4, "c4", analise.feedbackSobDemanda)}
+                                    {analise.competencias.c5 && renderCompetencia(analise.competencias.c5, "c5", analise.feedbackSobDemanda)}
                                 </div>
                             </div>
                         </div>
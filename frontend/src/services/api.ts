@@ -90,13 +90,62 @@ export const redacaoService = {
     return response.data;
   },
 
+  // Análise via Server-Sent Events: chama onCompetencia a cada competência pronta e
+  // resolve com a análise final. Usa fetch (EventSource não envia o header Authorization).
+  streamAnaliseEnem: async (
+    id: string,
+    opcoes: { onCompetencia: (chave: string, detalhe: any) => void; signal?: AbortSignal }
+  ): Promise<any> => {
+    const token = localStorage.getItem('token');
+    const response = await fetch(`${API_BASE_URL}/redacoes/${id}/analise-enem/stream`, {
+      headers: { Accept: 'text/event-stream', ...(token ? { Authorization: `Bearer ${token}` } : {}) },
+      signal: opcoes.signal,
+    });
+    if (!response.ok || !response.body) {
+      throw new Error(`Streaming indisponível (status ${response.status}).`);
+    }
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = '';
+    for (;;) {
+      const { done, value } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+      // Eventos SSE são separados por linha em branco
+      const eventos = buffer.split('\n\n');
+      buffer = eventos.pop() || '';
+      for (const bloco of eventos) {
+        const evento = bloco.match(/^event: (.*)$/m)?.[1];
+        const dados = bloco.match(/^data: (.*)$/m)?.[1];
+        if (!evento || !dados) continue;
+        const payload = JSON.parse(dados);
+        if (evento === 'competencia') opcoes.onCompetencia(payload.chave, payload.detalhe);
+        if (evento === 'analise') return payload.analise;
+        if (evento === 'erro') {
+          const erro: any = new Error(payload.erro);
+          erro.daAnalise = true;
+          throw erro;
+        }
+      }
+    }
+    throw new Error('Streaming encerrado antes da análise final.');
+  },
+
+  // Feedback sob demanda: gera o texto de uma seção (c1..c5 ou 'geral') da análise
+  getFeedbackEnem: async (id: string, secao: string): Promise<any> => {
+    const response = await api.get(`/redacoes/${id}/analise-enem/feedback/${secao}`);
+    return response.data;
+  },
+
   getTextoRaw: async (id: string): Promise<string> => {
     const response = await api.get(`/redacoes/${id}`);
     return response.data.textoExtraido || '';
   },
 
-  reanalyze: async (texto: string): Promise<any> => {
-    const response = await api.post(`/redacoes/reanalisar`, { texto });
+  // Com redacaoId, o backend reavalia apenas os parágrafos alterados desde a última análise
+  reanalyze: async (texto: string, redacaoId?: string): Promise<any> => {
+    const response = await api.post(`/redacoes/reanalisar`, { texto, redacaoId });
     return response.data;
   },
 